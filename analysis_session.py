@@ -0,0 +1,199 @@
+# analysis_session.py
+"""
+Sesión de trabajo compartida entre los flujos de análisis de un proyecto.
+
+``PCAApp`` mantiene una ``AnalysisSession`` y la pasa a las tres entradas de
+``PCAAnalysisLogic`` (serie de tiempo, corte transversal y panel 3D):
+
+- El archivo de datos se lee una sola vez como ``IndicatorCube``. Si un flujo
+  pide indicadores, unidades o años que el cubo en memoria no cubre, se relee
+  una sola vez con la unión de ambas selecciones, de modo que alternar entre
+  análisis del mismo proyecto no vuelve a leer el archivo.
+- Los resultados de cada flujo (frames derivados y modelos ajustados) se
+  guardan por selección, año, estrategia de imputación y configuración de PCA,
+  así que repetir una llamada idéntica (p. ej. la pasada de detección de datos
+  faltantes seguida de la pasada "real" sin imputación) no recalcula nada.
+
+Todo se invalida explícitamente con ``invalidate()`` o automáticamente cuando
+cambia ``data_file`` o el contenido del archivo (tamaño o fecha de modificación),
+lo que se comprueba también al consultar un resultado guardado. Se conservan a lo
+sumo ``PerformanceSettings.session_max_results`` resultados; al superarlo se
+descartan los usados hace más tiempo.
+"""
+
+import json
+import os
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from config_manager import get_config
+from indicator_cube import IndicatorCube
+
+CLAVES_PROYECCION = ('sheet_names', 'units', 'years')
+
+
+def _cubre(actual: Dict[str, Optional[list]], pedida: Dict[str, Optional[list]]) -> bool:
+    """True si la selección ``actual`` incluye a ``pedida`` (None = sin filtro)."""
+    for clave in CLAVES_PROYECCION:
+        if actual[clave] is None:
+            continue
+        if pedida[clave] is None or not set(pedida[clave]) <= set(actual[clave]):
+            return False
+    return True
+
+
+def _unir(actual: Dict[str, Optional[list]], pedida: Dict[str, Optional[list]]) -> Dict[str, Optional[list]]:
+    """Selección mínima que cubre a ambas, conservando el orden de ``actual``."""
+    union = {}
+    for clave in CLAVES_PROYECCION:
+        if actual[clave] is None or pedida[clave] is None:
+            union[clave] = None
+        else:
+            union[clave] = list(actual[clave]) + [v for v in pedida[clave] if v not in actual[clave]]
+    return union
+
+
+class AnalysisSession:
+    """
+    Datos cargados, frames derivados y modelos ajustados de un proyecto.
+
+    Example:
+        >>> session = AnalysisSession()
+        >>> cube = session.cube_for_config(project_config.cross_section_config)
+        >>> PCAAnalysisLogic.run_cross_section_analysis_logic(cfg, 2020, session=session)
+
+    Attributes:
+        data_file (Optional[str]): Archivo al que corresponden los datos en memoria.
+        loads (int): Lecturas del archivo realizadas por la sesión (diagnóstico).
+    """
+
+    def __init__(self, data_file: Optional[str] = None):
+        self.data_file: Optional[str] = None
+        self.loads = 0
+        self._huella: Optional[tuple] = None
+        self._cube: Optional[IndicatorCube] = None
+        self._proyeccion: Optional[Dict[str, Optional[list]]] = None
+        self._resultados: "OrderedDict[str, Any]" = OrderedDict()
+        if data_file:
+            self.set_data_file(data_file)
+
+    @staticmethod
+    def _huella_archivo(data_file: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(data_file)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def invalidate(self):
+        """Descarta el cubo, los frames y los modelos en memoria."""
+        self._cube = None
+        self._proyeccion = None
+        self._resultados.clear()
+
+    def set_data_file(self, data_file: Optional[str]) -> bool:
+        """
+        Asocia la sesión a ``data_file``. Invalida todo si el archivo es otro o si
+        cambió en disco desde la última lectura.
+
+        Returns:
+            bool: True si se invalidó lo que había en memoria.
+        """
+        ruta = os.path.abspath(data_file) if data_file else None
+        huella = self._huella_archivo(ruta) if ruta else None
+        if ruta == self.data_file and huella == self._huella:
+            return False
+        had_data = self._cube is not None or bool(self._resultados)
+        self.invalidate()
+        self.data_file = ruta
+        self._huella = huella
+        return had_data
+
+    @property
+    def loaded_cube(self) -> Optional[IndicatorCube]:
+        """Cubo en memoria (sin leer el archivo), o None."""
+        return self._cube
+
+    def cube(self, data_file: Optional[str] = None, indicators: Optional[List[str]] = None,
+             units: Optional[List] = None, years: Optional[List] = None) -> Optional[IndicatorCube]:
+        """
+        Cubo que contiene la selección pedida, leyendo el archivo solo si el cubo
+        en memoria no la cubre (ver ``IndicatorCube.from_file``).
+
+        Args:
+            data_file (Optional[str]): Archivo de datos. Por defecto el de la sesión.
+            indicators, units, years: Selección requerida; None significa todos.
+
+        Returns:
+            IndicatorCube | None: None si el archivo no se pudo cargar.
+        """
+        self.set_data_file(data_file or self.data_file)
+        if self.data_file is None:
+            return None
+        pedida = {
+            'sheet_names': None if indicators is None else list(indicators),
+            'units': None if units is None else list(units),
+            'years': None if years is None else [int(y) for y in years],
+        }
+        if self._cube is not None and _cubre(self._proyeccion, pedida):
+            return self._cube
+
+        proyeccion = pedida if self._cube is None else _unir(self._proyeccion, pedida)
+        cube = IndicatorCube.from_file(self.data_file, proyeccion['sheet_names'],
+                                       units=proyeccion['units'], years=proyeccion['years'])
+        self.loads += 1
+        if cube is None:
+            return None
+        self._cube, self._proyeccion = cube, proyeccion
+        return cube
+
+    def cube_for_config(self, cfg: dict) -> Optional[IndicatorCube]:
+        """Cubo con la selección de un análisis (``ProjectConfig.series_config``, etc.)."""
+        import data_loader_module as dl
+
+        proyeccion = dl.proyeccion_desde_config(cfg)
+        return self.cube(cfg.get("data_file"), proyeccion['sheet_names'],
+                         units=proyeccion['units'], years=proyeccion['years'])
+
+    def result_key(self, flujo: str, *partes) -> str:
+        """
+        Clave de un resultado: flujo, archivo y su huella (tamaño y fecha de
+        modificación), partes propias de la llamada (selección, año, imputación...)
+        y la configuración de PCA/procesamiento vigente.
+        """
+        if self.data_file is not None:
+            self.set_data_file(self.data_file)
+        config = get_config()
+        return json.dumps([flujo, self.data_file, self._huella, list(partes), asdict(config.pca),
+                           asdict(config.data_processing)], sort_keys=True, default=str)
+
+    def get_result(self, key: str) -> Optional[dict]:
+        """
+        Resultado guardado (frames y modelos), o None. No debe modificarse in situ.
+        Si el archivo cambió en disco se invalida la sesión y no se devuelve nada.
+        """
+        if self.data_file is not None:
+            self.set_data_file(self.data_file)
+        results = self._resultados.get(key)
+        if results is not None:
+            self._resultados.move_to_end(key)
+        return results
+
+    def store_result(self, key: str, results: dict):
+        """
+        Guarda el resultado de un flujo. Los errores no se guardan (p. ej. archivo
+        ilegible). Se descartan los resultados usados hace más tiempo por encima de
+        ``PerformanceSettings.session_max_results``.
+        """
+        if results is None or "error" in results:
+            return
+        self._resultados[key] = results
+        self._resultados.move_to_end(key)
+        limite = get_config().performance.session_max_results
+        while len(self._resultados) > limite:
+            self._resultados.popitem(last=False)
+
+    @property
+    def n_results(self) -> int:
+        return len(self._resultados)
@@ -0,0 +1,66 @@
+# benchmarks/bench_excel_engines.py
+"""
+Micro-benchmark de los lectores de Excel disponibles para ``load_excel_file``.
+
+Para cada libro incluido en el repositorio parsea todas las hojas con cada
+engine instalado (openpyxl, calamine, ...) y reporta el mejor tiempo y el
+speedup respecto a openpyxl, además de si los DataFrames resultantes coinciden
+en forma con los de openpyxl. El cache en disco no interviene.
+
+Uso:
+    python benchmarks/bench_excel_engines.py [--repeticiones 3]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import data_loader_module as dl
+
+LIBROS = [
+    ROOT / "Programa Socioeconómicos" / "SOCIOECONOMICOS.xlsx",
+    ROOT / "Programa Socioeconómicos" / "INDICADORES WDI_V8_vf.xlsm",
+    ROOT / "Fortun 500" / "FORTUNE__NUEVO_V1.xlsx",
+    ROOT / "Fortun 500" / "Fortune_V1.xlsm",
+]
+
+
+def _parsear(file_path, engine):
+    with pd.ExcelFile(file_path, engine=engine) as excel_data:
+        return {name: excel_data.parse(name) for name in excel_data.sheet_names}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    engines = [e for e in ('openpyxl', 'calamine') if dl._engine_available(e)]
+    print(f"Engines instalados: {engines}  (auto -> {dl.resolve_excel_engine('auto') or 'openpyxl'})")
+    print(f"{'Libro':<32} {'Engine':<10} {'Tiempo (s)':>11} {'vs openpyxl':>12} {'Formas iguales':>15}")
+    for libro in LIBROS:
+        if not libro.exists():
+            continue
+        referencia, t_referencia = None, None
+        for engine in engines:
+            tiempos = []
+            for _ in range(args.repeticiones):
+                inicio = time.perf_counter()
+                hojas = _parsear(libro, engine)
+                tiempos.append(time.perf_counter() - inicio)
+            t = min(tiempos)
+            if referencia is None:
+                referencia, t_referencia = hojas, t
+            iguales = list(hojas) == list(referencia) and all(
+                hojas[n].shape == referencia[n].shape for n in referencia)
+            print(f"{libro.name[:32]:<32} {engine:<10} {t:>11.3f} {t_referencia / t:>11.2f}x {str(iguales):>15}")
+
+
+if __name__ == "__main__":
+    main()
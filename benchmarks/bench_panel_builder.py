@@ -0,0 +1,112 @@
+# benchmarks/bench_panel_builder.py
+"""
+Micro-benchmark de ``preparar_datos_panel_longitudinal``.
+
+Compara el constructor de panel en una sola pasada con la implementación
+anterior (melt por indicador + ``reduce(pd.merge(how='outer'))``), copiada
+aquí como referencia. Usa libros sintéticos de 150 países x 60 años con
+5, 20 y 50 indicadores y verifica que ambas salidas sean idénticas.
+
+Uso:
+    python benchmarks/bench_panel_builder.py [--repeticiones 3]
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from functools import reduce
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import data_loader_module as dl
+
+COL_PAISES = 'Unnamed: 0'
+
+
+def panel_legacy(all_sheets_data, selected_indicators_codes, selected_countries_codes, col_paises_nombre_original=COL_PAISES):
+    """Implementación anterior: melt por indicador y merges externos encadenados."""
+    panel_data_list = []
+    for indicator_code in selected_indicators_codes:
+        if indicator_code not in all_sheets_data:
+            continue
+        df_indicator = all_sheets_data[indicator_code].copy()
+        if df_indicator.index.name == col_paises_nombre_original:
+            df_indicator.reset_index(inplace=True)
+        if col_paises_nombre_original not in df_indicator.columns:
+            continue
+        df_indicator = df_indicator[df_indicator[col_paises_nombre_original].isin(selected_countries_codes)]
+        if df_indicator.empty:
+            continue
+        panel_data_list.append(df_indicator.melt(
+            id_vars=[col_paises_nombre_original], var_name='Año', value_name=indicator_code))
+
+    if not panel_data_list:
+        return pd.DataFrame()
+    if len(panel_data_list) == 1:
+        df_panel_final = panel_data_list[0]
+    else:
+        df_panel_final = reduce(lambda left, right: pd.merge(left, right, on=[col_paises_nombre_original, 'Año'], how='outer'), panel_data_list)
+
+    df_panel_final.rename(columns={col_paises_nombre_original: 'País'}, inplace=True)
+    df_panel_final['Año'] = pd.to_numeric(df_panel_final['Año'], errors='coerce')
+    df_panel_final.dropna(subset=['Año'], inplace=True)
+    df_panel_final['Año'] = df_panel_final['Año'].astype(int)
+    df_panel_final.sort_values(by=['País', 'Año'], inplace=True)
+    df_panel_final.set_index(['País', 'Año'], inplace=True)
+    return df_panel_final
+
+
+def hojas_sinteticas(n_indicadores, n_paises=150, n_anios=60, semilla=0):
+    """Libro en memoria con el formato WDI; cada hoja omite algunos países y años."""
+    rng = np.random.default_rng(semilla)
+    paises = [f'PAIS_{i:03d}' for i in range(n_paises)]
+    anios = list(range(1960, 1960 + n_anios))
+    hojas = {}
+    for i in range(n_indicadores):
+        filas = sorted(rng.choice(n_paises, size=n_paises - rng.integers(0, 10), replace=False))
+        cols = [a for a in anios if rng.random() > 0.05]
+        valores = rng.normal(size=(len(filas), len(cols)))
+        valores[rng.random(valores.shape) < 0.1] = np.nan
+        df = pd.DataFrame(valores, columns=cols)
+        df.insert(0, COL_PAISES, [paises[j] for j in filas])
+        hojas[f'IND_{i:02d}'] = df
+    return hojas, paises
+
+
+def _mejor_tiempo(func, repeticiones):
+    tiempos, resultado = [], None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado = func()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'Indicadores':>11} {'Filas':>7} {'Anterior (s)':>13} {'Una pasada (s)':>15} {'Speedup':>8} {'Idénticos':>10}")
+    for n_indicadores in (5, 20, 50):
+        hojas, paises = hojas_sinteticas(n_indicadores)
+        indicadores = list(hojas)
+        t_legacy, legacy = _mejor_tiempo(
+            lambda: panel_legacy(hojas, indicadores, paises), args.repeticiones)
+        t_nuevo, nuevo = _mejor_tiempo(
+            lambda: dl.preparar_datos_panel_longitudinal(hojas, indicadores, paises), args.repeticiones)
+        identicos = nuevo.equals(legacy) and nuevo.index.equals(legacy.index)
+        print(f"{n_indicadores:>11} {len(nuevo):>7} {t_legacy:>13.3f} {t_nuevo:>15.3f} "
+              f"{t_legacy / t_nuevo:>7.1f}x {str(identicos):>10}")
+
+
+if __name__ == "__main__":
+    main()
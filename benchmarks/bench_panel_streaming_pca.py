@@ -0,0 +1,99 @@
+# benchmarks/bench_panel_streaming_pca.py
+"""
+Pico de memoria del PCA 3D de panel en memoria frente al modo por bloques.
+
+Guarda un cubo sintético empresa-año (unidades × 30 años × 20 indicadores, con
+faltantes) como .npz, lo abre mapeado en memoria y ejecuta
+``PCAPanel3DLogic.run_panel3d_analysis_logic`` con ``streaming=False`` (panel
+completo, imputado y estandarizado en memoria) y ``streaming=True`` (bloques de
+``panel_units_per_chunk`` unidades volcados a disco, puntuaciones en un .npy).
+Mide el pico de ``tracemalloc`` y el tiempo de cada modo y la diferencia máxima
+entre las puntuaciones.
+
+Uso:
+    python benchmarks/bench_panel_streaming_pca.py [--repeticiones 3] [--unidades 2000 10000 40000]
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from indicator_cube import IndicatorCube
+from pca_panel3d_logic import PCAPanel3DLogic
+
+N_INDICADORES = 20
+ANIOS = range(1995, 2025)
+
+
+def cubo_sintetico(n_unidades, directorio, semilla=0):
+    """Cubo .npz con estructura de rango bajo por unidad y 5% de celdas faltantes, abierto mapeado."""
+    rng = np.random.default_rng(semilla)
+    factores = rng.normal(size=(n_unidades, len(ANIOS), 4)).cumsum(axis=1)
+    cargas = rng.normal(size=(4, N_INDICADORES))
+    valores = (factores @ cargas + rng.normal(scale=0.5, size=(n_unidades, len(ANIOS), N_INDICADORES)))
+    valores = np.ascontiguousarray(valores.transpose(2, 0, 1))
+    valores[rng.random(valores.shape) < 0.05] = np.nan
+    cubo = IndicatorCube(valores, [f'IND_{i:02d}' for i in range(N_INDICADORES)],
+                         [f'EMP_{i:06d}' for i in range(n_unidades)], ANIOS)
+    archivo = Path(directorio) / f"cubo_{n_unidades}.npz"
+    cubo.to_npz(str(archivo))
+    return IndicatorCube.from_npz(str(archivo))
+
+
+def _medir(func, repeticiones):
+    """Mejor tiempo y pico de tracemalloc (MB) de la última repetición."""
+    tiempos, resultado, pico = [], None, 0
+    for _ in range(repeticiones):
+        resultado = None
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            resultado = func()
+        tiempos.append(time.perf_counter() - inicio)
+        pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return min(tiempos), pico, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--unidades", type=int, nargs='+', default=[2000, 10000, 40000])
+    args = parser.parse_args()
+
+    print(f"{'Unidades':>9} {'Filas':>8} {'Memoria (s)':>12} {'Pico (MB)':>10} "
+          f"{'Bloques (s)':>12} {'Pico (MB)':>10} {'Reducción':>10} {'Dif. máx.':>10}")
+    with tempfile.TemporaryDirectory() as directorio:
+        for n_unidades in args.unidades:
+            cubo = cubo_sintetico(n_unidades, directorio)
+            indicadores, unidades = list(cubo.indicators), list(cubo.units)
+
+            def correr(streaming):
+                return PCAPanel3DLogic.run_panel3d_analysis_logic(
+                    None, indicadores, indicadores, unidades, cube=cubo,
+                    imputation_strategy='interpolacion', streaming=streaming)
+
+            t_mem, pico_mem, en_memoria = _medir(lambda: correr(False), args.repeticiones)
+            t_blq, pico_blq, por_bloques = _medir(lambda: correr(True), args.repeticiones)
+            scores_mem = en_memoria['df_pc_scores_panel'].to_numpy()
+            scores_blq = por_bloques['df_pc_scores_panel'].to_numpy()
+            diferencia = np.abs(scores_mem - scores_blq).max()
+            print(f"{n_unidades:>9} {len(scores_blq):>8} {t_mem:>12.3f} {pico_mem:>10.1f} "
+                  f"{t_blq:>12.3f} {pico_blq:>10.1f} {pico_mem / pico_blq:>9.1f}x {diferencia:>10.1e}")
+            del cubo, en_memoria, por_bloques
+
+
+if __name__ == "__main__":
+    main()
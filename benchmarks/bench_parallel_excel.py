@@ -0,0 +1,83 @@
+# benchmarks/bench_parallel_excel.py
+"""
+Benchmark de la carga paralela de hojas (``load_excel_file(parallel=True)``).
+
+Mide, para un número creciente de hojas de los libros WDI y FORTUNE incluidos
+en el repositorio, el tiempo de parseo secuencial frente al reparto en procesos
+y reporta el speedup. El cache en disco se desactiva para medir cargas en frío.
+
+Uso:
+    python benchmarks/bench_parallel_excel.py [--repeticiones 3]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import os
+
+import data_loader_module as dl
+from performance_optimizer import parallel_process
+from config_manager import get_config
+
+LIBROS = [
+    ROOT / "Programa Socioeconómicos" / "INDICADORES WDI_V8_vf.xlsm",
+    ROOT / "Programa Socioeconómicos" / "INDICADORES WDI_V2.xlsx",
+    ROOT / "Fortun 500" / "FORTUNE_VF5.xlsx",
+    ROOT / "Fortun 500" / "FORTUNE__NUEVO_V1.xlsx",
+    ROOT / "Fortun 500" / "Fortune_V1.xlsm",
+]
+
+
+def _secuencial(file_path, sheet_names):
+    excel_data = pd.ExcelFile(file_path, engine=dl.resolve_excel_engine())
+    return {name: excel_data.parse(name) for name in sheet_names}
+
+
+def _paralelo(file_path, sheet_names):
+    n_workers = get_config().performance.max_workers or os.cpu_count() or 1
+    engine = dl.resolve_excel_engine()
+    tasks = [(str(file_path), grupo, engine) for grupo in dl._split_sheets_for_workers(sheet_names, n_workers)]
+    results = parallel_process(dl._parse_sheets_compact, tasks, use_processes=True)
+    return {name: dl._payload_to_frame(payload)
+            for grupo in results for name, payload, _ in grupo if payload is not None}
+
+
+def _medir(func, *args, repeticiones=3):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        func(*args)
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    perf = get_config().performance
+    print(f"Workers: {perf.max_workers or os.cpu_count()}  "
+          f"(paralelismo {'habilitado' if perf.enable_parallel_processing else 'deshabilitado'})")
+    print(f"{'Libro':<40} {'Hojas':>5} {'Secuencial (s)':>15} {'Paralelo (s)':>13} {'Speedup':>8}")
+    for libro in LIBROS:
+        if not libro.exists():
+            continue
+        sheet_names = pd.ExcelFile(libro).sheet_names
+        conteos = sorted({n for n in (1, 2, 4, 8, 16, len(sheet_names)) if n <= len(sheet_names)})
+        for n in conteos:
+            hojas = sheet_names[:n]
+            t_seq = _medir(_secuencial, libro, hojas, repeticiones=args.repeticiones)
+            t_par = _medir(_paralelo, libro, hojas, repeticiones=args.repeticiones)
+            print(f"{libro.name[:40]:<40} {n:>5} {t_seq:>15.3f} {t_par:>13.3f} {t_seq / t_par:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
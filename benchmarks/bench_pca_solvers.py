@@ -0,0 +1,88 @@
+# benchmarks/bench_pca_solvers.py
+"""
+Micro-benchmark de los solvers SVD de ``PCA`` según la forma de los datos.
+
+Ajusta ``PCA(n_components=k, svd_solver=...)`` con 'full', 'covariance_eigh',
+'randomized' y 'arpack' sobre matrices sintéticas con la forma de nuestros
+libros: cortes transversales (unidades × indicadores), paneles empresa-año
+altos y matrices anchas. Los datos tienen estructura de rango bajo más ruido,
+como los indicadores estandarizados. Para cada forma y ``k`` muestra el tiempo
+de cada solver, el que elige ``pca_module.elegir_solver_svd`` ('auto') y el
+error máximo de la varianza explicada frente a 'full'. De aquí salen los
+umbrales de ``elegir_solver_svd``.
+
+Uso:
+    python benchmarks/bench_pca_solvers.py [--repeticiones 3]
+"""
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+from sklearn.decomposition import PCA
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from pca_module import elegir_solver_svd
+
+SOLVERS = ('full', 'covariance_eigh', 'randomized', 'arpack')
+
+# (descripción, filas, columnas)
+FORMAS = (
+    ('corte WDI', 60, 25),
+    ('corte Fortune', 500, 40),
+    ('panel WDI', 1500, 25),
+    ('panel Fortune', 20000, 40),
+    ('panel ancho', 20000, 300),
+    ('matriz ancha', 800, 2000),
+    ('grande', 5000, 1500),
+)
+
+
+def matriz_sintetica(n_filas, n_columnas, rango=8, semilla=0):
+    rng = np.random.default_rng(semilla)
+    X = rng.normal(size=(n_filas, rango)) @ rng.normal(size=(rango, n_columnas))
+    X += 0.5 * rng.normal(size=(n_filas, n_columnas))
+    return (X - X.mean(axis=0)) / X.std(axis=0)
+
+
+def _mejor_tiempo(func, repeticiones):
+    tiempos, resultado = [], None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = func()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    encabezado = ''.join(f"{s:>17}" for s in SOLVERS)
+    print(f"{'Forma':>14} {'Filas':>6} {'Cols':>5} {'k':>4}{encabezado} {'auto':>16} {'Err. EVR':>9}")
+    for nombre, n_filas, n_columnas in FORMAS:
+        X = matriz_sintetica(n_filas, n_columnas)
+        for k in sorted({k for k in (2, 3, 30) if k < min(n_filas, n_columnas)} | {min(n_filas, n_columnas)}):
+            tiempos, evr = {}, {}
+            for solver in SOLVERS:
+                if solver == 'arpack' and k >= min(n_filas, n_columnas):
+                    continue  # arpack requiere k < min(filas, columnas)
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    tiempos[solver], modelo = _mejor_tiempo(
+                        lambda: PCA(n_components=k, svd_solver=solver, random_state=42).fit(X), args.repeticiones)
+                evr[solver] = modelo.explained_variance_ratio_
+            elegido = elegir_solver_svd(n_filas, n_columnas, k)
+            error = max(np.abs(evr[s] - evr['full']).max() for s in evr)
+            celdas = ''.join(f"{tiempos[s]:>16.4f}s" if s in tiempos else f"{'-':>17}" for s in SOLVERS)
+            print(f"{nombre:>14} {n_filas:>6} {n_columnas:>5} {k:>4}{celdas} {elegido:>16} {error:>9.1e}")
+
+
+if __name__ == "__main__":
+    main()
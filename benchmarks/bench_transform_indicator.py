@@ -0,0 +1,100 @@
+# benchmarks/bench_transform_indicator.py
+"""
+Micro-benchmark de ``transformar_df_indicador_v1``.
+
+Compara la conversión a numérico por bloque con la implementación anterior
+(copia defensiva + ``pd.to_numeric`` columna por columna), copiada aquí como
+referencia. Usa hojas sintéticas de 60 años con 50, 200 y 1000 países, tanto
+numéricas como con marcadores de texto ('..') que fuerzan dtype object, y
+verifica que ambas salidas sean idénticas.
+
+Uso:
+    python benchmarks/bench_transform_indicator.py [--repeticiones 5]
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import data_loader_module as dl
+
+COL_PAISES = 'Unnamed: 0'
+
+
+def transformar_legacy(df_original, col_paises_nombre_original=COL_PAISES, nuevo_nombre_indice_paises='Pais'):
+    """Implementación anterior: copia completa y to_numeric por país."""
+    if df_original is None or df_original.empty:
+        return None
+    df = df_original.copy()
+    if col_paises_nombre_original not in df.columns:
+        return None
+    df.set_index(col_paises_nombre_original, inplace=True)
+    df.index.name = nuevo_nombre_indice_paises
+    df_transformado = df.transpose()
+    df_transformado.index.name = 'Año'
+    df_transformado.index = pd.to_numeric(df_transformado.index, errors='coerce')
+    df_transformado.dropna(axis=0, how='all', subset=None, inplace=True)
+    df_transformado = df_transformado[df_transformado.index.notna()]
+    if df_transformado.empty:
+        return None
+    try:
+        df_transformado.index = df_transformado.index.astype(int)
+    except ValueError:
+        pass
+    for col_pais in df_transformado.columns:
+        df_transformado[col_pais] = pd.to_numeric(df_transformado[col_pais], errors='coerce')
+    df_transformado.dropna(axis=1, how='all', inplace=True)
+    return df_transformado
+
+
+def hoja_sintetica(n_paises, n_anios=60, con_texto=False, semilla=0):
+    """Hoja con el formato WDI; opcionalmente con celdas '..' como en las descargas del WDI."""
+    rng = np.random.default_rng(semilla)
+    valores = rng.normal(size=(n_paises, n_anios))
+    valores[rng.random(valores.shape) < 0.1] = np.nan
+    df = pd.DataFrame(valores, columns=list(range(1960, 1960 + n_anios)))
+    if con_texto:
+        df = df.astype(object)
+        df[rng.random(df.shape) < 0.05] = '..'
+    df.insert(0, COL_PAISES, [f'PAIS_{i:04d}' for i in range(n_paises)])
+    df['Notas'] = 'fuente'
+    return df
+
+
+def _mejor_tiempo(func, repeticiones):
+    tiempos, resultado = [], None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            resultado = func()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'Países':>7} {'Texto':>6} {'Anterior (s)':>13} {'Por bloque (s)':>15} {'Speedup':>8} {'Idénticos':>10}")
+    for n_paises in (50, 200, 1000):
+        for con_texto in (False, True):
+            df = hoja_sintetica(n_paises, con_texto=con_texto)
+            t_legacy, legacy = _mejor_tiempo(lambda: transformar_legacy(df), args.repeticiones)
+            t_nuevo, nuevo = _mejor_tiempo(lambda: dl.transformar_df_indicador_v1(df), args.repeticiones)
+            identicos = nuevo.equals(legacy) and nuevo.index.equals(legacy.index) and nuevo.columns.equals(legacy.columns)
+            print(f"{n_paises:>7} {str(con_texto):>6} {t_legacy:>13.4f} {t_nuevo:>15.4f} "
+                  f"{t_legacy / t_nuevo:>7.1f}x {str(identicos):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -36,6 +36,7 @@ def check_dependencies() -> Tuple[List[str], List[str]]:
         'pandas': 'Manejo y análisis de datos',
         'numpy': 'Computación numérica',
         'sklearn': 'Algoritmos de machine learning (PCA)',
+        'scipy': 'Índices de vecinos para la imputación KNN',
         'matplotlib': 'Generación de gráficos',
         'openpyxl': 'Lectura/escritura de archivos Excel',
         'tkinter': 'Interfaz gráfica (incluido en Python estándar)'
@@ -43,7 +44,9 @@ def check_dependencies() -> Tuple[List[str], List[str]]:
     
     # Dependencias opcionales (mejoran la experiencia pero no son críticas)
     optional_deps = {
-        'adjustText': 'Mejora automática de posicionamiento de etiquetas en gráficos'
+        'adjustText': 'Mejora automática de posicionamiento de etiquetas en gráficos',
+        'python_calamine': 'Lector rápido de Excel (engine="calamine" de pandas)',
+        'pyarrow': 'Lectura de archivos Parquet/Feather con memory-mapping'
     }
     
     available = []
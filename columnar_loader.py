@@ -0,0 +1,269 @@
+# columnar_loader.py
+"""
+Lectura de formatos columnares (CSV, Parquet, Feather, NPZ) con la misma salida
+que la carga de libros Excel.
+
+Todos los lectores retornan ``{indicador: DataFrame}`` donde cada DataFrame tiene
+el formato ancho de una hoja del libro: columna 'Unnamed: 0' con las unidades y
+una columna float64 por año (enteros). Así el resto del flujo (``IndicatorCube``,
+``transformar_df_indicador_v1``, preparación de cortes y paneles) no distingue el
+origen de los datos.
+
+Disposiciones admitidas para CSV/Parquet/Feather:
+
+- Ancha: una fila por (indicador, unidad) y una columna por año, como la
+  exportación CSV del WDI ('Country Name', 'Series Name', '2000 [YR2000]', ...).
+  Si no hay columna de indicador, el archivo completo es un único indicador.
+- Larga (tidy): columnas de unidad, año, indicador y valor.
+
+NPZ guarda un cubo (``IndicatorCube.to_npz``): arrays ``values`` (indicadores x
+unidades x años), ``indicators``, ``units`` y ``years``.
+
+Lecturas mapeadas en memoria cuando el formato lo permite: ``read_csv(memory_map=True)``,
+Parquet/Feather con ``pyarrow`` (``memory_map=True``) y, en NPZ sin compresión,
+``values`` se mapea directamente desde el .zip con ``np.memmap``.
+"""
+
+import importlib.util
+import os
+import re
+import struct
+import zipfile
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+COL_UNIDADES = 'Unnamed: 0'
+COLUMNAR_EXTENSIONS = ('.csv', '.parquet', '.feather', '.npz')
+
+# Nombres de columna reconocidos (sin distinguir mayúsculas), en orden de preferencia
+CANDIDATOS_INDICADOR = ['indicator', 'indicador', 'series name', 'series', 'serie', 'variable']
+CANDIDATOS_UNIDAD = [COL_UNIDADES, 'country name', 'country', 'país', 'pais', 'unit', 'unidad',
+                     'empresa', 'company', 'country code']
+CANDIDATOS_ANIO = ['year', 'año', 'anio', 'time']
+CANDIDATOS_VALOR = ['value', 'valor']
+
+# '2000', 2000, '2000.0' o el formato de encabezado del WDI '2000 [YR2000]'
+_PATRON_ANIO = re.compile(r'^\s*(\d{4})(?:\.0+)?(?:\s*\[YR\d{4}\])?\s*$')
+
+
+def is_columnar_file(file_path: str) -> bool:
+    return str(file_path).lower().endswith(COLUMNAR_EXTENSIONS)
+
+
+def _anio_de_etiqueta(label) -> Optional[int]:
+    match = _PATRON_ANIO.match(str(label))
+    return int(match.group(1)) if match else None
+
+
+def _buscar_columna(columns, candidatos, explicita: Optional[str] = None) -> Optional[str]:
+    if explicita is not None:
+        return explicita if explicita in columns else None
+    por_nombre = {str(c).strip().lower(): c for c in columns}
+    for candidato in candidatos:
+        if candidato.lower() in por_nombre:
+            return por_nombre[candidato.lower()]
+    return None
+
+
+def _a_numerico(bloque: np.ndarray) -> np.ndarray:
+    """Convierte el bloque de valores a float64 en una sola operación ('..' y texto pasan a NaN)."""
+    if bloque.dtype.kind not in 'biuf':
+        bloque = pd.to_numeric(bloque.ravel(), errors='coerce').reshape(bloque.shape)
+    return np.asarray(bloque, dtype=np.float64)
+
+
+def _hoja_ancha(unidades, anios, valores: np.ndarray) -> pd.DataFrame:
+    df = pd.DataFrame(valores, columns=pd.Index(list(anios), dtype=object), copy=False)
+    df.insert(0, COL_UNIDADES, list(unidades))
+    return df
+
+
+def hojas_desde_tabla(df: pd.DataFrame, nombre_por_defecto: str = 'Indicador',
+                      col_indicador: Optional[str] = None, col_unidad: Optional[str] = None,
+                      col_anio: Optional[str] = None, col_valor: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Convierte una tabla (ancha o larga) en hojas por indicador con el formato del libro Excel.
+
+    Args:
+        df (pd.DataFrame): Tabla leída del archivo.
+        nombre_por_defecto (str): Nombre del indicador si la tabla ancha no tiene columna de indicador.
+        col_indicador, col_unidad, col_anio, col_valor (Optional[str]): Nombres de
+            columna explícitos; por defecto se detectan (ver ``CANDIDATOS_*``).
+
+    Returns:
+        Dict[str, pd.DataFrame]: Hojas por indicador, en orden de aparición.
+
+    Raises:
+        ValueError: Si no se encuentra la columna de unidades o ninguna columna de año.
+    """
+    unidad = _buscar_columna(df.columns, CANDIDATOS_UNIDAD, col_unidad)
+    if unidad is None:
+        raise ValueError(f"No se encontró la columna de unidades. Columnas disponibles: {df.columns.tolist()}")
+    indicador = _buscar_columna(df.columns, CANDIDATOS_INDICADOR, col_indicador)
+    anio = _buscar_columna(df.columns, CANDIDATOS_ANIO, col_anio)
+    valor = _buscar_columna(df.columns, CANDIDATOS_VALOR, col_valor)
+
+    if anio is not None and valor is not None:
+        return _hojas_desde_tabla_larga(df, unidad, anio, valor, indicador, nombre_por_defecto)
+
+    columnas_anio = [(c, _anio_de_etiqueta(c)) for c in df.columns if c not in (unidad, indicador)]
+    columnas_anio = [(c, a) for c, a in columnas_anio if a is not None]
+    if not columnas_anio:
+        raise ValueError("No se encontraron columnas de año (p. ej. '2000' o '2000 [YR2000]') "
+                         "ni columnas de año/valor para la disposición larga.")
+    columnas_anio.sort(key=lambda par: par[1])
+
+    filas = df[unidad].notna()
+    if indicador is not None:
+        filas &= df[indicador].notna()
+    df = df[filas]
+    valores = _a_numerico(df[[c for c, _ in columnas_anio]].to_numpy())
+    anios = [a for _, a in columnas_anio]
+    unidades = df[unidad].to_numpy()
+
+    if indicador is None:
+        return {nombre_por_defecto: _hoja_ancha(unidades, anios, valores)}
+    hojas = {}
+    for nombre, posiciones in df.groupby(indicador, sort=False).indices.items():
+        hojas[str(nombre)] = _hoja_ancha(unidades[posiciones], anios, valores[posiciones])
+    return hojas
+
+
+def _hojas_desde_tabla_larga(df, unidad, anio, valor, indicador, nombre_por_defecto) -> Dict[str, pd.DataFrame]:
+    if pd.api.types.is_datetime64_any_dtype(df[anio]):
+        anios = df[anio].dt.year
+    elif pd.api.types.is_numeric_dtype(df[anio]):
+        anios = df[anio]
+    else:
+        anios = pd.to_numeric(df[anio].map(_anio_de_etiqueta), errors='coerce')
+    filas = df[unidad].notna() & anios.notna()
+    if indicador is not None:
+        filas &= df[indicador].notna()
+    filas = filas.to_numpy()
+    unidades = df[unidad].to_numpy()[filas]
+    anios = anios.to_numpy()[filas].astype(int)
+    valores = _a_numerico(df[valor].to_numpy()[filas])
+    grupos = (df[indicador].to_numpy()[filas] if indicador is not None
+              else np.full(len(unidades), nombre_por_defecto, dtype=object))
+
+    hojas = {}
+    for nombre, posiciones in pd.Series(np.arange(len(grupos))).groupby(grupos, sort=False).indices.items():
+        codigos_u, unidades_u = pd.factorize(unidades[posiciones])
+        anios_u, codigos_a = np.unique(anios[posiciones], return_inverse=True)
+        celdas = codigos_u.astype(np.int64) * len(anios_u) + codigos_a
+        if len(np.unique(celdas)) < len(celdas):
+            repetidas = pd.Series(celdas).duplicated().to_numpy()
+            etiquetas = pd.Index(unidades_u).tolist()
+            ejemplos = list(dict.fromkeys((etiquetas[u], int(anios_u[a]))
+                                          for u, a in zip(codigos_u[repetidas], codigos_a[repetidas])))[:5]
+            raise ValueError(f"El indicador '{nombre}' tiene filas repetidas para la misma "
+                             f"(unidad, año), p. ej. {ejemplos}; agrégalas antes de cargar el archivo.")
+        bloque = np.full((len(unidades_u), len(anios_u)), np.nan)
+        bloque[codigos_u, codigos_a] = valores[posiciones]
+        hojas[str(nombre)] = _hoja_ancha(unidades_u, anios_u.tolist(), bloque)
+    return hojas
+
+
+def _requerir_pyarrow(formato: str):
+    if importlib.util.find_spec('pyarrow') is None:
+        raise ImportError(f"Leer archivos {formato} requiere 'pyarrow'. Instálalo con: pip install pyarrow")
+
+
+def leer_tabla(file_path: str) -> pd.DataFrame:
+    """Lee un CSV/Parquet/Feather como DataFrame, mapeando el archivo en memoria cuando se puede."""
+    extension = os.path.splitext(str(file_path))[1].lower()
+    if extension == '.csv':
+        return pd.read_csv(file_path, memory_map=True)
+    if extension == '.parquet':
+        _requerir_pyarrow('Parquet')
+        import pyarrow.parquet as pq
+        return pq.read_table(file_path, memory_map=True).to_pandas()
+    if extension == '.feather':
+        _requerir_pyarrow('Feather')
+        import pyarrow.feather as feather
+        return feather.read_table(file_path, memory_map=True).to_pandas()
+    raise ValueError(f"Formato columnar no soportado: {extension}")
+
+
+def _npz_memmap(file_path: str, member: str) -> Optional[np.ndarray]:
+    """
+    Mapea en memoria un array de un .npz sin compresión (``np.savez``).
+
+    Returns:
+        Optional[np.ndarray]: ``np.memmap`` de solo lectura, o None si el miembro
+        está comprimido (``np.savez_compressed``) y debe leerse completo.
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        info = zf.getinfo(f"{member}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(file_path, 'rb') as f:
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        if local_header[:4] != b'PK\x03\x04':
+            return None
+        name_len, extra_len = struct.unpack('<HH', local_header[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        if dtype.hasobject:
+            return None
+        offset = f.tell()
+    return np.memmap(file_path, dtype=dtype, mode='r', shape=shape,
+                     order='F' if fortran_order else 'C', offset=offset)
+
+
+def leer_cubo_npz(file_path: str) -> Dict[str, np.ndarray]:
+    """Lee los arrays de un cubo .npz; ``values`` queda mapeado en memoria si no está comprimido."""
+    with np.load(file_path, allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files if name != 'values'}
+    faltantes = {'indicators', 'units', 'years'} - set(arrays)
+    if faltantes:
+        raise ValueError(f"El archivo NPZ no tiene el formato de cubo; faltan: {sorted(faltantes)}")
+    values = _npz_memmap(file_path, 'values')
+    if values is None:
+        with np.load(file_path, allow_pickle=False) as npz:
+            values = npz['values']
+    arrays['values'] = values
+    return arrays
+
+
+def _hojas_desde_cubo(arrays: Dict[str, np.ndarray]) -> Dict[str, pd.DataFrame]:
+    values = arrays['values']
+    units = arrays['units'].tolist()
+    years = [int(y) for y in arrays['years']]
+    unit_in_sheet = arrays.get('unit_in_sheet')
+    year_in_sheet = arrays.get('year_in_sheet')
+    hojas = {}
+    for i, nombre in enumerate(arrays['indicators'].tolist()):
+        bloque = values[i]
+        filas = np.ones(len(units), dtype=bool) if unit_in_sheet is None else unit_in_sheet[i]
+        cols = np.ones(len(years), dtype=bool) if year_in_sheet is None else year_in_sheet[i]
+        if not (filas.all() and cols.all()):
+            bloque = bloque[np.ix_(filas, cols)]
+        hojas[str(nombre)] = _hoja_ancha([u for u, f in zip(units, filas) if f],
+                                         [y for y, c in zip(years, cols) if c], bloque)
+    return hojas
+
+
+def load_columnar_file(file_path: str, **column_names) -> Dict[str, pd.DataFrame]:
+    """
+    Carga un archivo CSV/Parquet/Feather/NPZ como hojas por indicador.
+
+    Args:
+        file_path (str): Ruta del archivo.
+        **column_names: ``col_indicador``, ``col_unidad``, ``col_anio``, ``col_valor``
+            para fijar los nombres de columna en lugar de detectarlos.
+
+    Returns:
+        Dict[str, pd.DataFrame]: Igual que ``load_excel_file``.
+    """
+    if str(file_path).lower().endswith('.npz'):
+        return _hojas_desde_cubo(leer_cubo_npz(file_path))
+    nombre = os.path.splitext(os.path.basename(str(file_path)))[0]
+    return hojas_desde_tabla(leer_tabla(file_path), nombre_por_defecto=nombre, **column_names)
@@ -24,11 +24,15 @@ class PCASettings:
     min_variance_threshold: float = 0.95
     random_state: int = 42
     max_components: Optional[int] = None
+    svd_solver: str = 'auto'
     
     def __post_init__(self):
         if isinstance(self.min_variance_threshold, (int, float)):
             if not 0 < self.min_variance_threshold <= 1:
                 raise ValueError("min_variance_threshold debe estar entre 0 y 1")
+        valid_solvers = ['auto', 'full', 'randomized', 'arpack', 'covariance_eigh']
+        if self.svd_solver not in valid_solvers:
+            raise ValueError(f"svd_solver debe ser uno de: {valid_solvers}")
 
 
 @dataclass 
@@ -57,11 +61,20 @@ class DataProcessingSettings:
     standardize_data: bool = True
     remove_constant_columns: bool = True
     correlation_threshold: float = 0.95
+    excel_engine: str = 'auto'
+    knn_backend: str = 'auto'
+    knn_patterns_min_rows: int = 2000
     
     def __post_init__(self):
         valid_imputation = ['interpolation', 'mean', 'median', 'most_frequent', 'drop']
         if self.default_imputation not in valid_imputation:
             raise ValueError(f"default_imputation debe ser uno de: {valid_imputation}")
+        valid_engines = ['auto', 'calamine', 'openpyxl', 'xlrd', 'pyxlsb', 'odf']
+        if self.excel_engine not in valid_engines:
+            raise ValueError(f"excel_engine debe ser uno de: {valid_engines}")
+        valid_knn_backends = ['auto', 'sklearn', 'patrones']
+        if self.knn_backend not in valid_knn_backends:
+            raise ValueError(f"knn_backend debe ser uno de: {valid_knn_backends}")
 
 
 @dataclass
@@ -90,10 +103,34 @@ class PerformanceSettings:
     max_workers: Optional[int] = None
     chunk_size: int = 1000
     memory_limit_mb: int = 1024
+    enable_excel_cache: bool = True
+    excel_cache_dir: Optional[str] = None
+    excel_cache_max_mb: int = 512
+    parallel_excel_loading: bool = False
+    enable_metadata_sidecar: bool = True
+    streaming_excel_loading: bool = False
+    enable_preprocessing_cache: bool = True
+    preprocessing_cache_max_mb: int = 256
+    preprocessing_cache_disk: bool = False
+    preprocessing_cache_dir: Optional[str] = None
+    preprocessing_cache_disk_max_mb: int = 1024
+    streaming_panel_pca: bool = False
+    panel_units_per_chunk: int = 100
+    session_max_results: int = 32
     
     def __post_init__(self):
         if self.max_cache_size <= 0:
             raise ValueError("max_cache_size debe ser positivo")
+        if self.excel_cache_max_mb <= 0:
+            raise ValueError("excel_cache_max_mb debe ser positivo")
+        if self.preprocessing_cache_max_mb <= 0 or self.preprocessing_cache_disk_max_mb <= 0:
+            raise ValueError("preprocessing_cache_max_mb y preprocessing_cache_disk_max_mb deben ser positivos")
+        if self.memory_limit_mb <= 0:
+            raise ValueError("memory_limit_mb debe ser positivo")
+        if self.panel_units_per_chunk <= 0:
+            raise ValueError("panel_units_per_chunk debe ser positivo")
+        if self.session_max_results <= 0:
+            raise ValueError("session_max_results debe ser positivo")
 
 
 @dataclass
@@ -198,7 +235,21 @@ class ConfigManager:
             'PCA_THEME': ('ui.theme', str),
             'PCA_LANGUAGE': ('ui.language', str),
             'PCA_MAX_CACHE_SIZE': ('performance.max_cache_size', int),
+            'PCA_EXCEL_CACHE': ('performance.enable_excel_cache', bool),
+            'PCA_EXCEL_CACHE_DIR': ('performance.excel_cache_dir', str),
+            'PCA_METADATA_SIDECAR': ('performance.enable_metadata_sidecar', bool),
+            'PCA_STREAMING_EXCEL': ('performance.streaming_excel_loading', bool),
+            'PCA_MEMORY_LIMIT_MB': ('performance.memory_limit_mb', int),
+            'PCA_PREPROCESSING_CACHE': ('performance.enable_preprocessing_cache', bool),
+            'PCA_PREPROCESSING_CACHE_DISK': ('performance.preprocessing_cache_disk', bool),
+            'PCA_PREPROCESSING_CACHE_DIR': ('performance.preprocessing_cache_dir', str),
+            'PCA_STREAMING_PANEL': ('performance.streaming_panel_pca', bool),
+            'PCA_PANEL_UNITS_PER_CHUNK': ('performance.panel_units_per_chunk', int),
+            'PCA_SESSION_MAX_RESULTS': ('performance.session_max_results', int),
             'PCA_DEFAULT_IMPUTATION': ('data_processing.default_imputation', str),
+            'PCA_EXCEL_ENGINE': ('data_processing.excel_engine', str),
+            'PCA_KNN_BACKEND': ('data_processing.knn_backend', str),
+            'PCA_SVD_SOLVER': ('pca.svd_solver', str),
         }
         
         for env_var, (config_path, data_type) in env_mapping.items():
@@ -272,7 +323,8 @@ class ConfigManager:
             'data_processing': {
                 'default_imputation': 'interpolation',
                 'max_missing_ratio': 0.5,
-                'standardize_data': True
+                'standardize_data': True,
+                'excel_engine': 'auto'
             },
             'ui': {
                 'theme': 'light',
@@ -282,7 +334,12 @@ class ConfigManager:
             'performance': {
                 'max_cache_size': 128,
                 'enable_parallel_processing': True,
-                'chunk_size': 1000
+                'chunk_size': 1000,
+                'enable_excel_cache': True,
+                'excel_cache_max_mb': 512,
+                'enable_metadata_sidecar': True,
+                'streaming_excel_loading': False,
+                'memory_limit_mb': 1024
             },
             'debug_mode': False,
             'log_level': 'INFO'
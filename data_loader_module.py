@@ -14,24 +14,421 @@ Fecha: 2025
 """
 import pandas as pd
 import numpy as np
-from functools import reduce 
+import psutil
+import os
+import sys
+import json
+import hashlib
+import itertools
+import atexit
+import shutil
+import tempfile
+import importlib.util
 import traceback
+from collections.abc import Mapping
+from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple, Union
 
+from config_manager import get_config
+from performance_optimizer import get_workbook_cache, parallel_process
+from columnar_loader import COLUMNAR_EXTENSIONS, is_columnar_file, load_columnar_file
 
-def load_excel_file(file_path: str) -> Optional[Dict[str, pd.DataFrame]]:
+
+# Módulo que debe estar instalado para cada engine de lectura de pandas
+EXCEL_ENGINE_MODULES = {
+    'calamine': 'python_calamine',
+    'openpyxl': 'openpyxl',
+    'xlrd': 'xlrd',
+    'pyxlsb': 'pyxlsb',
+    'odf': 'odf',
+}
+
+# Versión mínima de pandas que reconoce cada engine (``engine='calamine'`` llegó en pandas 2.2)
+EXCEL_ENGINE_MIN_PANDAS = {
+    'calamine': (2, 2),
+}
+
+# Orden de preferencia de 'auto': del lector más rápido al engine por defecto de pandas
+AUTO_ENGINE_PREFERENCE = ['calamine']
+
+
+def _version_pandas() -> Tuple[int, int]:
+    partes = pd.__version__.split('.')
+    try:
+        return int(partes[0]), int(partes[1])
+    except (IndexError, ValueError):
+        return (0, 0)
+
+
+def _engine_available(engine: str) -> bool:
+    """True si el módulo del engine está instalado y la versión de pandas lo admite."""
+    module_name = EXCEL_ENGINE_MODULES.get(engine)
+    if module_name is None or importlib.util.find_spec(module_name) is None:
+        return False
+    return _version_pandas() >= EXCEL_ENGINE_MIN_PANDAS.get(engine, (0, 0))
+
+
+def resolve_excel_engine(engine: Optional[str] = None) -> Optional[str]:
+    """
+    Determina el engine de pandas con el que se leerán los libros Excel.
+
+    Args:
+        engine (Optional[str]): 'auto', el nombre de un engine de pandas
+            ('calamine', 'openpyxl', 'xlrd', 'pyxlsb', 'odf') o None para usar
+            ``data_processing.excel_engine`` de la configuración.
+
+    Returns:
+        Optional[str]: Engine a pasar a ``pd.ExcelFile``. None significa dejar que
+        pandas elija según la extensión (openpyxl para .xlsx/.xlsm, xlrd para .xls).
+
+    Note:
+        - 'auto' elige el lector más rápido instalado (python-calamine, basado en
+          Rust, con pandas >= 2.2) y si no hay ninguno recurre al engine por
+          defecto de pandas.
+        - Si se pide un engine que no está instalado o que la versión de pandas no
+          admite, se avisa y se usa el de pandas.
+    """
+    if engine is None:
+        engine = get_config().data_processing.excel_engine
+    if engine == 'auto':
+        for candidate in AUTO_ENGINE_PREFERENCE:
+            if _engine_available(candidate):
+                return candidate
+        return None
+    if not _engine_available(engine):
+        print(f"Advertencia: El engine de Excel '{engine}' no está instalado o la versión de pandas "
+              f"({pd.__version__}) no lo admite. Se usará el engine por defecto de pandas.")
+        return None
+    return engine
+
+
+# --- Proyección de la carga (indicadores, unidades y años seleccionados) ----------
+
+def proyeccion_desde_config(cfg: Mapping) -> Dict[str, Optional[list]]:
+    """
+    Traduce la selección de un análisis (``ProjectConfig.series_config``, etc.) a los
+    argumentos ``sheet_names``/``units``/``years`` de ``load_excel_file``.
+
+    Las selecciones vacías o ausentes significan "sin filtro" (None).
+
+    Example:
+        >>> hojas = load_excel_file(cfg["data_file"], **proyeccion_desde_config(cfg))
+    """
+    def _lista(key):
+        value = cfg.get(key)
+        if value is None or isinstance(value, str):
+            return None if not value else [value]
+        value = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        return value or None
+
+    years = _lista('selected_years')
+    return {
+        'sheet_names': _lista('selected_indicators'),
+        'units': _lista('selected_units'),
+        'years': None if years is None else [int(y) for y in years],
+    }
+
+
+def _anio_de_columna(label) -> Optional[int]:
+    """Año de un encabezado de columna (2000, '2000' o 2000.0), o None si no es de año."""
+    label = _normalizar_celda(label)
+    return int(label) if label is not None and str(label).isdigit() else None
+
+
+class _ColumnasProyectadas:
+    """
+    ``usecols`` de pandas: conserva la columna de unidades y las columnas de los
+    años seleccionados. Es una clase (y no una lambda) para poder enviarse a los
+    procesos de ``load_excel_file(parallel=True)``.
+    """
+
+    def __init__(self, years, col_paises_nombre_original: str = 'Unnamed: 0'):
+        self.years = {int(y) for y in years}
+        self.col_paises_nombre_original = col_paises_nombre_original
+
+    def __call__(self, label) -> bool:
+        return label == self.col_paises_nombre_original or _anio_de_columna(label) in self.years
+
+
+def proyectar_hoja(df: pd.DataFrame, units: Optional[List] = None, years: Optional[List] = None,
+                   col_paises_nombre_original: str = 'Unnamed: 0') -> pd.DataFrame:
+    """
+    Filtra una hoja ya cargada a las filas de ``units`` y las columnas de ``years``
+    (más la columna de unidades). None en cualquiera de los dos significa sin filtro.
+    """
+    if years is not None:
+        filtro = _ColumnasProyectadas(years, col_paises_nombre_original)
+        df = df.loc[:, [filtro(c) for c in df.columns]]
+    if units is not None and col_paises_nombre_original in df.columns:
+        df = df[df[col_paises_nombre_original].isin(list(units))]
+    return df
+
+
+def _clave_proyeccion(units: Optional[List] = None, years: Optional[List] = None) -> Optional[str]:
+    """Hash estable de la selección de filas/columnas, o None si no hay proyección."""
+    if units is None and years is None:
+        return None
+    seleccion = {
+        'units': None if units is None else sorted(map(str, units)),
+        'years': None if years is None else sorted(int(y) for y in years),
+    }
+    return hashlib.sha1(json.dumps(seleccion, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+def _nombre_en_cache(sheet_name: str, clave: Optional[str]) -> str:
+    """Nombre con el que se guarda una hoja en ``WorkbookDiskCache`` (proyectada o completa)."""
+    return sheet_name if clave is None else f"{sheet_name}@{clave}"
+
+
+def _hoja_desde_cache(cache, file_path: str, sheet_name: str, units=None, years=None,
+                      engine: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """Busca la hoja proyectada en el cache; si no está, proyecta la hoja completa si está guardada."""
+    clave = _clave_proyeccion(units, years)
+    df = cache.get_sheet(file_path, _nombre_en_cache(sheet_name, clave), engine=engine)
+    if df is None and clave is not None:
+        df = cache.get_sheet(file_path, sheet_name, engine=engine)
+        if df is not None:
+            df = proyectar_hoja(df, units, years)
+    return df
+
+
+def _parsear_hoja(excel_data: pd.ExcelFile, sheet_name: str, units=None, years=None) -> pd.DataFrame:
+    """Parsea una hoja leyendo solo las columnas de ``years`` y conservando las filas de ``units``."""
+    usecols = None if years is None else _ColumnasProyectadas(years)
+    df = excel_data.parse(sheet_name, usecols=usecols)
+    return df if units is None else proyectar_hoja(df, units=units)
+
+
+class LazyWorkbook(Mapping):
+    """
+    Libro Excel de solo lectura que parsea cada hoja la primera vez que se accede a ella.
+
+    Se comporta como el diccionario que retorna ``load_excel_file`` (``[]``, ``in``,
+    ``keys()``, ``len()``), pero los nombres de las hojas se leen de los metadatos
+    del libro al abrirlo y cada hoja se parsea solo cuando se pide, guardando el
+    resultado para accesos posteriores. Si el cache en disco está habilitado, las
+    hojas se buscan primero ahí.
+
+    Con ``units``/``years`` cada hoja se parsea ya proyectada (ver ``proyectar_hoja``)
+    y se guarda en el cache bajo una clave propia de esa selección.
+
+    Example:
+        >>> libro = LazyWorkbook.open("INDICADORES WDI_V8_vf.xlsm")
+        >>> libro.sheet_names[:2]
+        ['Compulsory education, duration ', 'Gov exp on educa (% of GDP)']
+        >>> df = libro['GDP growth (annual %)']  # solo esta hoja se parsea
+    """
+
+    def __init__(self, file_path: str, sheet_names: List[str], excel_data: Optional[pd.ExcelFile] = None,
+                 cache=None, engine: Optional[str] = None, units: Optional[List] = None,
+                 years: Optional[List] = None):
+        self.file_path = file_path
+        self.sheet_names = list(sheet_names)
+        self.engine = engine
+        self.units = units
+        self.years = years
+        self._excel_data = excel_data
+        self._cache = cache
+        self._frames: Dict[str, pd.DataFrame] = {}
+
+    @classmethod
+    def open(cls, file_path: str, use_cache: bool = True, engine: Optional[str] = None,
+             sheet_names: Optional[List[str]] = None, units: Optional[List] = None,
+             years: Optional[List] = None) -> "LazyWorkbook":
+        """
+        Abre el libro leyendo solo la lista de hojas (del cache si existe).
+        ``sheet_names`` restringe las hojas visibles; ``units``/``years`` proyectan cada hoja.
+        """
+        requested = sheet_names
+        engine = resolve_excel_engine(engine)
+        cache = get_workbook_cache() if use_cache else None
+        sheet_names = cache.get_sheet_names(file_path, engine=engine) if cache is not None else None
+        excel_data = None
+        if sheet_names is None:
+            excel_data = pd.ExcelFile(file_path, engine=engine)
+            sheet_names = excel_data.sheet_names
+            if cache is not None:
+                try:
+                    cache.put_sheet_names(file_path, sheet_names, engine=engine)
+                except Exception as e_cache:
+                    print(f"Advertencia: No se pudo registrar el libro en cache: {e_cache}")
+        if requested is not None:
+            sheet_names = _filtrar_hojas(sheet_names, requested)
+        return cls(file_path, sheet_names, excel_data=excel_data, cache=cache, engine=engine,
+                   units=units, years=years)
+
+    def __getitem__(self, sheet_name: str) -> pd.DataFrame:
+        if sheet_name in self._frames:
+            return self._frames[sheet_name]
+        if sheet_name not in self.sheet_names:
+            raise KeyError(sheet_name)
+
+        df = (_hoja_desde_cache(self._cache, self.file_path, sheet_name, self.units, self.years, self.engine)
+              if self._cache is not None else None)
+        if df is None:
+            if self._excel_data is None:
+                self._excel_data = pd.ExcelFile(self.file_path, engine=self.engine)
+            try:
+                df = _parsear_hoja(self._excel_data, sheet_name, self.units, self.years)
+            except Exception as e_parse:
+                print(f"Error al parsear la hoja '{sheet_name}': {e_parse}")
+                traceback.print_exc()
+                raise KeyError(sheet_name) from e_parse
+            if self._cache is not None:
+                try:
+                    clave = _clave_proyeccion(self.units, self.years)
+                    self._cache.put_sheet(self.file_path, _nombre_en_cache(sheet_name, clave), df,
+                                          engine=self.engine)
+                except Exception as e_cache:
+                    print(f"Advertencia: No se pudo guardar la hoja '{sheet_name}' en cache: {e_cache}")
+        self._frames[sheet_name] = df
+        return df
+
+    def __contains__(self, sheet_name) -> bool:
+        # Mapping.__contains__ llamaría a __getitem__ y parsearía la hoja
+        return sheet_name in self.sheet_names
+
+    def __iter__(self):
+        return iter(self.sheet_names)
+
+    def __len__(self) -> int:
+        return len(self.sheet_names)
+
+    @property
+    def loaded_sheets(self) -> List[str]:
+        """Hojas ya parseadas y en memoria."""
+        return list(self._frames)
+
+    def close(self):
+        """Libera el manejador del archivo y las hojas en memoria."""
+        if self._excel_data is not None:
+            self._excel_data.close()
+            self._excel_data = None
+        self._frames.clear()
+
+
+def _frame_to_payload(df: pd.DataFrame) -> dict:
+    """
+    Descompone un DataFrame en arrays compactos para enviarlo entre procesos.
+
+    Las columnas numéricas se agrupan en un bloque 2-D por dtype y las demás se
+    envían como arrays sueltos junto con su dtype, de modo que el proceso padre
+    reconstruye exactamente el mismo DataFrame sin pasar por el pickle de pandas.
+    """
+    blocks = {}
+    others = []
+    for position, dtype in enumerate(df.dtypes):
+        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype) \
+                and isinstance(dtype, np.dtype):
+            blocks.setdefault(dtype.str, []).append(position)
+        else:
+            others.append((position, str(dtype), df.iloc[:, position].to_numpy()))
+    return {
+        'index': df.index,
+        'columns': df.columns,
+        'blocks': [(positions, df.iloc[:, positions].to_numpy(dtype=np.dtype(dtype_str)))
+                   for dtype_str, positions in blocks.items()],
+        'others': others,
+    }
+
+
+def _payload_to_frame(payload: dict) -> pd.DataFrame:
+    """Reconstruye el DataFrame producido por ``_frame_to_payload``."""
+    columns = {}
+    for positions, block in payload['blocks']:
+        for j, position in enumerate(positions):
+            columns[position] = block[:, j]
+    for position, dtype_str, values in payload['others']:
+        columns[position] = pd.array(values, dtype=dtype_str)
+    df = pd.DataFrame({position: columns[position] for position in range(len(payload['columns']))},
+                      index=payload['index'])
+    df.columns = payload['columns']
+    return df
+
+
+def _parse_sheets_compact(task: Tuple[str, List[str], Optional[str], Optional[List], Optional[List]]
+                          ) -> List[Tuple[str, Optional[dict], Optional[str]]]:
+    """
+    Worker de ``load_excel_file(parallel=True)``: abre el libro una sola vez en un
+    proceso aparte y parsea (proyectado a ``units``/``years``) el grupo de hojas asignado.
+    """
+    file_path, sheet_names, engine, units, years = task
+    results = []
+    with pd.ExcelFile(file_path, engine=engine) as excel_data:
+        for sheet_name in sheet_names:
+            try:
+                df = _parsear_hoja(excel_data, sheet_name, units, years)
+                results.append((sheet_name, _frame_to_payload(df), None))
+            except Exception as e_parse:
+                results.append((sheet_name, None, str(e_parse)))
+    return results
+
+
+def _filtrar_hojas(available: List[str], requested: List[str]) -> List[str]:
+    """Hojas de ``requested`` presentes en el libro (en ese orden); avisa de las que faltan."""
+    disponibles = set(available)
+    for sheet_name in requested:
+        if sheet_name not in disponibles:
+            print(f"Advertencia: La hoja '{sheet_name}' no existe en el libro. Se omitirá.")
+    return [sheet_name for sheet_name in requested if sheet_name in disponibles]
+
+
+def _split_sheets_for_workers(sheet_names: List[str], n_workers: int) -> List[List[str]]:
+    """Reparte las hojas en ``n_workers`` grupos (round-robin) para abrir cada libro una vez por proceso."""
+    n_groups = max(1, min(len(sheet_names), n_workers))
+    return [sheet_names[i::n_groups] for i in range(n_groups)]
+
+
+def load_excel_file(file_path: str, use_cache: bool = True, lazy: bool = False,
+                    parallel: Optional[bool] = None,
+                    engine: Optional[str] = None,
+                    streaming: bool = False,
+                    sheet_names: Optional[List[str]] = None,
+                    units: Optional[List] = None,
+                    years: Optional[List] = None) -> Optional[Union[Dict[str, pd.DataFrame], LazyWorkbook]]:
     """
     Carga un archivo Excel y retorna todas sus hojas como DataFrames.
+
+    También acepta formatos columnares (.csv, .parquet, .feather, .npz): cada
+    indicador del archivo se retorna como una "hoja" con el mismo formato ancho
+    (ver ``columnar_loader``); para ellos no aplican ``use_cache``, ``lazy``,
+    ``parallel``, ``engine`` ni ``streaming``.
     
     Esta función maneja errores de manera robusta y proporciona información
     detallada sobre cualquier problema encontrado durante la carga.
     
     Args:
-        file_path (str): Ruta completa al archivo Excel (.xlsx, .xls)
+        file_path (str): Ruta completa al archivo Excel (.xlsx, .xlsm, .xls) o
+            columnar (.csv, .parquet, .feather, .npz)
+        use_cache (bool): Si True, consulta primero el cache en disco de hojas
+            parseadas (ver ``performance_optimizer.WorkbookDiskCache``) y lo
+            actualiza tras una carga en frío.
+        lazy (bool): Si True, retorna un ``LazyWorkbook`` que parsea cada hoja solo
+            cuando se accede a ella, en lugar de parsear todas las hojas.
+        parallel (Optional[bool]): Si True, reparte el parseo de las hojas entre
+            procesos (``PerformanceSettings.max_workers``). Por defecto usa
+            ``PerformanceSettings.parallel_excel_loading``. Solo aplica a la carga
+            completa (``lazy=False``).
+        engine (Optional[str]): Lector de Excel a usar ('auto', 'calamine',
+            'openpyxl', ...). Por defecto ``data_processing.excel_engine``; ver
+            ``resolve_excel_engine``.
+        streaming (bool): Si True, delega en ``load_excel_file_streaming``: lectura
+            fila a fila directo a arrays float64 dentro del presupuesto
+            ``PerformanceSettings.memory_limit_mb`` (solo columnas de año).
+        sheet_names (Optional[List[str]]): Hojas a cargar, en ese orden. Por defecto
+            todas; las demás no se parsean.
+        units (Optional[List]): Unidades (columna 'Unnamed: 0') a conservar. Por
+            defecto todas.
+        years (Optional[List]): Años a conservar. Solo se leen esas columnas
+            (``usecols``) más la de unidades; las demás columnas se descartan.
+            Ver ``proyeccion_desde_config`` para obtener los tres filtros de la
+            selección de un análisis. Las hojas proyectadas se guardan en el cache
+            bajo una clave propia de la selección.
         
     Returns:
         Optional[Dict[str, pd.DataFrame]]: Diccionario donde las claves son los nombres
-        de las hojas y los valores son DataFrames correspondientes. Retorna None si
+        de las hojas y los valores son DataFrames correspondientes (o un
+        ``LazyWorkbook`` con la misma interfaz si ``lazy=True``). Retorna None si
         hay errores críticos en la carga del archivo.
         
     Raises:
@@ -48,11 +445,58 @@ def load_excel_file(file_path: str) -> Optional[Dict[str, pd.DataFrame]]:
         - El archivo debe tener al menos una hoja válida
         - Se imprime información de progreso durante la carga
         - Los errores se registran con traceback para debugging
+        - Las entradas del cache se invalidan solas cuando cambia el contenido
+          del libro (tamaño, fecha de modificación o hash)
     """
+    if is_columnar_file(file_path):
+        try:
+            all_sheets_data = load_columnar_file(file_path)
+            if sheet_names is not None:
+                all_sheets_data = {name: all_sheets_data[name]
+                                   for name in _filtrar_hojas(list(all_sheets_data), sheet_names)}
+            if units is not None or years is not None:
+                all_sheets_data = {name: proyectar_hoja(df, units, years) for name, df in all_sheets_data.items()}
+            print(f"\nIndicadores cargados desde archivo columnar ({len(all_sheets_data)}): {file_path}")
+            return all_sheets_data
+        except FileNotFoundError:
+            print(f"Error: Archivo no encontrado en la ruta: {file_path}")
+            return None
+        except Exception as e_columnar:
+            print(f"Error al cargar el archivo columnar '{file_path}': {e_columnar}")
+            traceback.print_exc()
+            return None
+
+    if streaming:
+        return load_excel_file_streaming(file_path, sheet_names=sheet_names, units=units, years=years)
+
+    if lazy:
+        try:
+            workbook = LazyWorkbook.open(file_path, use_cache=use_cache, engine=engine,
+                                         sheet_names=sheet_names, units=units, years=years)
+            print(f"\nLibro abierto (carga perezosa de {len(workbook)} hojas): {file_path}")
+            return workbook
+        except FileNotFoundError:
+            print(f"Error: Archivo no encontrado en la ruta: {file_path}")
+            return None
+        except Exception as e_open:
+            print(f"Error al abrir el archivo Excel o leer nombres de hojas '{file_path}': {e_open}")
+            traceback.print_exc()
+            return None
+
+    clave = _clave_proyeccion(units, years)
+    completo = sheet_names is None and clave is None
+    engine = resolve_excel_engine(engine)
+    cache = get_workbook_cache() if use_cache else None
+    if cache is not None and completo:
+        cached_sheets = cache.get_workbook(file_path, engine=engine)
+        if cached_sheets is not None:
+            print(f"\nHojas cargadas desde cache: {file_path}")
+            return cached_sheets
+
     try:
         try:
-            excel_data = pd.ExcelFile(file_path)
-            sheet_names = excel_data.sheet_names
+            excel_data = pd.ExcelFile(file_path, engine=engine)
+            workbook_sheets = excel_data.sheet_names
             print(f"\nCargando hojas del archivo: {file_path}")
         except Exception as e_open:
             print(f"Error al abrir el archivo Excel o leer nombres de hojas '{file_path}': {e_open}")
@@ -60,21 +504,62 @@ def load_excel_file(file_path: str) -> Optional[Dict[str, pd.DataFrame]]:
             return None
 
         dataframes = {}
-        if not sheet_names:
+        if not workbook_sheets:
             print("Advertencia: El archivo Excel no contiene hojas.")
             return {}
+        to_load = workbook_sheets if sheet_names is None else _filtrar_hojas(workbook_sheets, sheet_names)
 
-        for sheet_name in sheet_names:
-            try:
-                df = excel_data.parse(sheet_name)
-                dataframes[sheet_name] = df
-            except Exception as e_parse:
-                print(f"Error al parsear la hoja '{sheet_name}': {e_parse}")
-                traceback.print_exc()
+        # Con una selección, cada hoja puede estar ya en cache (proyectada o completa)
+        if cache is not None and not completo:
+            for sheet_name in to_load:
+                df = _hoja_desde_cache(cache, file_path, sheet_name, units, years, engine)
+                if df is not None:
+                    dataframes[sheet_name] = df
+        pending = [sheet_name for sheet_name in to_load if sheet_name not in dataframes]
 
+        if parallel is None:
+            parallel = get_config().performance.parallel_excel_loading
+
+        failed_sheets = []
+        if parallel and len(pending) > 1:
+            excel_data.close()
+            n_workers = get_config().performance.max_workers or os.cpu_count() or 1
+            tasks = [(file_path, group, engine, units, years)
+                     for group in _split_sheets_for_workers(pending, n_workers)]
+            parsed = {}
+            # En un ejecutable congelado (PyInstaller) los procesos hijos solo funcionan si el
+            # punto de entrada llama a multiprocessing.freeze_support(); por seguridad se usan hilos
+            usar_procesos = not getattr(sys, 'frozen', False)
+            for group_results in parallel_process(_parse_sheets_compact, tasks, use_processes=usar_procesos):
+                for sheet_name, payload, error in group_results:
+                    parsed[sheet_name] = (payload, error)
+            for sheet_name in pending:
+                payload, error = parsed[sheet_name]
+                if payload is None:
+                    print(f"Error al parsear la hoja '{sheet_name}': {error}")
+                    failed_sheets.append(sheet_name)
+                else:
+                    dataframes[sheet_name] = _payload_to_frame(payload)
+        else:
+            for sheet_name in pending:
+                try:
+                    dataframes[sheet_name] = _parsear_hoja(excel_data, sheet_name, units, years)
+                except Exception as e_parse:
+                    print(f"Error al parsear la hoja '{sheet_name}': {e_parse}")
+                    traceback.print_exc()
+                    failed_sheets.append(sheet_name)
+
+        parsed_sheets = {_nombre_en_cache(sheet_name, clave): dataframes[sheet_name]
+                         for sheet_name in pending if sheet_name in dataframes}
         if not dataframes:
             print("Advertencia: No se pudo parsear ninguna hoja de datos válida del archivo.")
-        return dataframes
+        elif cache is not None and parsed_sheets:
+            try:
+                cache.put_sheets(file_path, parsed_sheets, sheet_names=workbook_sheets,
+                                 failed=failed_sheets if clave is None else None, engine=engine)
+            except Exception as e_cache:
+                print(f"Advertencia: No se pudo guardar el libro en cache: {e_cache}")
+        return {sheet_name: dataframes[sheet_name] for sheet_name in to_load if sheet_name in dataframes}
     except FileNotFoundError:
         print(f"Error: Archivo no encontrado en la ruta: {file_path}")
         return None
@@ -83,6 +568,621 @@ def load_excel_file(file_path: str) -> Optional[Dict[str, pd.DataFrame]]:
         traceback.print_exc()
         return None
 
+# --- Índice de metadatos del libro (sidecar JSON) ---------------------------------
+
+METADATA_SIDECAR_SUFFIX = '.pcameta.json'
+METADATA_VERSION = 1
+STREAMING_METADATA_EXTENSIONS = ('.xlsx', '.xlsm')
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+SUPPORTED_DATA_EXTENSIONS = EXCEL_EXTENSIONS + COLUMNAR_EXTENSIONS
+COL_UNIDADES = 'Unnamed: 0'
+
+_metadata_memo: Dict[str, "WorkbookMetadata"] = {}
+
+
+def _normalizar_celda(value):
+    """Reproduce la conversión de celdas de pandas: floats enteros pasan a int."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _valor_numerico(value) -> float:
+    """Convierte una celda a número como ``pd.to_numeric(errors='coerce')``; lo demás es NaN."""
+    if value is None or isinstance(value, bool):
+        return np.nan
+    if isinstance(value, (int, float, np.number)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return np.nan
+    return np.nan
+
+
+def _es_numerico(value) -> bool:
+    """True si ``pd.to_numeric`` convertiría la celda en un número válido."""
+    return not np.isnan(_valor_numerico(value))
+
+
+def _etiqueta_json(value):
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return value
+    return str(value)
+
+
+class WorkbookMetadata:
+    """
+    Índice ligero de un libro: hojas, unidades, años y presencia de datos.
+
+    Se construye en una pasada de solo lectura sobre las celdas (sin crear
+    DataFrames) y se guarda como JSON junto al libro, de modo que los diálogos
+    de selección de indicadores, unidades y años se abren sin parsear el libro.
+
+    Attributes:
+        source (str): Ruta del libro.
+        sheets (Dict[str, dict]): Por hoja: ``units`` (columna 'Unnamed: 0'),
+            ``years`` (encabezados de año tal como los ve pandas), ``presence``
+            (por unidad, una cadena de '0'/'1' alineada con ``years``) y
+            ``has_unit_column``.
+    """
+
+    def __init__(self, source: str, sheets: Dict[str, dict], fingerprint: Optional[dict] = None):
+        self.source = source
+        self.sheets = sheets
+        self.fingerprint = fingerprint
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return list(self.sheets)
+
+    def units(self, sheet_name: Optional[str] = None) -> list:
+        """Unidades de una hoja, o la unión en orden de aparición si ``sheet_name`` es None."""
+        if sheet_name is not None:
+            return list(self.sheets[sheet_name]['units'])
+        return list(dict.fromkeys(u for info in self.sheets.values() for u in info['units']))
+
+    def years(self, sheet_name: Optional[str] = None) -> list:
+        """Encabezados de año de una hoja (o de todas), ordenados por valor."""
+        if sheet_name is not None:
+            return list(self.sheets[sheet_name]['years'])
+        anios = {}
+        for info in self.sheets.values():
+            for year in info['years']:
+                anios.setdefault(int(year), year)
+        return [anios[y] for y in sorted(anios)]
+
+    def year_range(self, sheet_name: str) -> Optional[Tuple[int, int]]:
+        years = self.sheets[sheet_name]['years']
+        return (int(years[0]), int(years[-1])) if years else None
+
+    def has_unit_column(self, sheet_name: str) -> bool:
+        return bool(self.sheets[sheet_name]['has_unit_column'])
+
+    def non_null_counts(self, indicators: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Número de indicadores con dato numérico por (unidad, año).
+
+        Returns:
+            pd.DataFrame: Unidades en filas, años (int) en columnas.
+        """
+        indicators = self.sheet_names if indicators is None else [i for i in indicators if i in self.sheets]
+        units = list(dict.fromkeys(u for i in indicators for u in self.sheets[i]['units']))
+        years = sorted({int(y) for i in indicators for y in self.sheets[i]['years']})
+        pos_unit = {u: k for k, u in enumerate(units)}
+        pos_year = {y: k for k, y in enumerate(years)}
+        counts = np.zeros((len(units), len(years)), dtype=np.int64)
+        for indicator in indicators:
+            info = self.sheets[indicator]
+            if not info['units'] or not info['years']:
+                continue
+            bits = np.frombuffer(''.join(info['presence']).encode('ascii'), dtype=np.uint8) - ord('0')
+            bits = bits.reshape(len(info['units']), len(info['years']))
+            rows = [pos_unit[u] for u in info['units']]
+            cols = [pos_year[int(y)] for y in info['years']]
+            counts[np.ix_(rows, cols)] += bits
+        return pd.DataFrame(counts, index=pd.Index(units, name=COL_UNIDADES), columns=pd.Index(years, name='Año'))
+
+    def missing_mask(self, indicators: List[str], units: List, years: List[int]) -> np.ndarray:
+        """
+        Máscara indicador × unidad × año (True = sin dato numérico) a partir de las
+        cadenas de presencia, sin leer el libro. Las hojas, unidades y años que no
+        existen en el libro cuentan como faltantes.
+        """
+        faltantes = np.ones((len(indicators), len(units), len(years)), dtype=bool)
+        pos_unit = {u: k for k, u in enumerate(units)}
+        pos_year = {int(y): k for k, y in enumerate(years)}
+        for i, indicator in enumerate(indicators):
+            info = self.sheets.get(indicator)
+            if not info or not info['units'] or not info['years']:
+                continue
+            cols = [(c, pos_year[int(y)]) for c, y in enumerate(info['years']) if int(y) in pos_year]
+            filas = [(r, pos_unit[u]) for r, u in enumerate(info['units']) if u in pos_unit]
+            if not cols or not filas:
+                continue
+            bits = np.frombuffer(''.join(info['presence']).encode('ascii'), dtype=np.uint8) == ord('1')
+            bits = bits.reshape(len(info['units']), len(info['years']))
+            origen_f, destino_f = zip(*filas)
+            origen_c, destino_c = zip(*cols)
+            faltantes[i][np.ix_(destino_f, destino_c)] = ~bits[np.ix_(origen_f, origen_c)]
+        return faltantes
+
+    def years_with_data(self, indicators: List[str], years: List[int]) -> np.ndarray:
+        """
+        Máscara indicador × año: True si alguna unidad de la hoja tiene dato numérico
+        ese año (lo que ``IndicatorCube.series`` necesita de las unidades no cargadas).
+        """
+        con_datos = np.zeros((len(indicators), len(years)), dtype=bool)
+        pos_year = {int(y): k for k, y in enumerate(years)}
+        for i, indicator in enumerate(indicators):
+            info = self.sheets.get(indicator)
+            if not info or not info['units'] or not info['years']:
+                continue
+            bits = np.frombuffer(''.join(info['presence']).encode('ascii'), dtype=np.uint8) == ord('1')
+            algun_dato = bits.reshape(len(info['units']), len(info['years'])).any(axis=0)
+            for c, year in enumerate(info['years']):
+                if algun_dato[c] and int(year) in pos_year:
+                    con_datos[i, pos_year[int(year)]] = True
+        return con_datos
+
+    def to_dict(self) -> dict:
+        return {'source': self.source, 'sheets': self.sheets}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WorkbookMetadata":
+        return cls(data['source'], data['sheets'], data.get('fingerprint'))
+
+
+@dataclass
+class MissingProfile:
+    """
+    Conteo de celdas sin dato (NaN) de una selección indicador × unidad × año.
+
+    Se calcula sobre las celdas de la selección (del cubo en memoria o de las
+    cadenas de presencia del índice de metadatos), sin estandarizar ni ajustar
+    modelos, para decidir antes de correr el análisis si hace falta imputar.
+
+    Attributes:
+        por_indicador (pd.Series): Faltantes por indicador.
+        por_unidad (pd.Series): Faltantes por unidad.
+        por_anio (pd.Series): Faltantes por año.
+        total_celdas (int): Celdas de la selección.
+    """
+    por_indicador: pd.Series
+    por_unidad: pd.Series
+    por_anio: pd.Series
+    total_celdas: int
+
+    @classmethod
+    def from_mask(cls, faltantes: np.ndarray, indicators, units, years) -> "MissingProfile":
+        """Construye el perfil desde una máscara booleana indicador × unidad × año."""
+        faltantes = np.asarray(faltantes, dtype=bool)
+        return cls(
+            por_indicador=pd.Series(faltantes.sum(axis=(1, 2)), index=pd.Index(list(indicators), name='Indicador')),
+            por_unidad=pd.Series(faltantes.sum(axis=(0, 2)), index=pd.Index(list(units), name=COL_UNIDADES)),
+            por_anio=pd.Series(faltantes.sum(axis=(0, 1)), index=pd.Index([int(y) for y in years], name='Año')),
+            total_celdas=int(faltantes.size),
+        )
+
+    @property
+    def total_faltantes(self) -> int:
+        return int(self.por_indicador.sum())
+
+    @property
+    def hay_faltantes(self) -> bool:
+        return self.total_faltantes > 0
+
+    @property
+    def fraccion_faltante(self) -> float:
+        return self.total_faltantes / self.total_celdas if self.total_celdas else 0.0
+
+    def faltantes_en(self, year) -> int:
+        """Faltantes de un año (0 si el año no está en la selección)."""
+        return int(self.por_anio.get(int(year), 0))
+
+    def resumen(self, max_indicadores: int = 5) -> str:
+        """Texto para los diálogos: total y los indicadores con más faltantes."""
+        if not self.hay_faltantes:
+            return "No hay datos faltantes en la selección."
+        lineas = [f"Se encontraron {self.total_faltantes} datos faltantes "
+                  f"({self.fraccion_faltante:.1%} de {self.total_celdas} celdas)."]
+        peores = self.por_indicador[self.por_indicador > 0].sort_values(ascending=False, kind='stable')
+        for indicador, n in peores.head(max_indicadores).items():
+            lineas.append(f"- {indicador}: {int(n)}")
+        if len(peores) > max_indicadores:
+            lineas.append(f"- ... y {len(peores) - max_indicadores} indicadores más")
+        return "\n".join(lineas)
+
+
+def perfil_faltantes(fuente, indicators: Optional[List[str]] = None, units: Optional[List] = None,
+                     years: Optional[List] = None) -> MissingProfile:
+    """
+    Perfil de datos faltantes de una selección, sin correr el flujo de análisis.
+
+    Args:
+        fuente: ``IndicatorCube`` en memoria, ``WorkbookMetadata`` o la ruta del
+            libro (se usa su índice de metadatos; el libro no se parsea).
+        indicators, units, years: Selección; None significa todos los de la fuente.
+            Las unidades y años pedidos que no existen cuentan como faltantes, igual
+            que en ``IndicatorCube.cross_section``.
+
+    Returns:
+        MissingProfile: Conteos por indicador, unidad y año.
+    """
+    from indicator_cube import IndicatorCube
+
+    if isinstance(fuente, IndicatorCube):
+        indicators = list(fuente.indicators) if indicators is None else [i for i in indicators if i in fuente.indicators]
+        units = list(fuente.units) if units is None else list(units)
+        years = list(fuente.years) if years is None else [int(y) for y in years]
+        return MissingProfile.from_mask(fuente.missing_mask(indicators, units, years), indicators, units, years)
+
+    metadata = fuente if isinstance(fuente, WorkbookMetadata) else obtener_metadatos_libro(fuente)
+    if metadata is None:
+        raise ValueError(f"No se pudo leer el índice de metadatos de '{fuente}'.")
+    indicators = metadata.sheet_names if indicators is None else list(indicators)
+    units = metadata.units() if units is None else list(units)
+    years = [int(y) for y in (metadata.years() if years is None else years)]
+    return MissingProfile.from_mask(metadata.missing_mask(indicators, units, years), indicators, units, years)
+
+
+def _analizar_encabezado(header_row) -> Tuple[list, bool, List[int]]:
+    """
+    Interpreta la fila de encabezado como lo hace ``pd.read_excel``.
+
+    Returns:
+        tuple: ``(encabezado, tiene_columna_unidades, posiciones_de_año)``. La columna
+        de unidades es la primera si su encabezado está vacío ('Unnamed: 0') y una
+        columna es de año si ``str(encabezado).isdigit()``, como en la GUI. Las
+        posiciones de año quedan ordenadas por año.
+    """
+    header = [_normalizar_celda(v) for v in (header_row or ())]
+    has_unit_column = bool(header) and (header[0] is None or header[0] == COL_UNIDADES)
+
+    vistos = set()
+    year_positions = []
+    primera = 1 if has_unit_column else 0
+    for position, label in enumerate(header[primera:], start=primera):
+        if label is None or label in vistos:
+            continue
+        vistos.add(label)
+        if str(label).isdigit():
+            year_positions.append(position)
+    year_positions.sort(key=lambda p: int(header[p]))
+    return header, has_unit_column, year_positions
+
+
+def _metadatos_hoja(rows) -> dict:
+    """
+    Resume una hoja a partir de sus filas (tuplas de valores), sin crear un DataFrame.
+    La primera fila es el encabezado (ver ``_analizar_encabezado``).
+    """
+    rows = iter(rows)
+    header, has_unit_column, year_positions = _analizar_encabezado(next(rows, None))
+
+    units, presence = [], []
+    vistas = set()
+    if has_unit_column:
+        for row in rows:
+            unit = _normalizar_celda(row[0]) if row else None
+            if unit is None or (isinstance(unit, float) and np.isnan(unit)):
+                continue
+            unit = _etiqueta_json(unit)
+            if unit in vistas:
+                continue
+            vistas.add(unit)
+            units.append(unit)
+            presence.append(''.join(
+                '1' if p < len(row) and _es_numerico(row[p]) else '0' for p in year_positions))
+
+    return {
+        'has_unit_column': has_unit_column,
+        'units': units,
+        'years': [_etiqueta_json(header[p]) for p in year_positions],
+        'presence': presence,
+    }
+
+
+def extraer_metadatos_libro(file_path: str) -> WorkbookMetadata:
+    """
+    Construye el índice de metadatos de un libro.
+
+    Para .xlsx/.xlsm recorre las celdas con openpyxl en modo ``read_only`` (streaming,
+    sin cargar el libro en memoria); para formatos columnares usa las hojas que
+    produce ``load_columnar_file`` y para otros formatos parsea las hojas con pandas.
+    """
+    sheets = {}
+    if is_columnar_file(file_path):
+        for sheet_name, df in load_columnar_file(file_path).items():
+            filas = df.astype(object).where(df.notna(), None).itertuples(index=False)
+            sheets[sheet_name] = _metadatos_hoja(itertools.chain([tuple(df.columns)], filas))
+    elif str(file_path).lower().endswith(STREAMING_METADATA_EXTENSIONS):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for worksheet in workbook.worksheets:
+                sheets[worksheet.title] = _metadatos_hoja(worksheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    else:
+        with pd.ExcelFile(file_path, engine=resolve_excel_engine()) as excel_data:
+            for sheet_name in excel_data.sheet_names:
+                df = excel_data.parse(sheet_name, header=None)
+                sheets[sheet_name] = _metadatos_hoja(df.astype(object).where(df.notna(), None).itertuples(index=False))
+    return WorkbookMetadata(str(file_path), sheets)
+
+
+def metadata_sidecar_path(file_path: str) -> str:
+    """Ruta del índice JSON que acompaña al libro (archivo oculto en la misma carpeta)."""
+    directory, name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f".{name}{METADATA_SIDECAR_SUFFIX}")
+
+
+def _huella_libro(file_path: str) -> dict:
+    stat = os.stat(file_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def obtener_metadatos_libro(file_path: str, use_sidecar: Optional[bool] = None) -> Optional[WorkbookMetadata]:
+    """
+    Retorna el índice de metadatos del libro, construyéndolo solo si hace falta.
+
+    Orden de búsqueda: memoria del proceso, sidecar JSON junto al libro y, por
+    último, una pasada de streaming sobre el libro (que vuelve a guardar el sidecar).
+    Las entradas se invalidan cuando cambia el tamaño o la fecha de modificación.
+
+    Args:
+        file_path (str): Ruta del libro.
+        use_sidecar (Optional[bool]): Leer/escribir el JSON junto al libro. Por
+            defecto ``PerformanceSettings.enable_metadata_sidecar``.
+
+    Returns:
+        Optional[WorkbookMetadata]: None si el libro no existe o no se pudo leer.
+    """
+    if use_sidecar is None:
+        use_sidecar = get_config().performance.enable_metadata_sidecar
+    try:
+        huella = _huella_libro(file_path)
+    except OSError:
+        print(f"Error: Archivo no encontrado en la ruta: {file_path}")
+        return None
+
+    clave = os.path.abspath(file_path)
+    memo = _metadata_memo.get(clave)
+    if memo is not None and memo.fingerprint == huella:
+        return memo
+
+    sidecar = metadata_sidecar_path(file_path)
+    metadata = None
+    if use_sidecar and os.path.isfile(sidecar):
+        try:
+            with open(sidecar, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == METADATA_VERSION and data.get('fingerprint') == huella:
+                metadata = WorkbookMetadata.from_dict(data)
+        except (OSError, ValueError, KeyError) as e_sidecar:
+            print(f"Advertencia: Índice de metadatos ilegible, se reconstruirá: {e_sidecar}")
+
+    if metadata is None:
+        try:
+            metadata = extraer_metadatos_libro(file_path)
+        except Exception as e_meta:
+            print(f"Error al leer los metadatos del libro '{file_path}': {e_meta}")
+            traceback.print_exc()
+            return None
+        if use_sidecar:
+            try:
+                tmp_path = f"{sidecar}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'version': METADATA_VERSION, 'fingerprint': huella, **metadata.to_dict()},
+                              f, ensure_ascii=False)
+                os.replace(tmp_path, sidecar)
+            except OSError as e_write:
+                print(f"Advertencia: No se pudo guardar el índice de metadatos junto al libro: {e_write}")
+
+    metadata.fingerprint = huella
+    _metadata_memo[clave] = metadata
+    return metadata
+
+
+# --- Carga en streaming con presupuesto de memoria ---------------------------------
+
+SPILL_DIR_PREFIX = 'pca_spill_'
+_spill_dirs_activos = set()
+
+
+def _pid_de_spill(nombre: str) -> Optional[int]:
+    """PID del proceso dueño codificado en el nombre (``pca_spill_<pid>_<aleatorio>``), o None."""
+    pid = nombre[len(SPILL_DIR_PREFIX):].split('_', 1)[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def crear_directorio_spill(spill_dir: Optional[str] = None) -> str:
+    """
+    Crea un directorio temporal para los datos volcados a disco en esta operación
+    (hojas de una carga en streaming, bloques de un panel procesado por bloques).
+
+    El nombre lleva el PID del proceso. Al crear uno nuevo se eliminan solo los
+    directorios de procesos que ya terminaron: otras instancias de la aplicación
+    comparten la carpeta y sus archivos pueden estar mapeados en memoria. El
+    directorio actual se elimina con ``liberar_directorio_spill`` o al salir del proceso.
+    """
+    base = spill_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "spill")
+    os.makedirs(base, exist_ok=True)
+    for nombre in os.listdir(base):
+        if not nombre.startswith(SPILL_DIR_PREFIX):
+            continue
+        pid = _pid_de_spill(nombre)
+        if pid is not None and psutil.pid_exists(pid):
+            continue
+        # En Windows pueden seguir mapeados: se ignoran los errores
+        shutil.rmtree(os.path.join(base, nombre), ignore_errors=True)
+    path = tempfile.mkdtemp(prefix=f"{SPILL_DIR_PREFIX}{os.getpid()}_", dir=base)
+    _spill_dirs_activos.add(path)
+    return path
+
+
+def liberar_directorio_spill(path: str):
+    """Elimina un directorio creado con ``crear_directorio_spill`` cuando ya no se usan sus datos."""
+    _spill_dirs_activos.discard(path)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _liberar_directorios_spill():
+    for path in list(_spill_dirs_activos):
+        liberar_directorio_spill(path)
+
+
+atexit.register(_liberar_directorios_spill)
+
+
+def _reservar_bloque(n_filas: int, n_columnas: int, archivo: Optional[str]) -> np.ndarray:
+    """Array float64 lleno de NaN, en RAM o respaldado por un .npy en disco si se da ``archivo``."""
+    if archivo is None:
+        return np.full((n_filas, n_columnas), np.nan)
+    bloque = np.lib.format.open_memmap(archivo, mode='w+', dtype=np.float64, shape=(n_filas, n_columnas))
+    bloque[:] = np.nan
+    return bloque
+
+
+def load_excel_file_streaming(file_path: str, sheet_names: Optional[List[str]] = None,
+                              units: Optional[List] = None, years: Optional[List] = None,
+                              memory_limit_mb: Optional[int] = None,
+                              spill_dir: Optional[str] = None) -> Optional[Dict[str, pd.DataFrame]]:
+    """
+    Carga las hojas recorriendo las filas en modo de solo lectura, directo a arrays float64.
+
+    A diferencia de ``load_excel_file`` no crea DataFrames intermedios de dtype
+    object: cada celda se convierte a número al leerla y se escribe en un array
+    reservado de antemano con el tamaño que indica el índice de metadatos del libro
+    (``obtener_metadatos_libro``). Las columnas que no son de año o no están en
+    ``years`` y las filas de unidades que no están en ``units`` no se leen.
+
+    Si reservar una hoja superaría ``memory_limit_mb`` (sumando las hojas ya
+    cargadas), esa hoja se escribe en un .npy en disco y se devuelve mapeada en
+    memoria (``np.load(mmap_mode='r')``), de modo que el pico de memoria queda
+    acotado por el presupuesto.
+
+    Args:
+        file_path (str): Ruta del libro (.xlsx/.xlsm; otros formatos usan ``load_excel_file``).
+        sheet_names (Optional[List[str]]): Hojas a cargar. Por defecto todas.
+        units (Optional[List]): Unidades (columna 'Unnamed: 0') a conservar. Por defecto todas.
+        years (Optional[List]): Años a conservar. Por defecto todas las columnas de año.
+        memory_limit_mb (Optional[int]): Presupuesto de memoria. Por defecto
+            ``PerformanceSettings.memory_limit_mb``.
+        spill_dir (Optional[str]): Carpeta para las hojas volcadas a disco. Por
+            defecto ``cache/spill`` junto al módulo.
+
+    Returns:
+        Optional[Dict[str, pd.DataFrame]]: Hojas con el mismo formato ancho que
+        ``load_excel_file`` ('Unnamed: 0' + una columna float64 por año). Las filas
+        sin unidad se omiten y las unidades repetidas conservan la primera fila.
+        None si el libro no se pudo abrir.
+    """
+    if not str(file_path).lower().endswith(STREAMING_METADATA_EXTENSIONS):
+        print("Advertencia: La carga en streaming solo admite .xlsx/.xlsm. Se usará la carga completa.")
+        all_sheets_data = load_excel_file(file_path)
+        if all_sheets_data is None or sheet_names is None:
+            return all_sheets_data
+        return {name: all_sheets_data[name] for name in sheet_names if name in all_sheets_data}
+
+    if memory_limit_mb is None:
+        memory_limit_mb = get_config().performance.memory_limit_mb
+    presupuesto = memory_limit_mb * 1024 * 1024
+    unidades_sel = None if units is None else set(units)
+    anios_sel = None if years is None else {int(y) for y in years}
+
+    from openpyxl import load_workbook
+
+    try:
+        metadata = obtener_metadatos_libro(file_path)
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+    except FileNotFoundError:
+        print(f"Error: Archivo no encontrado en la ruta: {file_path}")
+        return None
+    except Exception as e_open:
+        print(f"Error al abrir el archivo Excel '{file_path}': {e_open}")
+        traceback.print_exc()
+        return None
+
+    print(f"\nCargando hojas en streaming: {file_path}")
+    dataframes = {}
+    en_memoria = 0
+    directorio_spill = None
+    hojas_en_disco = 0
+    try:
+        if sheet_names is None:
+            sheet_names = workbook.sheetnames
+        for sheet_name in sheet_names:
+            if sheet_name not in workbook.sheetnames:
+                print(f"Advertencia: La hoja '{sheet_name}' no existe en el libro. Se omitirá.")
+                continue
+            worksheet = workbook[sheet_name]
+            header, has_unit_column, year_positions = _analizar_encabezado(
+                next(worksheet.iter_rows(min_row=1, max_row=1, values_only=True), None))
+            if not has_unit_column:
+                print(f"Advertencia: La hoja '{sheet_name}' no tiene columna de unidades ('{COL_UNIDADES}'). Se omitirá.")
+                continue
+            if anios_sel is not None:
+                year_positions = [p for p in year_positions if int(header[p]) in anios_sel]
+
+            # Filas a reservar según el índice de metadatos (exacto mientras el libro no cambie)
+            n_filas = 64
+            if metadata is not None and sheet_name in metadata.sheets:
+                unidades_meta = metadata.sheets[sheet_name]['units']
+                n_filas = len(unidades_meta) if unidades_sel is None else sum(u in unidades_sel for u in unidades_meta)
+            n_filas = max(n_filas, 1)
+            n_columnas = len(year_positions)
+
+            archivo = None
+            if en_memoria + n_filas * n_columnas * 8 > presupuesto:
+                directorio_spill = directorio_spill or crear_directorio_spill(spill_dir)
+                archivo = os.path.join(directorio_spill, f"hoja_{len(dataframes):04d}.npy")
+            valores = _reservar_bloque(n_filas, n_columnas, archivo)
+
+            unidades = []
+            vistas = set()
+            ultima_columna = max(year_positions, default=0) + 1
+            for row in worksheet.iter_rows(min_row=2, max_col=ultima_columna, values_only=True):
+                unit = _normalizar_celda(row[0]) if row else None
+                if unit is None or (isinstance(unit, float) and np.isnan(unit)) or unit in vistas:
+                    continue
+                if unidades_sel is not None and unit not in unidades_sel:
+                    continue
+                vistas.add(unit)
+                if len(unidades) == valores.shape[0]:
+                    # El índice de metadatos quedó corto: duplicar la reserva
+                    ampliado = _reservar_bloque(2 * valores.shape[0], n_columnas,
+                                                None if archivo is None else f"{archivo[:-4]}_{len(unidades)}.npy")
+                    ampliado[:len(unidades)] = valores
+                    valores = ampliado
+                valores[len(unidades)] = [_valor_numerico(row[p]) if p < len(row) else np.nan
+                                          for p in year_positions]
+                unidades.append(unit)
+
+            if isinstance(valores, np.memmap):
+                valores.flush()
+                valores = np.load(valores.filename, mmap_mode='r')[:len(unidades)]
+                hojas_en_disco += 1
+            else:
+                if len(unidades) < valores.shape[0]:
+                    valores = valores[:len(unidades)].copy()
+                en_memoria += valores.nbytes
+
+            df = pd.DataFrame(valores, columns=pd.Index([header[p] for p in year_positions], dtype=object),
+                              copy=False)
+            df.insert(0, COL_UNIDADES, unidades)
+            dataframes[sheet_name] = df
+    finally:
+        workbook.close()
+
+    print(f"Hojas cargadas en streaming: {len(dataframes)} ({en_memoria / 1024 / 1024:.1f} MB en memoria, "
+          f"{hojas_en_disco} volcadas a disco)")
+    return dataframes
+
+
 def prompt_select_sheets(available_sheet_names):
     """
     Permite al usuario seleccionar hojas (indicadores) de una lista.
@@ -155,39 +1255,58 @@ def prompt_select_sheets(available_sheet_names):
             print("Error: Entrada inválida. Ingresa solo números separados por comas (ej. 1,3), la palabra 'TODOS', o deja vacío. Intenta de nuevo.")
 
 def transformar_df_indicador_v1(df_original, col_paises_nombre_original='Unnamed: 0', nuevo_nombre_indice_paises='Pais'):
+    """
+    Transpone una hoja (países x años) a años x países con valores numéricos.
+
+    Se eliminan los años no válidos, las filas completamente vacías y los países
+    sin ningún dato. La conversión a numérico se hace sobre el bloque de valores
+    completo en una sola operación y el DataFrame de entrada no se modifica ni se
+    copia de forma defensiva.
+    """
     print(f"\n--- Transformando DataFrame (Estructura V1) ---")
     if df_original is None or df_original.empty:
         print("  DataFrame original está vacío. No se puede transformar.")
         return None
     try:
-        df = df_original.copy()
-        if col_paises_nombre_original not in df.columns:
+        if col_paises_nombre_original not in df_original.columns:
             print(f"  Error: La columna de países '{col_paises_nombre_original}' no se encuentra en el DataFrame.")
-            print(f"  Columnas disponibles: {df.columns.tolist()}")
+            print(f"  Columnas disponibles: {df_original.columns.tolist()}")
             return None
-        df.set_index(col_paises_nombre_original, inplace=True)
-        df.index.name = nuevo_nombre_indice_paises
-        print(f"  Índice establecido a '{df.index.name}'. Columnas actuales (años): {df.columns.tolist()}")
+        paises = pd.Index(df_original[col_paises_nombre_original], name=nuevo_nombre_indice_paises)
+        datos = df_original.drop(columns=[col_paises_nombre_original])
+        print(f"  Índice establecido a '{paises.name}'. Columnas actuales (años): {datos.columns.tolist()}")
         print("  Transponiendo DataFrame...")
-        df_transformado = df.transpose()
-        df_transformado.index.name = 'Año'
-        df_transformado.index = pd.to_numeric(df_transformado.index, errors='coerce')
-        original_rows = len(df_transformado)
-        df_transformado.dropna(axis=0, how='all', subset=None, inplace=True)
-        df_transformado = df_transformado[df_transformado.index.notna()]
-        if len(df_transformado) < original_rows:
-            print(f"  Se eliminaron {original_rows - len(df_transformado)} filas con Años no válidos o completamente vacías.")
-        if df_transformado.empty:
+        anios = pd.to_numeric(pd.Series(datos.columns, dtype=object), errors='coerce').to_numpy(dtype=float)
+        bloque = datos.to_numpy().T
+        filas_validas = ~pd.isna(bloque).all(axis=1) & ~np.isnan(anios)
+        if not filas_validas.all():
+            print(f"  Se eliminaron {int((~filas_validas).sum())} filas con Años no válidos o completamente vacías.")
+        if not filas_validas.any():
             print("  DataFrame vacío después de eliminar Años no válidos.")
             return None
+        bloque = bloque[filas_validas]
+        indice_anios = pd.Index(anios[filas_validas], name='Año')
         try:
-            df_transformado.index = df_transformado.index.astype(int)
+            indice_anios = indice_anios.astype(int)
         except ValueError:
             print("  Advertencia: El índice de Años no pudo ser convertido a entero.")
         print("  Convirtiendo valores de datos a numérico...")
-        for col_pais in df_transformado.columns:
-            df_transformado[col_pais] = pd.to_numeric(df_transformado[col_pais], errors='coerce')
-        df_transformado.dropna(axis=1, how='all', inplace=True)
+        original = None
+        if bloque.dtype.kind not in 'biuf':
+            original = bloque
+            bloque = pd.to_numeric(bloque.ravel(), errors='coerce').reshape(bloque.shape)
+        columnas_validas = ~pd.isna(bloque).all(axis=0)
+        df_transformado = pd.DataFrame(bloque[:, columnas_validas], index=indice_anios,
+                                       columns=paises[columnas_validas])
+        if original is not None and bloque.dtype.kind == 'f':
+            # El tipo se decide por país, como con to_numeric columna por columna: un NaN en
+            # otro país no debe convertir a float64 una columna completa de enteros
+            valores = bloque[:, columnas_validas]
+            enteras = ~np.isnan(valores).any(axis=0) & (valores == np.round(valores)).all(axis=0)
+            for j in np.flatnonzero(enteras):
+                columna = pd.to_numeric(original[:, columnas_validas][:, j], errors='coerce')
+                if columna.dtype.kind in 'iu':
+                    df_transformado.isetitem(j, columna)
         print("  Transformación V1 completada.")
         return df_transformado
     except Exception as e:
@@ -378,19 +1497,14 @@ def preparar_datos_corte_transversal(
             print(f"Advertencia: Indicador '{indicator_code}' no encontrado. Se omitirá.")
             continue
         
-        df_indicator = all_sheets_data[indicator_code].copy()
+        # Sin copia: solo se toman la columna de países y la del año (ver más abajo)
+        df_indicator = all_sheets_data[indicator_code]
+        paises_en_columna = col_paises_nombre_original in df_indicator.columns
 
         # --- LÓGICA DE ÍNDICE CORREGIDA Y ROBUSTA ---
-        # 1. Comprobar si la columna de países está en las columnas del DataFrame.
-        if col_paises_nombre_original in df_indicator.columns:
-            # Si está, establecerla como el índice.
-            # Prevenir errores por nombres de países duplicados, mantener solo el primero.
-            if df_indicator[col_paises_nombre_original].duplicated().any():
-                df_indicator = df_indicator.drop_duplicates(subset=[col_paises_nombre_original], keep='first')
-            df_indicator.set_index(col_paises_nombre_original, inplace=True)
-        
+        # 1. La columna de países está en las columnas del DataFrame: se usará como índice.
         # 2. Si no estaba en las columnas, verificar si el índice actual NO es ya el correcto.
-        elif df_indicator.index.name != col_paises_nombre_original:
+        if not paises_en_columna and df_indicator.index.name != col_paises_nombre_original:
             # Si no está en las columnas y el índice actual tampoco es el correcto,
             # significa que no podemos identificar los países en esta hoja. La omitimos.
             print(f"Advertencia: No se encontró la columna de países '{col_paises_nombre_original}' en el indicador '{indicator_code}'. Se omitirá.")
@@ -412,7 +1526,13 @@ def preparar_datos_corte_transversal(
             nan_series = pd.Series(index=selected_countries_names, name=indicator_code, dtype=float)
             list_of_series_for_year.append(nan_series)
             continue
-            
+
+        if paises_en_columna:
+            # Proyectar a países + año antes de indexar; ante países duplicados se conserva el primero.
+            df_indicator = df_indicator[[col_paises_nombre_original, year_col_to_use]]
+            df_indicator = df_indicator.drop_duplicates(subset=[col_paises_nombre_original], keep='first')
+            df_indicator = df_indicator.set_index(col_paises_nombre_original)
+
         # Extraer los datos para los países seleccionados usando .reindex()
         series_from_sheet = df_indicator[year_col_to_use]
         indicator_series_for_year = series_from_sheet.reindex(selected_countries_names)
@@ -433,72 +1553,114 @@ def preparar_datos_corte_transversal(
 
 def preparar_datos_panel_longitudinal(all_sheets_data, selected_indicators_codes, selected_countries_codes, col_paises_nombre_original='Unnamed: 0'):
     """
-    [CORREGIDA v2] Prepara un DataFrame en formato de panel (longitudinal).
-    Maneja la configuración del índice de forma robusta para evitar errores.
+    [v3] Prepara un DataFrame en formato de panel (longitudinal) con índice (País, Año).
+
+    Construcción en una sola pasada: cada indicador aporta sus pares (país, año)
+    y sus valores tal cual; las claves de todos los indicadores se factorizan y
+    ordenan una sola vez y cada columna se coloca por posición. Evita la cadena
+    de ``pd.merge(how='outer')`` por indicador, cuyo costo crecía con cada
+    indicador añadido. Las filas son la unión de los pares presentes en alguna hoja;
+    las etiquetas de año se convierten antes de alinear, por lo que ``2000`` y
+    ``'2000'`` en hojas distintas caen en la misma fila.
     """
     print("\n--- Preparando datos en formato de panel longitudinal ---")
-    
-    panel_data_list = []
-    
+
+    claves_paises = []
+    claves_anios = []
+    columnas_paises = []
+    valores_por_indicador = {}
+    etiquetas_por_indicador = {}
+
     for indicator_code in selected_indicators_codes:
         if indicator_code not in all_sheets_data:
             print(f"Advertencia: Indicador '{indicator_code}' no encontrado. Se omitirá.")
             continue
-        
-        df_indicator = all_sheets_data[indicator_code].copy()
-        
-        # --- LÓGICA CORREGIDA PARA MANEJAR EL ÍNDICE ---
-        # Primero, verificamos si la columna de países ('Unnamed: 0') ya es el índice.
-        if df_indicator.index.name == col_paises_nombre_original:
-            # Si lo es, lo convertimos de nuevo en una columna para poder usar 'melt' después.
-            df_indicator.reset_index(inplace=True)
 
-        # Ahora, verificamos si la columna de países existe.
-        # Si no existe en este punto, la hoja tiene un formato incorrecto y la omitimos.
+        df_indicator = all_sheets_data[indicator_code]
+
+        # La columna de países puede venir como índice o como columna
+        if df_indicator.index.name == col_paises_nombre_original:
+            df_indicator = df_indicator.reset_index()
         if col_paises_nombre_original not in df_indicator.columns:
             print(f"Advertencia: No se encontró la columna de países '{col_paises_nombre_original}' en el indicador '{indicator_code}'. Se omitirá.")
             continue
-        # --- FIN DE LA LÓGICA CORREGIDA ---
-            
+
         # Filtrar solo por los países seleccionados
         df_indicator = df_indicator[df_indicator[col_paises_nombre_original].isin(selected_countries_codes)]
         if df_indicator.empty:
-            # Esta advertencia es útil si un indicador no tiene datos para NINGUNO de los países seleccionados
-            # print(f"Advertencia: Ninguno de los países seleccionados se encontró en el indicador '{indicator_code}'.")
             continue
 
-        # Usar pd.melt para convertir de formato ancho a largo
-        try:
-            df_melted = df_indicator.melt(
-                id_vars=[col_paises_nombre_original],
-                var_name='Año',
-                value_name=indicator_code
-            )
-            panel_data_list.append(df_melted)
-        except Exception as e_melt:
-            print(f"Error al transformar el indicador '{indicator_code}': {e_melt}")
-
-    if not panel_data_list:
+        # Coerción de las etiquetas de año una sola vez por hoja (no por celda)
+        columnas_datos = df_indicator.columns.drop(col_paises_nombre_original)
+        anios = pd.to_numeric(pd.Series(columnas_datos, dtype=object), errors='coerce')
+        columnas_validas = anios.notna().to_numpy()
+        anios = anios[columnas_validas].astype(int).to_numpy()
+
+        columnas_paises.append(df_indicator[col_paises_nombre_original])
+        paises = df_indicator[col_paises_nombre_original].to_numpy()
+        bloque = df_indicator[columnas_datos[columnas_validas]].to_numpy()
+        claves_paises.append(np.repeat(paises, len(anios)))
+        claves_anios.append(np.tile(anios, len(paises)))
+        valores_por_indicador[indicator_code] = bloque.ravel()
+        etiquetas_por_indicador[indicator_code] = (set(paises.tolist()), set(columnas_datos.tolist()))
+
+    if not valores_por_indicador:
         print("No se pudo procesar ningún indicador en formato de panel.")
         return pd.DataFrame()
 
-    # Unir todos los DataFrames de indicadores en uno solo
-    if len(panel_data_list) == 1:
-        df_panel_final = panel_data_list[0]
-    else:
-        df_panel_final = reduce(lambda left, right: pd.merge(left, right, on=[col_paises_nombre_original, 'Año'], how='outer'), panel_data_list)
-    
-    # Limpiar y ordenar
-    df_panel_final.rename(columns={col_paises_nombre_original: 'País'}, inplace=True)
-    df_panel_final['Año'] = pd.to_numeric(df_panel_final['Año'], errors='coerce')
-    df_panel_final.dropna(subset=['Año'], inplace=True)
-    df_panel_final['Año'] = df_panel_final['Año'].astype(int)
-    df_panel_final.sort_values(by=['País', 'Año'], inplace=True)
-    df_panel_final.set_index(['País', 'Año'], inplace=True)
-    
+    # dtype común de la columna de países de todas las hojas (p. ej. category y object
+    # dan object), independiente del orden de los indicadores
+    dtype_paises = pd.concat(columnas_paises, ignore_index=True).dtype
+
+    # Índice común (País, Año): cada nivel se factoriza y ordena una sola vez y el
+    # par se codifica como un entero, así np.unique devuelve las filas ya ordenadas
+    codigos_pais, paises = pd.factorize(pd.Series(np.concatenate(claves_paises), dtype=dtype_paises))
+    codigos_anio, anios = pd.factorize(np.concatenate(claves_anios))
+    try:
+        orden_paises = pd.Index(paises).argsort()
+    except TypeError:
+        # Códigos de tipos mezclados (p. ej. 32 y 'CHL') no se comparan: se ordenan por su texto
+        orden_paises = pd.Index(paises).astype(str).argsort(kind='stable')
+    orden_anios = np.argsort(anios, kind='stable')
+    rango_pais = np.empty(len(paises), dtype=np.int64)
+    rango_pais[orden_paises] = np.arange(len(paises))
+    rango_anio = np.empty(len(anios), dtype=np.int64)
+    rango_anio[orden_anios] = np.arange(len(anios))
+    claves = rango_pais[codigos_pais] * len(anios) + rango_anio[codigos_anio]
+    claves_unicas, codigos = np.unique(claves, return_inverse=True)
+    indice_panel = pd.MultiIndex.from_arrays(
+        [pd.Index(paises).take(orden_paises)[claves_unicas // len(anios)],
+         anios[orden_anios][claves_unicas % len(anios)]],
+        names=['País', 'Año'])
+
+    # Cada indicador ocupa su tramo de 'codigos'; los pares ausentes quedan en NaN
+    n_filas = len(indice_panel)
+    columnas = {}
+    inicio = 0
+    for indicator_code, valores in valores_por_indicador.items():
+        codigos_ind = codigos[inicio:inicio + len(valores)]
+        inicio += len(valores)
+        if valores.dtype == np.float64:
+            columna = np.full(n_filas, np.nan)
+            # Asignación en orden inverso: ante pares repetidos prevalece el primero
+            columna[codigos_ind[::-1]] = valores[::-1]
+        else:
+            serie = pd.Series(valores, index=codigos_ind)
+            serie = serie[~serie.index.duplicated(keep='first')]
+            columna = serie.reindex(np.arange(n_filas)).to_numpy()
+            # Como en un merge externo: enteros/booleanos pasan a float si a la hoja
+            # le faltan países o columnas presentes en otra de las hojas
+            paises_ind, columnas_ind = etiquetas_por_indicador[indicator_code]
+            completa = all(p <= paises_ind and c <= columnas_ind for p, c in etiquetas_por_indicador.values())
+            if not completa and columna.dtype.kind in 'iub':
+                columna = columna.astype(np.float64)
+        columnas[indicator_code] = columna
+
+    df_panel_final = pd.DataFrame(columnas, index=indice_panel)
+
     print("Datos de panel construidos (primeras filas):")
     print(df_panel_final.head())
-    
+
     return df_panel_final
 
 
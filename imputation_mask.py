@@ -0,0 +1,155 @@
+# imputation_mask.py
+"""
+Máscara compacta de celdas imputadas (un bit por celda).
+
+``manejar_datos_faltantes`` e ``imputar_panel`` pueden devolver, además del
+DataFrame imputado, qué celdas se rellenaron. Guardar eso como un DataFrame
+booleano cuesta un byte por celda más el índice; ``ImputationMask`` guarda los
+bits empaquetados con ``np.packbits`` (8 celdas por byte) y comparte el índice y
+las columnas del DataFrame de datos:
+
+- ``to_frame()`` / ``to_array()`` reconstruyen la máscara booleana bajo demanda.
+- ``|``, ``&`` y ``-`` combinan máscaras (p. ej. la unión de varias estrategias)
+  operando byte a byte sin desempaquetar.
+- ``count()``, ``count_per_row()`` y ``count_per_column()`` cuentan celdas
+  imputadas con una tabla de bits por byte.
+"""
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+# Número de bits encendidos de cada valor de byte
+_BITS_POR_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+# Filas que se desempaquetan a la vez al contar por columna
+_FILAS_POR_BLOQUE = 65536
+
+
+class ImputationMask:
+    """
+    Máscara booleana filas × columnas (True = celda imputada) empaquetada en bits.
+
+    Attributes:
+        bits (np.ndarray): uint8 de forma (filas, ceil(columnas / 8)), orden de bits 'little'.
+        index (pd.Index): Etiquetas de las filas.
+        columns (pd.Index): Etiquetas de las columnas.
+
+    Example:
+        >>> df_imp, mascara = manejar_datos_faltantes(df, 'knn', devolver_mascara=True, mascara_compacta=True)
+        >>> mascara.count_per_row()
+        >>> mascara.to_frame()  # DataFrame booleano, solo cuando se necesita
+    """
+
+    def __init__(self, bits: np.ndarray, index: pd.Index, columns: pd.Index):
+        index, columns = pd.Index(index), pd.Index(columns)
+        esperado = (len(index), (len(columns) + 7) // 8)
+        if bits.dtype != np.uint8 or bits.shape != esperado:
+            raise ValueError(f"bits debe ser uint8 de forma {esperado}; se recibió {bits.dtype} {bits.shape}.")
+        self.bits = bits
+        self.index = index
+        self.columns = columns
+
+    @classmethod
+    def from_array(cls, mascara: np.ndarray, index: pd.Index, columns: pd.Index) -> "ImputationMask":
+        """Empaqueta un array booleano (filas, columnas)."""
+        mascara = np.asarray(mascara, dtype=bool).reshape(len(index), len(columns))
+        return cls(np.packbits(mascara, axis=1, bitorder='little'), index, columns)
+
+    @classmethod
+    def from_frame(cls, mascara: pd.DataFrame) -> "ImputationMask":
+        """Empaqueta un DataFrame booleano (p. ej. el que devolvía ``manejar_datos_faltantes``)."""
+        return cls.from_array(mascara.to_numpy(dtype=bool), mascara.index, mascara.columns)
+
+    @classmethod
+    def from_missing(cls, antes: np.ndarray, despues: np.ndarray, index: pd.Index,
+                     columns: pd.Index) -> "ImputationMask":
+        """Celdas que eran NaN en ``antes`` y tienen valor en ``despues`` (máscaras de NaN)."""
+        return cls.from_array(np.asarray(antes, dtype=bool) & ~np.asarray(despues, dtype=bool), index, columns)
+
+    @classmethod
+    def empty(cls, index: pd.Index, columns: pd.Index) -> "ImputationMask":
+        """Máscara sin celdas imputadas."""
+        return cls(np.zeros((len(index), (len(columns) + 7) // 8), dtype=np.uint8), index, columns)
+
+    @property
+    def shape(self):
+        return (len(self.index), len(self.columns))
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes de los bits empaquetados (sin contar las etiquetas compartidas)."""
+        return self.bits.nbytes
+
+    def to_array(self) -> np.ndarray:
+        """Array booleano (filas, columnas)."""
+        return np.unpackbits(self.bits, axis=1, count=len(self.columns), bitorder='little').view(bool)
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame booleano con el índice y las columnas de los datos."""
+        return pd.DataFrame(self.to_array(), index=self.index, columns=self.columns)
+
+    def count(self) -> int:
+        """Total de celdas imputadas."""
+        return int(_BITS_POR_BYTE[self.bits].sum())
+
+    def count_per_row(self) -> pd.Series:
+        """Celdas imputadas en cada fila."""
+        return pd.Series(_BITS_POR_BYTE[self.bits].sum(axis=1), index=self.index)
+
+    def count_per_column(self) -> pd.Series:
+        """Celdas imputadas en cada columna (desempaqueta por bloques de filas)."""
+        conteos = np.zeros(len(self.columns), dtype=np.int64)
+        for inicio in range(0, len(self.index), _FILAS_POR_BLOQUE):
+            bloque = self.bits[inicio:inicio + _FILAS_POR_BLOQUE]
+            desempacado = np.unpackbits(bloque, axis=1, count=len(self.columns), bitorder='little')
+            conteos += desempacado.sum(axis=0, dtype=np.int64)
+        return pd.Series(conteos, index=self.columns)
+
+    def any(self) -> bool:
+        return bool(self.bits.any())
+
+    def _bits_alineados(self, otra: "ImputationMask") -> np.ndarray:
+        if not isinstance(otra, ImputationMask):
+            return NotImplemented
+        if not (self.index.equals(otra.index) and self.columns.equals(otra.columns)):
+            raise ValueError("Las máscaras deben tener el mismo índice y las mismas columnas.")
+        return otra.bits
+
+    def __or__(self, otra: "ImputationMask") -> "ImputationMask":
+        bits = self._bits_alineados(otra)
+        if bits is NotImplemented:
+            return NotImplemented
+        return ImputationMask(self.bits | bits, self.index, self.columns)
+
+    def __and__(self, otra: "ImputationMask") -> "ImputationMask":
+        bits = self._bits_alineados(otra)
+        if bits is NotImplemented:
+            return NotImplemented
+        return ImputationMask(self.bits & bits, self.index, self.columns)
+
+    def __sub__(self, otra: "ImputationMask") -> "ImputationMask":
+        bits = self._bits_alineados(otra)
+        if bits is NotImplemented:
+            return NotImplemented
+        return ImputationMask(self.bits & ~bits, self.index, self.columns)
+
+    def __eq__(self, otra) -> bool:
+        if not isinstance(otra, ImputationMask):
+            return NotImplemented
+        return (self.index.equals(otra.index) and self.columns.equals(otra.columns)
+                and np.array_equal(self.bits, otra.bits))
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"ImputationMask(shape={self.shape}, imputadas={self.count()}, nbytes={self.nbytes})"
+
+    @staticmethod
+    def union(*mascaras: "ImputationMask") -> Optional["ImputationMask"]:
+        """Unión de varias máscaras (p. ej. de distintas estrategias); None si no hay ninguna."""
+        resultado = None
+        for mascara in mascaras:
+            resultado = mascara if resultado is None else resultado | mascara
+        return resultado
@@ -0,0 +1,381 @@
+# indicator_cube.py
+"""
+Cubo denso indicador × unidad × año construido una sola vez por libro.
+
+Cada hoja del libro (un indicador, con unidades en filas y años en columnas) se
+normaliza una única vez a un bloque float64 dentro de un array 3-D de NumPy.
+Las etiquetas de indicadores, unidades y años quedan en tablas de índice
+compartidas, de modo que los tres flujos de análisis extraen sus matrices por
+slicing en lugar de transponer, copiar y re-indexar las hojas en cada llamada:
+
+- ``cross_section(año, unidades)``: unidades × indicadores (corte transversal)
+- ``series(unidad)``: años × indicadores (serie de tiempo)
+- ``panel(unidades)``: (País, Año) × indicadores (panel longitudinal)
+- ``iter_panel(unidades)``: el mismo panel por bloques de unidades
+
+Los valores no numéricos de las hojas se convierten a NaN al construir el cubo.
+"""
+
+from collections.abc import Mapping
+from typing import Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+def _normalizar_hoja(df: pd.DataFrame, col_paises_nombre_original: str):
+    """
+    Extrae (unidades, años, bloque float64) de una hoja en formato ancho.
+
+    Returns:
+        tuple | None: ``(unidades, años, valores)`` o None si la hoja no tiene la
+        columna de unidades.
+    """
+    if col_paises_nombre_original in df.columns:
+        unidades = df[col_paises_nombre_original]
+        datos = df.drop(columns=[col_paises_nombre_original])
+    elif df.index.name == col_paises_nombre_original:
+        unidades = df.index.to_series()
+        datos = df
+    else:
+        return None
+
+    # Filas: sin etiqueta de unidad fuera; unidades repetidas -> primera aparición
+    filas_validas = (unidades.notna() & ~unidades.duplicated(keep='first')).to_numpy()
+
+    # Columnas: solo las que se interpretan como un año entero
+    anios = pd.to_numeric(pd.Series(datos.columns, dtype=object), errors='coerce').to_numpy(dtype=float)
+    columnas_validas = np.isfinite(anios) & (anios == np.round(anios))
+    columnas_validas &= ~pd.Series(anios).duplicated(keep='first').to_numpy()
+
+    bloque = datos.iloc[filas_validas, columnas_validas].to_numpy()
+    if bloque.dtype.kind not in 'biuf':
+        bloque = pd.to_numeric(bloque.ravel(), errors='coerce').reshape(bloque.shape)
+    return (unidades.to_numpy()[filas_validas],
+            anios[columnas_validas].astype(int),
+            np.asarray(bloque, dtype=np.float64))
+
+
+def _etiquetas_npz(etiquetas: pd.Index) -> np.ndarray:
+    """Etiquetas como array sin pickle: numéricas con su dtype, el resto como texto."""
+    valores = pd.Index(etiquetas.tolist()).to_numpy()
+    if len(valores) and valores.dtype.kind in 'biuf':
+        return valores
+    return etiquetas.to_numpy(dtype=str)
+
+
+class IndicatorCube:
+    """
+    Array float64 de forma (indicadores, unidades, años) con sus tablas de índice.
+
+    Attributes:
+        values (np.ndarray): Datos, NaN donde no hay valor numérico.
+        indicators (pd.Index): Nombres de los indicadores (hojas), en orden.
+        units (pd.Index): Unidades (países/empresas) en orden de primera aparición.
+        years (pd.Index): Años enteros, en orden ascendente.
+        unit_in_sheet (np.ndarray): bool (indicadores, unidades); la unidad tiene fila en la hoja.
+        year_in_sheet (np.ndarray): bool (indicadores, años); el año tiene columna en la hoja.
+
+    Example:
+        >>> libro = dl.load_excel_file("INDICADORES WDI_V8_vf.xlsm", lazy=True)
+        >>> cubo = IndicatorCube.from_sheets(libro, ['GDP growth (annual %)', 'Inflation'])
+        >>> cubo.cross_section(2010, ['Argentina', 'Mexico'])
+    """
+
+    def __init__(self, values: np.ndarray, indicators: Iterable, units: Iterable, years: Iterable,
+                 unit_in_sheet: Optional[np.ndarray] = None, year_in_sheet: Optional[np.ndarray] = None,
+                 unit_label: str = 'Unnamed: 0'):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.indicators = pd.Index(indicators, dtype=object)
+        self.units = pd.Index(units, dtype=object)
+        self.years = pd.Index(np.asarray(years, dtype=np.int64))
+        n_ind, n_units, n_years = self.values.shape
+        if (n_ind, n_units, n_years) != (len(self.indicators), len(self.units), len(self.years)):
+            raise ValueError("La forma de 'values' no coincide con las tablas de índice del cubo.")
+        self.unit_in_sheet = (np.ones((n_ind, n_units), dtype=bool) if unit_in_sheet is None
+                              else np.asarray(unit_in_sheet, dtype=bool))
+        self.year_in_sheet = (np.ones((n_ind, n_years), dtype=bool) if year_in_sheet is None
+                              else np.asarray(year_in_sheet, dtype=bool))
+        self.unit_label = unit_label
+
+    @classmethod
+    def from_sheets(cls, all_sheets_data: Mapping, indicators: Optional[List[str]] = None,
+                    col_paises_nombre_original: str = 'Unnamed: 0') -> "IndicatorCube":
+        """
+        Construye el cubo a partir de las hojas de un libro.
+
+        Args:
+            all_sheets_data (Mapping): Hojas del libro (dict o ``LazyWorkbook``).
+            indicators (Optional[List[str]]): Hojas a incluir. Por defecto todas;
+                con un ``LazyWorkbook`` solo se parsean las pedidas.
+            col_paises_nombre_original (str): Columna con los nombres de las unidades.
+        """
+        indicators = list(all_sheets_data.keys()) if indicators is None else list(indicators)
+
+        hojas = []
+        unidades_pos = {}
+        anios_set = set()
+        for indicator in indicators:
+            if indicator not in all_sheets_data:
+                print(f"Advertencia: Indicador '{indicator}' no encontrado. Se omitirá.")
+                continue
+            df = all_sheets_data[indicator]
+            normalizada = _normalizar_hoja(df, col_paises_nombre_original) if df is not None else None
+            if normalizada is None:
+                print(f"Advertencia: No se encontró la columna de países '{col_paises_nombre_original}' en el indicador '{indicator}'. Se omitirá.")
+                continue
+            unidades, anios, bloque = normalizada
+            for unidad in unidades:
+                unidades_pos.setdefault(unidad, len(unidades_pos))
+            anios_set.update(anios.tolist())
+            hojas.append((indicator, unidades, anios, bloque))
+
+        units = list(unidades_pos)
+        years = np.array(sorted(anios_set), dtype=np.int64)
+        values = np.full((len(hojas), len(units), len(years)), np.nan)
+        unit_in_sheet = np.zeros((len(hojas), len(units)), dtype=bool)
+        year_in_sheet = np.zeros((len(hojas), len(years)), dtype=bool)
+        for i, (_, unidades, anios, bloque) in enumerate(hojas):
+            u_idx = np.fromiter((unidades_pos[u] for u in unidades), dtype=np.intp, count=len(unidades))
+            t_idx = np.searchsorted(years, anios)
+            values[i][np.ix_(u_idx, t_idx)] = bloque
+            unit_in_sheet[i, u_idx] = True
+            year_in_sheet[i, t_idx] = True
+
+        return cls(values, [h[0] for h in hojas], units, years,
+                   unit_in_sheet=unit_in_sheet, year_in_sheet=year_in_sheet,
+                   unit_label=col_paises_nombre_original)
+
+    @classmethod
+    def from_file(cls, file_path: str, indicators: Optional[List[str]] = None,
+                  col_paises_nombre_original: str = 'Unnamed: 0', units: Optional[List] = None,
+                  years: Optional[List] = None) -> Optional["IndicatorCube"]:
+        """
+        Abre el libro de forma perezosa y construye el cubo solo con ``indicators``.
+
+        ``units``/``years`` se aplican en la lectura (ver ``load_excel_file``): solo
+        se parsean esas filas y columnas de año. Con
+        ``PerformanceSettings.streaming_excel_loading`` las hojas se leen en
+        streaming dentro del presupuesto de memoria (ver ``load_excel_file_streaming``).
+        Un cubo .npz ya está mapeado en memoria y solo se recorta por indicadores.
+
+        Returns:
+            IndicatorCube | None: None si el archivo no se pudo cargar.
+        """
+        import data_loader_module as dl
+        from config_manager import get_config
+
+        if str(file_path).lower().endswith('.npz'):
+            cube = cls.from_npz(file_path, col_paises_nombre_original)
+            return cube if indicators is None else cube.subset(indicators)
+        if get_config().performance.streaming_excel_loading:
+            all_sheets_data = dl.load_excel_file_streaming(file_path, sheet_names=indicators,
+                                                           units=units, years=years)
+        else:
+            all_sheets_data = dl.load_excel_file(file_path, lazy=True, sheet_names=indicators,
+                                                 units=units, years=years)
+        if all_sheets_data is None:
+            return None
+        return cls.from_sheets(all_sheets_data, indicators, col_paises_nombre_original)
+
+    @classmethod
+    def from_config(cls, cfg: dict, col_paises_nombre_original: str = 'Unnamed: 0') -> Optional["IndicatorCube"]:
+        """
+        Cubo con la selección de un análisis (``ProjectConfig.series_config``, etc.):
+        solo se leen los indicadores, unidades y años seleccionados.
+        """
+        import data_loader_module as dl
+
+        proyeccion = dl.proyeccion_desde_config(cfg)
+        return cls.from_file(cfg["data_file"], proyeccion['sheet_names'], col_paises_nombre_original,
+                             units=proyeccion['units'], years=proyeccion['years'])
+
+    def to_npz(self, file_path: str):
+        """
+        Guarda el cubo como .npz sin compresión, de modo que ``values`` pueda
+        leerse mapeado en memoria (ver ``columnar_loader.leer_cubo_npz``).
+        Las etiquetas numéricas (p. ej. IDs de unidad enteros) conservan su
+        dtype; el resto se guarda como texto, sin pickle.
+        """
+        np.savez(file_path, values=self.values,
+                 indicators=_etiquetas_npz(self.indicators),
+                 units=_etiquetas_npz(self.units),
+                 years=self.years.to_numpy(),
+                 unit_in_sheet=self.unit_in_sheet, year_in_sheet=self.year_in_sheet)
+
+    @classmethod
+    def from_npz(cls, file_path: str, col_paises_nombre_original: str = 'Unnamed: 0') -> "IndicatorCube":
+        """Abre un cubo guardado con ``to_npz``; ``values`` queda mapeado en memoria."""
+        from columnar_loader import leer_cubo_npz
+
+        arrays = leer_cubo_npz(file_path)
+        return cls(arrays['values'], arrays['indicators'].tolist(), arrays['units'].tolist(), arrays['years'],
+                   unit_in_sheet=arrays.get('unit_in_sheet'), year_in_sheet=arrays.get('year_in_sheet'),
+                   unit_label=col_paises_nombre_original)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def subset(self, indicators: List[str]) -> "IndicatorCube":
+        """Cubo con solo los indicadores dados (en ese orden)."""
+        i_pos = self._indicator_positions(indicators)
+        return IndicatorCube(self.values[i_pos], self.indicators[i_pos], self.units, self.years,
+                             unit_in_sheet=self.unit_in_sheet[i_pos], year_in_sheet=self.year_in_sheet[i_pos],
+                             unit_label=self.unit_label)
+
+    def _indicator_positions(self, indicators: Optional[List[str]]) -> np.ndarray:
+        if indicators is None:
+            return np.arange(len(self.indicators))
+        posiciones = self.indicators.get_indexer(list(indicators))
+        for indicator, pos in zip(indicators, posiciones):
+            if pos < 0:
+                print(f"Advertencia: Indicador '{indicator}' no está en el cubo. Se omitirá.")
+        return posiciones[posiciones >= 0]
+
+    def missing_mask(self, indicators: List[str], units: List, years: List[int]) -> np.ndarray:
+        """
+        Máscara indicador × unidad × año (True = NaN) de la selección, leyendo solo
+        esas celdas. Las unidades y años que no están en el cubo cuentan como NaN.
+        """
+        i_pos = self._indicator_positions(indicators)
+        u_pos = self.units.get_indexer(list(units))
+        t_pos = self.years.get_indexer([int(y) for y in years])
+        faltantes = np.ones((len(i_pos), len(u_pos), len(t_pos)), dtype=bool)
+        u_ok, t_ok = u_pos >= 0, t_pos >= 0
+        if u_ok.any() and t_ok.any():
+            bloque = self.values[np.ix_(i_pos, u_pos[u_ok], t_pos[t_ok])]
+            faltantes[np.ix_(np.arange(len(i_pos)), u_ok, t_ok)] = np.isnan(bloque)
+        return faltantes
+
+    def cross_section(self, year: Union[int, str], units: Optional[List] = None,
+                      indicators: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Matriz unidades × indicadores para un año (equivale a ``preparar_datos_corte_transversal``).
+
+        Las unidades pedidas que no existen y los indicadores sin ese año quedan en NaN.
+        """
+        i_pos = self._indicator_positions(indicators)
+        units = list(self.units) if units is None else list(units)
+        u_pos = self.units.get_indexer(units)
+        year = int(year)
+        datos = np.full((len(units), len(i_pos)), np.nan)
+        if year in self.years:
+            t = self.years.get_loc(year)
+            encontrados = u_pos >= 0
+            datos[encontrados] = self.values[i_pos][:, u_pos[encontrados], t].T
+        return pd.DataFrame(datos, index=pd.Index(units, name=self.unit_label),
+                            columns=self.indicators[i_pos])
+
+    def cross_sections(self, years: List, units: Optional[List] = None,
+                       indicators: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Cortes transversales de varios años apilados en un bloque con índice
+        (Año, unidad): las filas de cada año son ``cross_section(año, units, indicators)``.
+        """
+        i_pos = self._indicator_positions(indicators)
+        units = list(self.units) if units is None else list(units)
+        years = [int(y) for y in years]
+        u_pos = self.units.get_indexer(units)
+        t_pos = self.years.get_indexer(years)
+        datos = np.full((len(years), len(units), len(i_pos)), np.nan)
+        u_ok, t_ok = u_pos >= 0, t_pos >= 0
+        if u_ok.any() and t_ok.any():
+            bloque = self.values[np.ix_(i_pos, u_pos[u_ok], t_pos[t_ok])]      # (k, unidades, años)
+            datos[np.ix_(t_ok, u_ok)] = bloque.transpose(2, 1, 0)
+        index = pd.MultiIndex.from_product([years, units], names=['Año', self.unit_label])
+        return pd.DataFrame(datos.reshape(-1, len(i_pos)), index=index, columns=self.indicators[i_pos])
+
+    def series(self, unit, years: Optional[List] = None,
+               indicators: Optional[List[str]] = None,
+               year_has_data: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Matriz años × indicadores de una unidad (equivale a ``transformar_df_indicador_v1``
+        + ``consolidate_data_for_country``).
+
+        Se omiten los indicadores sin ningún dato de la unidad y los años en que
+        ninguno de los indicadores incluidos tiene datos para ninguna unidad.
+
+        Args:
+            year_has_data (Optional[np.ndarray]): Máscara indicadores × ``self.years``
+                (True = alguna unidad de la hoja tiene dato ese año), alineada con
+                ``indicators``. Por defecto se calcula con las unidades del cubo; se
+                pasa cuando el cubo está proyectado a la unidad (ver
+                ``WorkbookMetadata.years_with_data``).
+        """
+        i_pos = self._indicator_positions(indicators)
+        if unit not in self.units:
+            print(f"Advertencia: La unidad '{unit}' no está en el cubo.")
+            return pd.DataFrame()
+        u = self.units.get_loc(unit)
+        bloque = self.values[i_pos]                              # (k, unidades, años)
+        if year_has_data is None:
+            anio_con_datos = ~np.isnan(bloque).all(axis=1)       # (k, años)
+        else:
+            anio_con_datos = np.asarray(year_has_data, dtype=bool)
+        serie = bloque[:, u, :]                                  # (k, años)
+        incluidos = (~np.isnan(serie) & anio_con_datos).any(axis=1)
+        if not incluidos.any():
+            return pd.DataFrame()
+        filas = anio_con_datos[incluidos].any(axis=0)
+        if years is not None:
+            filas &= self.years.isin([int(y) for y in years])
+        datos = np.where(anio_con_datos[incluidos][:, filas], serie[incluidos][:, filas], np.nan).T
+        return pd.DataFrame(datos, index=pd.Index(self.years[filas], name='Año'),
+                            columns=self.indicators[i_pos[incluidos]])
+
+    def panel(self, units: Optional[List] = None, years: Optional[List] = None,
+              indicators: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Panel largo con índice (País, Año) e indicadores en columnas
+        (equivale a ``preparar_datos_panel_longitudinal``).
+
+        Incluye cada par (unidad, año) que aparece en al menos una hoja incluida,
+        ordenado por unidad y año.
+        """
+        i_pos = self._indicator_positions(indicators)
+        if units is None:
+            u_pos = np.arange(len(self.units))
+        else:
+            u_pos = self.units.get_indexer(list(units))
+            u_pos = np.unique(u_pos[u_pos >= 0])
+        t_mask = np.ones(len(self.years), dtype=bool)
+        if years is not None:
+            t_mask = self.years.isin([int(y) for y in years])
+        t_pos = np.flatnonzero(t_mask)
+        if len(i_pos) == 0 or len(u_pos) == 0 or len(t_pos) == 0:
+            return pd.DataFrame(columns=self.indicators[i_pos])
+
+        presente = (self.unit_in_sheet[np.ix_(i_pos, u_pos)][:, :, None]
+                    & self.year_in_sheet[np.ix_(i_pos, t_pos)][:, None, :]).any(axis=0)
+        orden_unidades = np.argsort(self.units[u_pos].astype(str).to_numpy(), kind='stable')
+        u_pos = u_pos[orden_unidades]
+        presente = presente[orden_unidades]
+
+        uu, tt = np.nonzero(presente)
+        # Un solo indexado: solo se leen las celdas del panel (importa si values está mapeado)
+        datos = self.values[i_pos[:, None], u_pos[uu][None, :], t_pos[tt][None, :]].T
+        index = pd.MultiIndex.from_arrays(
+            [self.units[u_pos[uu]], self.years[t_pos[tt]]], names=['País', 'Año'])
+        return pd.DataFrame(datos, index=index, columns=self.indicators[i_pos])
+
+    def iter_panel(self, units: Optional[List] = None, years: Optional[List] = None,
+                   indicators: Optional[List[str]] = None, units_per_chunk: int = 100) -> Iterator[pd.DataFrame]:
+        """
+        ``panel(units, years, indicators)`` por bloques de ``units_per_chunk`` unidades.
+
+        Concatenar los bloques da el panel completo, pero cada bloque se arma al
+        recorrerlo: con un cubo leído de ``.npz`` (memory-mapped) solo se leen del
+        disco las unidades del bloque.
+        """
+        if units is None:
+            u_pos = np.arange(len(self.units))
+        else:
+            u_pos = self.units.get_indexer(list(units))
+            u_pos = np.unique(u_pos[u_pos >= 0])
+        nombres = self.units[u_pos]
+        nombres = nombres[np.argsort(nombres.astype(str).to_numpy(), kind='stable')]
+        for inicio in range(0, len(nombres), units_per_chunk):
+            bloque = self.panel(list(nombres[inicio:inicio + units_per_chunk]), years, indicators)
+            if not bloque.empty:
+                yield bloque
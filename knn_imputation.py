@@ -0,0 +1,214 @@
+# knn_imputation.py
+"""
+Imputación KNN agrupando las filas por patrón de datos faltantes.
+
+``KNNImputer`` de scikit-learn calcula la distancia euclidiana con NaN entre
+cada fila incompleta y todas las filas del conjunto (fuerza bruta), por lo que
+su costo crece con el cuadrado del número de filas. Con unidades empresa-año
+(miles de filas en los libros Fortune) es el paso más lento del análisis.
+
+``imputar_knn_por_patrones`` obtiene los mismos vecinos con otra organización:
+
+1. Todas las filas se agrupan por patrón de faltantes. Entre una fila del
+   patrón receptor ``P`` y una del patrón donante ``Q`` las columnas comunes
+   (y por lo tanto el peso de la distancia) son siempre las mismas.
+2. Para cada par (P, Q) con suficientes donantes se buscan los ``k`` vecinos de
+   todos los receptores de ``P`` entre las filas de ``Q`` sobre las columnas
+   comunes: con pocas columnas en un ``cKDTree`` (costo logarítmico en el
+   número de donantes); con más, por bloques de receptores con productos de
+   matrices, donde un árbol ya no poda.
+3. Los patrones donantes poco frecuentes se comparan por fuerza bruta en
+   bloques de receptores.
+4. Para cada columna faltante de ``P`` se combinan los candidatos de los
+   patrones que observan esa columna y se promedian los ``k`` más cercanos.
+   Los patrones receptores se procesan en paralelo con hilos.
+
+La distancia, el número de vecinos, el promedio uniforme y el uso de la media
+de la columna cuando ninguna distancia está definida siguen a ``KNNImputer``
+(``weights='uniform'``); los resultados coinciden salvo empates de distancia.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from config_manager import get_config
+
+# Filas receptoras por bloque de fuerza bruta (acota la matriz receptores × donantes)
+_FILAS_POR_BLOQUE = 1024
+
+# Grupos de donantes con menos filas se comparan por fuerza bruta en lugar de indexarse
+_MIN_FILAS_ARBOL = 64
+
+# Con más columnas comunes un cKDTree pierde frente a las distancias por bloques (BLAS)
+_MAX_COLUMNAS_ARBOL = 6
+
+
+def _workers_por_defecto() -> int:
+    config = get_config().performance
+    if not config.enable_parallel_processing:
+        return 1
+    return config.max_workers or os.cpu_count() or 1
+
+
+def _distancias_parciales(receptores: np.ndarray, donantes: np.ndarray, observados_donantes: np.ndarray,
+                          n_columnas: int) -> np.ndarray:
+    """
+    Distancia euclidiana con NaN (como ``nan_euclidean_distances``) entre receptores
+    sin NaN en las columnas dadas y donantes con NaN en algunas de ellas.
+    """
+    y = np.where(observados_donantes, donantes, 0.0)
+    m = observados_donantes.astype(np.float64)
+    d2 = (receptores ** 2) @ m.T - 2.0 * receptores @ y.T + (y ** 2).sum(axis=1)
+    np.maximum(d2, 0.0, out=d2)
+    comunes = m.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distancias = np.sqrt(d2 * (n_columnas / comunes))
+    distancias[:, comunes == 0] = np.nan
+    return distancias
+
+
+def _vecinos_por_bloques(receptores: np.ndarray, donantes: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """``k`` vecinos euclidianos de cada receptor entre donantes sin NaN, por bloques de receptores."""
+    norma_donantes = (donantes ** 2).sum(axis=1)
+    dist = np.empty((len(receptores), k))
+    pos = np.empty((len(receptores), k), dtype=np.intp)
+    for inicio in range(0, len(receptores), _FILAS_POR_BLOQUE):
+        bloque = receptores[inicio:inicio + _FILAS_POR_BLOQUE]
+        d2 = (bloque ** 2).sum(axis=1)[:, None] - 2.0 * bloque @ donantes.T + norma_donantes
+        cercanos = np.argpartition(d2, k - 1, axis=1)[:, :k] if k < d2.shape[1] else np.broadcast_to(
+            np.arange(d2.shape[1]), d2.shape)
+        pos[inicio:inicio + len(bloque)] = cercanos
+        dist[inicio:inicio + len(bloque)] = np.sqrt(np.maximum(np.take_along_axis(d2, cercanos, axis=1), 0.0))
+    return dist, pos
+
+
+def _imputar_patron(X: np.ndarray, faltantes: np.ndarray, filas: np.ndarray, patron: np.ndarray,
+                    grupos: List[Tuple[np.ndarray, np.ndarray]], columnas: np.ndarray, n_vecinos: int,
+                    medias: np.ndarray, workers_arbol: int) -> np.ndarray:
+    """
+    Valores imputados (filas, columnas) de un patrón de faltantes.
+
+    ``grupos`` son los donantes agrupados por su propio patrón: (filas, observadas).
+    Entre un receptor del patrón y un donante del grupo las columnas comunes son
+    siempre las mismas, así que cada grupo grande se indexa en un ``cKDTree``
+    sobre ellas (o se recorre por bloques); los grupos pequeños se comparan
+    juntos por fuerza bruta.
+    """
+    n_columnas = X.shape[1]
+    observadas = ~patron
+    resultado = np.empty((len(filas), len(columnas)))
+    if not observadas.any():
+        resultado[:] = medias[columnas]
+        return resultado
+    receptores = X[filas]
+
+    # Vecinos de cada grupo grande: (distancias, valores de todas las columnas, columnas observadas)
+    por_arbol, pequenos = [], []
+    for filas_grupo, observadas_grupo in grupos:
+        comunes = np.flatnonzero(observadas & observadas_grupo)
+        if not comunes.size or not (observadas_grupo & patron).any():
+            continue  # sin distancia definida, o sin valores que aportar al patrón
+        if len(filas_grupo) < _MIN_FILAS_ARBOL:
+            pequenos.append(filas_grupo)
+            continue
+        k = min(n_vecinos, len(filas_grupo))
+        donantes = X[np.ix_(filas_grupo, comunes)]
+        if comunes.size <= _MAX_COLUMNAS_ARBOL:
+            dist, pos = cKDTree(donantes).query(receptores[:, comunes], k=k, workers=workers_arbol)
+            dist, pos = dist.reshape(len(filas), k), pos.reshape(len(filas), k)
+        else:
+            dist, pos = _vecinos_por_bloques(receptores[:, comunes], donantes, k)
+        por_arbol.append((dist * np.sqrt(n_columnas / comunes.size), filas_grupo[pos], observadas_grupo))
+    pequenos = np.concatenate(pequenos) if pequenos else np.empty(0, dtype=np.intp)
+    observados_pequenos = ~faltantes[pequenos][:, observadas] if pequenos.size else None
+
+    for inicio in range(0, len(filas), _FILAS_POR_BLOQUE):
+        bloque = slice(inicio, inicio + _FILAS_POR_BLOQUE)
+        dist_pequenos = None
+        if pequenos.size:
+            dist_pequenos = _distancias_parciales(receptores[bloque][:, observadas], X[pequenos][:, observadas],
+                                                  observados_pequenos, n_columnas)
+        for j, columna in enumerate(columnas):
+            dist, val = [], []
+            for dist_arbol, filas_vecinas, observadas_grupo in por_arbol:
+                if observadas_grupo[columna]:
+                    dist.append(dist_arbol[bloque])
+                    val.append(X[filas_vecinas[bloque], columna])
+            if dist_pequenos is not None:
+                donan = ~faltantes[pequenos, columna]
+                dist.append(np.where(donan, dist_pequenos, np.nan))
+                val.append(np.broadcast_to(np.where(donan, X[pequenos, columna], 0.0), dist_pequenos.shape))
+            if not dist:
+                resultado[bloque, j] = medias[columna]
+                continue
+            dist = np.concatenate(dist, axis=1)
+            val = np.concatenate(val, axis=1)
+
+            k = min(n_vecinos, dist.shape[1])
+            orden = np.argpartition(np.where(np.isnan(dist), np.inf, dist), k - 1, axis=1)[:, :k]
+            validos = ~np.isnan(np.take_along_axis(dist, orden, axis=1))
+            val_k = np.take_along_axis(val, orden, axis=1)
+            n_validos = validos.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                promedio = np.where(validos, val_k, 0.0).sum(axis=1) / n_validos
+            resultado[bloque, j] = np.where(n_validos > 0, promedio, medias[columna])
+    return resultado
+
+
+def imputar_knn_por_patrones(X: np.ndarray, n_vecinos: int = 5, max_workers: Optional[int] = None) -> np.ndarray:
+    """
+    Imputa los NaN de ``X`` con el promedio de los ``n_vecinos`` donantes más
+    cercanos (distancia euclidiana con NaN), agrupando las filas por patrón de
+    faltantes.
+
+    Args:
+        X (np.ndarray): Matriz filas × columnas numérica con NaN.
+        n_vecinos (int): Número de vecinos (``KNNImputer(n_neighbors=...)``).
+        max_workers (Optional[int]): Hilos para procesar los patrones receptores.
+            Por defecto ``PerformanceSettings.max_workers`` o el número de CPUs.
+
+    Returns:
+        np.ndarray: Copia de ``X`` imputada. Las columnas sin ningún dato quedan en NaN.
+
+    Example:
+        >>> X_imp = imputar_knn_por_patrones(df.to_numpy(), n_vecinos=5)
+    """
+    X = np.asarray(X, dtype=np.float64)
+    faltantes = np.isnan(X)
+    resultado = X.copy()
+    columnas_validas = ~faltantes.all(axis=0)
+    filas_incompletas = np.flatnonzero((faltantes & columnas_validas).any(axis=1))
+    if not filas_incompletas.size:
+        return resultado
+
+    with np.errstate(invalid='ignore'):
+        medias = np.nanmean(np.where(columnas_validas, X, 0.0), axis=0)
+
+    # Todas las filas agrupadas por patrón: las incompletas son receptoras, todas son donantes
+    patrones, inversa = np.unique(faltantes, axis=0, return_inverse=True)
+    inversa = inversa.ravel()
+    miembros = [np.flatnonzero(inversa == i) for i in range(len(patrones))]
+    grupos = [(miembros[i], ~patrones[i]) for i in range(len(patrones))]
+    tareas = [i for i, patron in enumerate(patrones) if (patron & columnas_validas).any()]
+
+    workers = max_workers or _workers_por_defecto()
+    workers_arbol = 1 if workers > 1 else -1
+
+    def _tarea(i):
+        columnas = np.flatnonzero(patrones[i] & columnas_validas)
+        return columnas, _imputar_patron(X, faltantes, miembros[i], patrones[i], grupos, columnas,
+                                         n_vecinos, medias, workers_arbol)
+
+    if workers > 1 and len(tareas) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            valores = list(executor.map(_tarea, tareas))
+    else:
+        valores = [_tarea(i) for i in tareas]
+
+    for i, (columnas, imputados) in zip(tareas, valores):
+        resultado[np.ix_(miembros[i], columnas)] = imputados
+    return resultado
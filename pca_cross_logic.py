@@ -4,54 +4,203 @@ Separa la lógica de negocio de la GUI.
 """
 import pandas as pd
 import numpy as np
-import data_loader_module as dl
 import preprocessing_module as dl_prep
 import pca_module as pca_mod
+import data_loader_module as dl
+from imputation_mask import ImputationMask
+from indicator_cube import IndicatorCube
 from constants import MAPEO_INDICADORES
 
 class PCAAnalysisLogic:
     @staticmethod
-    def run_cross_section_analysis_logic(cfg, year_to_analyze, imputation_strategy=None, imputation_params=None):
+    def run_cross_section_analysis_logic(cfg, year_to_analyze, imputation_strategy=None, imputation_params=None, cube=None, session=None):
         """
         Ejecuta el flujo de análisis de corte transversal para un año (sin GUI).
         Retorna un diccionario con todos los resultados intermedios y finales.
+        Si se pasa ``cube`` (IndicatorCube) se reutiliza en lugar de releer el libro.
+        Con ``session`` (AnalysisSession) el cubo se lee una vez para todos los años
+        seleccionados y una llamada idéntica devuelve el resultado guardado.
+        """
+        key = None
+        if session is not None:
+            key = session.result_key('corte_transversal', cfg["data_file"], cfg["selected_indicators"],
+                                     cfg["selected_units"], int(year_to_analyze), imputation_strategy, imputation_params)
+            results = session.get_result(key)
+            if results is not None:
+                return results
+        results = PCAAnalysisLogic._cross_section_analysis(cfg, year_to_analyze, imputation_strategy, imputation_params, cube, session)
+        if session is not None:
+            session.store_result(key, results)
+        return results
+
+    @staticmethod
+    def run_cross_section_years_logic(cfg, years=None, imputation_strategy=None, imputation_params=None,
+                                      cube=None, session=None, ajuste_conjunto=False):
         """
-        all_sheets_data = dl.load_excel_file(cfg["data_file"])
+        Ejecuta el corte transversal de varios años (por defecto ``cfg["selected_years"]``)
+        imputando todos los años en una sola llamada a
+        ``preprocessing_module.imputar_cortes_transversales`` y descomponiendo todos
+        con ``pca_module.pca_por_lotes``.
+
+        Cada resultado es el mismo que el de ``run_cross_section_analysis_logic`` para
+        ese año y se guarda en ``session`` con la misma clave. Con
+        ``ajuste_conjunto=True``, 'iterative' y 'knn' ajustan un solo imputador con
+        todos los años (los resultados dependen entonces del conjunto de años).
+
+        Returns:
+            dict: ``{año: resultados}``, o un dict con "error" si no hay datos.
+        """
+        years = [int(y) for y in (cfg.get("selected_years") if years is None else years) or []]
+        conjunto = bool(ajuste_conjunto) and imputation_strategy in dl_prep.ESTRATEGIAS_AJUSTE_CONJUNTO
+        claves, resultados = {}, {}
+        if session is not None:
+            extra = ('conjunto', years) if conjunto else ()
+            for year in years:
+                claves[year] = session.result_key('corte_transversal', cfg["data_file"], cfg["selected_indicators"],
+                                                  cfg["selected_units"], year, imputation_strategy,
+                                                  imputation_params, *extra)
+                guardado = session.get_result(claves[year])
+                if guardado is not None:
+                    resultados[year] = guardado
+        pendientes = years if conjunto and len(resultados) < len(years) else [y for y in years if y not in resultados]
+        if not pendientes:
+            return {year: resultados[year] for year in years}
+
+        if cube is None:
+            if session is not None:
+                cube = session.cube(cfg["data_file"], cfg["selected_indicators"], units=cfg["selected_units"], years=years)
+            else:
+                cube = IndicatorCube.from_file(cfg["data_file"], cfg["selected_indicators"],
+                                               units=cfg["selected_units"], years=years)
+            if cube is None:
+                return {"error": "No se pudieron cargar los datos del archivo seleccionado."}
+
+        df_cortes = cube.cross_sections(pendientes, cfg["selected_units"], cfg["selected_indicators"])
+        imputados, mascaras = {}, {}
+        if imputation_strategy and imputation_strategy != 'ninguna' and df_cortes.isnull().to_numpy().any():
+            # Los años sin ningún dato no se imputan (se reportan como advertencia)
+            con_datos = df_cortes.notna().groupby(level='Año').any().any(axis=1)
+            df_a_imputar = df_cortes[df_cortes.index.get_level_values('Año').isin(con_datos.index[con_datos])]
+            imputados, mascaras = dl_prep.imputar_cortes_transversales(
+                df_a_imputar, estrategia=imputation_strategy, devolver_mascara=True,
+                ajuste_conjunto=conjunto, mascara_compacta=True, **(imputation_params or {}))
+        preparados = {
+            year: PCAAnalysisLogic._cross_section_prepare(year, df_cortes.xs(year, level='Año'),
+                                                          imputados.get(year), mascaras.get(year))
+            for year in pendientes
+        }
+        # PCA de todos los años en lote: una llamada eigh/svd por forma (unidades válidas × indicadores)
+        listos = {year: parcial for year, parcial in preparados.items() if "warning" not in parcial}
+        descomposiciones = pca_mod.pca_por_lotes({year: parcial["df_year_estandarizado"] for year, parcial in listos.items()},
+                                                 {year: parcial["df_cov_cs"] for year, parcial in listos.items()})
+        for year in pendientes:
+            if year in listos:
+                resultados[year] = PCAAnalysisLogic._cross_section_finish(year, listos[year], descomposiciones[year])
+            else:
+                resultados[year] = preparados[year]
+            if session is not None:
+                session.store_result(claves[year], resultados[year])
+        return {year: resultados[year] for year in years}
+
+    @staticmethod
+    def missing_profile(cfg, years=None, cube=None, session=None):
+        """
+        Perfil de datos faltantes de la matriz unidades × indicadores de cada año
+        (por defecto ``cfg["selected_years"]``) en una sola pasada sobre esas celdas,
+        sin imputar, estandarizar ni calcular el PCA. ``perfil.faltantes_en(año)``
+        indica si el año necesita imputación.
+
+        Returns:
+            MissingProfile | dict: El perfil, o un dict con "error" si no hay datos.
+        """
+        years = [int(y) for y in (cfg.get("selected_years") if years is None else years) or []]
+        if cube is None:
+            if session is not None:
+                cube = session.cube(cfg["data_file"], cfg["selected_indicators"],
+                                    units=cfg["selected_units"], years=years or None)
+            else:
+                cube = IndicatorCube.from_file(cfg["data_file"], cfg["selected_indicators"],
+                                               units=cfg["selected_units"], years=years or None)
+            if cube is None:
+                return {"error": "No se pudieron cargar los datos del archivo seleccionado."}
+        return dl.perfil_faltantes(cube, cfg["selected_indicators"], cfg["selected_units"], years or None)
+
+    @staticmethod
+    def _cross_section_analysis(cfg, year_to_analyze, imputation_strategy, imputation_params, cube, session):
         selected_indicators = cfg["selected_indicators"]
         selected_units = cfg["selected_units"]
-        # 1. Preparar DataFrame de corte transversal
-        df_year_cross_section = dl.preparar_datos_corte_transversal(
-            all_sheets_data, selected_indicators, selected_units, year_to_analyze
-        )
+        if cube is None:
+            if session is not None:
+                years = sorted({int(y) for y in cfg.get("selected_years") or []} | {int(year_to_analyze)})
+                cube = session.cube(cfg["data_file"], selected_indicators, units=selected_units, years=years)
+            else:
+                cube = IndicatorCube.from_file(cfg["data_file"], selected_indicators,
+                                               units=selected_units, years=[int(year_to_analyze)])
+            if cube is None:
+                return {"error": "No se pudieron cargar los datos del archivo seleccionado."}
+        # 1. Matriz unidades x indicadores del año, extraída del cubo
+        df_year_cross_section = cube.cross_section(year_to_analyze, selected_units, selected_indicators)
+        df_imputed_cs, mascara_imputados = None, None
+        if (imputation_strategy and imputation_strategy != 'ninguna' and not df_year_cross_section.empty
+                and df_year_cross_section.isnull().to_numpy().any() and df_year_cross_section.notna().to_numpy().any()):
+            df_imputed_cs, mascara_imputados = dl_prep.manejar_datos_faltantes(
+                df_year_cross_section,
+                estrategia=imputation_strategy,
+                devolver_mascara=True,
+                mascara_compacta=True,
+                **(imputation_params or {})
+            )
+        return PCAAnalysisLogic._cross_section_pca(year_to_analyze, df_year_cross_section, df_imputed_cs, mascara_imputados)
+
+    @staticmethod
+    def _cross_section_pca(year_to_analyze, df_year_cross_section, df_imputed_cs=None, mascara_imputados=None):
+        """Limpieza, estandarización y PCA de la matriz de un año (ya imputada si corresponde)."""
+        results = PCAAnalysisLogic._cross_section_prepare(year_to_analyze, df_year_cross_section,
+                                                          df_imputed_cs, mascara_imputados)
+        if "warning" in results:
+            return results
+        # Una sola descomposición completa (eigh de la covarianza ya calculada)
+        descomposicion = pca_mod.descomponer_pca(results["df_year_estandarizado"], results["df_cov_cs"])
+        return PCAAnalysisLogic._cross_section_finish(year_to_analyze, results, descomposicion)
+
+    @staticmethod
+    def _cross_section_prepare(year_to_analyze, df_year_cross_section, df_imputed_cs=None, mascara_imputados=None):
+        """Limpieza y estandarización de la matriz de un año; resultados parciales o un dict con "warning"."""
         if df_year_cross_section.empty or df_year_cross_section.isnull().all().all():
             return {"warning": f"No hay datos suficientes para el año {year_to_analyze}."}
         # 2. Manejar datos faltantes
         if df_year_cross_section.isnull().sum().sum() > 0:
-            if imputation_strategy and imputation_strategy != 'ninguna':
-                df_imputed_cs, _ = dl_prep.manejar_datos_faltantes(
-                    df_year_cross_section,
-                    estrategia=imputation_strategy,
-                    devolver_mascara=True,
-                    **(imputation_params or {})
-                )
+            if df_imputed_cs is not None:
                 df_year_processed = df_imputed_cs.dropna(axis=0, how='any')
             else:
                 df_year_processed = df_year_cross_section.dropna(axis=0, how='any')
         else:
             df_year_processed = df_year_cross_section.copy()
+        if mascara_imputados is None:
+            mascara_imputados = ImputationMask.empty(df_year_cross_section.index, df_year_cross_section.columns)
         if df_year_processed.shape[0] < 2 or df_year_processed.shape[1] < 2:
             return {"warning": f"Insuficientes países/indicadores tras limpiar NaNs para el año {year_to_analyze}."}
         # 3. Estandarizar
         df_year_estandarizado, scaler = dl_prep.estandarizar_datos(df_year_processed, devolver_scaler=True)
         df_cov_cs = df_year_estandarizado.cov()
-        # 4. Calcular PCA (si hay datos suficientes)
         if df_year_estandarizado.shape[1] < 2:
             return {"warning": f"No hay suficientes indicadores para PCA en {year_to_analyze}."}
-        # PCA inicial solo para sugerencia
-        pca_model, _ = pca_mod.realizar_pca(df_year_estandarizado, n_components=None)
-        evr, cum_evr = pca_mod.obtener_varianza_explicada(pca_model)
-        # PCA para biplot (SIEMPRE 2)
-        pca_model_cs, df_pc_scores_cs = pca_mod.realizar_pca(df_year_estandarizado, n_components=2)
+        return {
+            "df_year_cross_section": df_year_cross_section,
+            "df_year_processed": df_year_processed,
+            "mascara_imputados_cs": mascara_imputados,
+            "df_year_estandarizado": df_year_estandarizado,
+            "scaler": scaler,
+            "df_cov_cs": df_cov_cs,
+        }
+
+    @staticmethod
+    def _cross_section_finish(year_to_analyze, results, descomposicion):
+        """Completa los resultados de un año con su descomposición PCA (el biplot usa SIEMPRE 2 componentes)."""
+        # 4. PCA
+        if descomposicion is None:
+            return {"warning": f"No se pudo calcular el PCA para el año {year_to_analyze}."}
+        pca_model_cs, df_pc_scores_cs = descomposicion.model(2), descomposicion.scores(2)
         evr_cs, cum_evr_cs = pca_mod.obtener_varianza_explicada(pca_model_cs)
         df_varianza_explicada_cs = pd.DataFrame({
             'Componente': [f'PC{i+1}' for i in range(len(evr_cs))],
@@ -59,16 +208,13 @@ class PCAAnalysisLogic:
             'Varianza Acumulada': cum_evr_cs
         }).set_index('Componente')
         # Prepara resultados
-        results = {
-            "df_year_cross_section": df_year_cross_section,
-            "df_year_processed": df_year_processed,
-            "df_year_estandarizado": df_year_estandarizado,
-            "scaler": scaler,
-            "df_cov_cs": df_cov_cs,
+        results = dict(results)
+        results.update({
+            "pca_descomposicion_cs": descomposicion,
             "pca_model_cs": pca_model_cs,
             "df_pc_scores_cs": df_pc_scores_cs,
             "df_varianza_explicada_cs": df_varianza_explicada_cs,
             "evr_cs": evr_cs,
             "cum_evr_cs": cum_evr_cs
-        }
+        })
         return results
@@ -1,6 +1,7 @@
 import os
 import json
 import logging
+import multiprocessing
 from logging.handlers import RotatingFileHandler
 import pandas as pd
 import numpy as np
@@ -12,10 +13,12 @@ import visualization_module as dl_viz
 import pca_module as pca_mod
 from constants import MAPEO_INDICADORES, CODE_TO_NAME
 from pca_panel3d_logic import PCAPanel3DLogic
+from analysis_session import AnalysisSession
 from project_save_config import ProjectConfig
 import platform
 import subprocess
 import sys
+import threading
 import webbrowser
 import functools
 
@@ -120,6 +123,35 @@ def safe_gui_callback(func):
             messagebox.showerror(tr("error"), f"{tr('unexpected_error') if 'unexpected_error' in _TRANSLATIONS else 'Unexpected error'}:\n{msg}")
     return wrapper
 
+# === Evaluación de estrategias de imputación sin bloquear la ventana ===
+def evaluar_imputacion_en_segundo_plano(widget, df, modo, al_terminar, intervalo_ms=100):
+    """
+    Ejecuta ``evaluar_estrategias_imputacion`` en un hilo y entrega el resultado a
+    ``al_terminar(ranking, error)`` en el hilo de Tk (revisando con ``widget.after``).
+
+    Se evalúa con ``paralelo=False``: en el ejecutable congelado un pool de procesos
+    volvería a lanzar la aplicación en cada proceso hijo.
+    """
+    resultado = {}
+
+    def evaluar():
+        try:
+            resultado['ranking'] = dl_prep.evaluar_estrategias_imputacion(df, modo=modo, paralelo=False)
+        except Exception as e:
+            resultado['error'] = e
+
+    hilo = threading.Thread(target=evaluar, daemon=True)
+    hilo.start()
+
+    def revisar():
+        if hilo.is_alive():
+            widget.after(intervalo_ms, revisar)
+        else:
+            al_terminar(resultado.get('ranking'), resultado.get('error'))
+
+    widget.after(intervalo_ms, revisar)
+    return hilo
+
 # === Definición de la clase principal de la app ===
 
 SETTINGS_PATH = os.path.join(os.path.dirname(__file__), "settings.json")
@@ -172,22 +204,29 @@ class PCAApp(tk.Tk):
         if cfg.get("selected_years"):
             selected_years = cfg["selected_years"] if isinstance(cfg["selected_years"], list) else [cfg["selected_years"]]
         
-        # Primero ejecuta una validación para detectar datos faltantes
-        temp_results = PCAAnalysisLogic.run_series_analysis_logic(cfg, imputation_strategy=None, imputation_params=None, selected_years=selected_years)
-        if "warning" in temp_results and ("faltantes" in temp_results["warning"] or "datos faltantes" in temp_results["warning"]):
+        # El cubo se toma de la sesión: la primera llamada lo lee proyectado a la unidad
+        # elegida (ver ``PCAAnalysisLogic.series_frame``) y las siguientes lo reutilizan.
+        # Perfil de datos faltantes de la serie (solo cuenta celdas; el análisis corre una vez)
+        perfil = PCAAnalysisLogic.missing_profile(cfg, selected_years=selected_years, session=self.session)
+        if isinstance(perfil, dict):
+            messagebox.showerror("Error", perfil["error"])
+            return
+        if perfil.hay_faltantes:
             respuesta = messagebox.askyesno(
                 "Datos faltantes detectados",
-                f"Se encontraron datos faltantes en la serie de tiempo.\n¿Quieres imputar los valores faltantes?\n\nDetalle: {temp_results['warning']}"
+                f"Se encontraron datos faltantes en la serie de tiempo.\n¿Quieres imputar los valores faltantes?\n\nDetalle: {perfil.resumen()}"
             )
             if respuesta:
-                estrategia, params = self.gui_select_imputation_strategy()
+                df_serie = PCAAnalysisLogic.series_frame(cfg, selected_years, session=self.session)
+                estrategia, params = self.gui_select_imputation_strategy(
+                    df_serie if isinstance(df_serie, pd.DataFrame) else None)
             else:
                 # Si el usuario no quiere imputar, mostrar el warning y salir
-                messagebox.showwarning("Advertencia", temp_results["warning"])
+                messagebox.showwarning("Advertencia", f"{perfil.resumen()}\nConsidera aplicar una estrategia de imputación para evitar errores en el análisis PCA.")
                 return
-        
-        # Ejecuta la lógica real con la estrategia de imputación seleccionada
-        results = PCAAnalysisLogic.run_series_analysis_logic(cfg, imputation_strategy=estrategia, imputation_params=params, selected_years=selected_years)
+
+        # Ejecuta la lógica con la estrategia de imputación seleccionada
+        results = PCAAnalysisLogic.run_series_analysis_logic(cfg, imputation_strategy=estrategia, imputation_params=params, selected_years=selected_years, session=self.session)
         if "warning" in results:
             messagebox.showwarning("Atención", results["warning"])
             return
@@ -217,6 +256,8 @@ class PCAApp(tk.Tk):
                         results["df_consolidado"].to_excel(writer, sheet_name="Consolidado", index=True)
                     if results.get("df_imputado") is not None:
                         results["df_imputado"].to_excel(writer, sheet_name="Imputado", index=True)
+                    if results.get("mascara_imputados") is not None and results["mascara_imputados"].any():
+                        results["mascara_imputados"].to_frame().to_excel(writer, sheet_name="Celdas_Imputadas", index=True)
                     if results.get("df_estandarizado") is not None:
                         results["df_estandarizado"].to_excel(writer, sheet_name="Estandarizado", index=True)
                     if results.get("df_covarianza") is not None:
@@ -699,6 +740,8 @@ class PCAApp(tk.Tk):
         self.apply_font_settings()
         
         self.project_config = ProjectConfig()
+        # Datos, frames y modelos compartidos entre los análisis del proyecto
+        self.session = AnalysisSession()
         if not os.path.exists(PROJECTS_DIR):
             os.makedirs(PROJECTS_DIR)
 
@@ -1163,6 +1206,7 @@ class PCAApp(tk.Tk):
                 continue
             break
         self.project_config = ProjectConfig()  # Reinicia la configuración
+        self.session.invalidate()
         self.project_config.project_name = nombre
         self.status.config(text=f"{tr('new_project')}: {nombre}")
         self.sync_gui_from_cfg()
@@ -1186,6 +1230,7 @@ class PCAApp(tk.Tk):
         if file_path:
             self.last_dir = os.path.dirname(file_path)
             self.project_config = ProjectConfig.load_from_file(file_path)
+            self.session.invalidate()
             self.sync_gui_from_cfg()
 
     @safe_gui_callback
@@ -1225,17 +1270,42 @@ class PCAApp(tk.Tk):
         from pca_cross_logic import PCAAnalysisLogic
         cfg = self.project_config.cross_section_config
         selected_years = [int(y) for y in cfg["selected_years"]]
+        cube = self.session.cube_for_config(cfg)
+        if cube is None:
+            messagebox.showerror("Error", "No se pudieron cargar los datos del archivo seleccionado.")
+            return
+        # Faltantes de todos los años en una sola pasada sobre las celdas seleccionadas
+        perfil = PCAAnalysisLogic.missing_profile(cfg, selected_years, cube=cube)
+        if isinstance(perfil, dict):
+            messagebox.showerror("Error", perfil["error"])
+            return
+        # Una sola estrategia para todos los años: se imputan juntos en una llamada
+        estrategia, params, ajuste_conjunto = None, None, False
+        anios_con_faltantes = [y for y in selected_years if perfil.faltantes_en(y) > 0]
+        if anios_con_faltantes:
+            respuesta = messagebox.askyesno(
+                "Imputar datos faltantes",
+                f"Se encontraron datos faltantes en {len(anios_con_faltantes)} de {len(selected_years)} años "
+                f"({', '.join(str(y) for y in anios_con_faltantes[:10])}"
+                f"{'...' if len(anios_con_faltantes) > 10 else ''}).\n¿Quieres imputar los valores faltantes?"
+            )
+            if respuesta:
+                estrategia, params = self.gui_select_imputation_strategy(
+                    cube.cross_sections(selected_years, cfg["selected_units"], cfg["selected_indicators"]), 'cortes')
+                if estrategia in dl_prep.ESTRATEGIAS_AJUSTE_CONJUNTO and len(anios_con_faltantes) > 1:
+                    ajuste_conjunto = messagebox.askyesno(
+                        "Ajuste conjunto",
+                        "¿Ajustar un solo imputador con todos los años seleccionados?\n"
+                        "Es mucho más rápido; si no, se ajusta uno por año."
+                    )
+        resultados_por_anio = PCAAnalysisLogic.run_cross_section_years_logic(
+            cfg, selected_years, imputation_strategy=estrategia, imputation_params=params,
+            cube=cube, session=self.session, ajuste_conjunto=ajuste_conjunto)
+        if "error" in resultados_por_anio:
+            messagebox.showerror("Error", resultados_por_anio["error"])
+            return
         for year_to_analyze in selected_years:
-            estrategia, params = None, None
-            temp_results = PCAAnalysisLogic.run_cross_section_analysis_logic(cfg, year_to_analyze)
-            if "warning" in temp_results and "faltantes" in temp_results["warning"]:
-                respuesta = messagebox.askyesno(
-                    f"Imputar año {year_to_analyze}",
-                    f"Se encontraron datos faltantes para el año {year_to_analyze}.\n¿Quieres imputar los valores faltantes?"
-                )
-                if respuesta:
-                    estrategia, params = self.gui_select_imputation_strategy()
-            results = PCAAnalysisLogic.run_cross_section_analysis_logic(cfg, year_to_analyze, imputation_strategy=estrategia, imputation_params=params)
+            results = resultados_por_anio[year_to_analyze]
             if "warning" in results:
                 messagebox.showwarning("Atención", results["warning"])
                 continue
@@ -1355,15 +1425,33 @@ class PCAApp(tk.Tk):
             if not cfg.get('data_file') or not cfg.get('selected_indicators') or not cfg.get('selected_units'):
                 messagebox.showerror("Error", "Faltan datos para el análisis 3D. Selecciona archivo, indicadores y países.")
                 return
-            all_sheets_data = dl.load_excel_file(cfg['data_file'])
-            if not all_sheets_data:
+            # Solo se leen los indicadores, países y años seleccionados (o se reutiliza la sesión)
+            cube = self.session.cube_for_config(cfg)
+            if cube is None:
                 messagebox.showerror("Error", "No se pudieron cargar los datos del archivo seleccionado.")
                 return
+            estrategia, params = None, None
+            perfil = dl.perfil_faltantes(cube, cfg['selected_indicators'], cfg['selected_units'],
+                                         cfg.get('selected_years') or None)
+            if perfil.hay_faltantes and messagebox.askyesno(
+                "Datos faltantes detectados",
+                f"Se encontraron datos faltantes en el panel.\n¿Quieres imputar los valores faltantes "
+                f"(por país, a lo largo de los años)? Si no, se descartan los país-año incompletos.\n\n"
+                f"Detalle: {perfil.resumen()}"
+            ):
+                df_panel = cube.panel(cfg['selected_units'], years=cfg.get('selected_years') or None,
+                                      indicators=cfg['selected_indicators'])
+                estrategia, params = self.gui_select_imputation_strategy(df_panel, 'panel')
             results = PCAPanel3DLogic.run_panel3d_analysis_logic(
-                all_sheets_data,
-                list(all_sheets_data.keys()),
+                None,
+                list(cube.indicators),
                 cfg['selected_indicators'],
-                cfg['selected_units']
+                cfg['selected_units'],
+                cube=cube,
+                years_selected=cfg.get('selected_years') or None,
+                session=self.session,
+                imputation_strategy=estrategia,
+                imputation_params=params
             )
             if 'error' in results:
                 messagebox.showerror("Error", results['error'])
@@ -1391,6 +1479,8 @@ class PCAApp(tk.Tk):
                     with pd.ExcelWriter(filename) as writer:
                         if results.get("df_pc_scores_panel") is not None:
                             results["df_pc_scores_panel"].to_excel(writer, sheet_name="PC_Scores_Panel", index=True)
+                        if results.get("df_cov_panel") is not None:
+                            results["df_cov_panel"].rename(index=MAPEO_INDICADORES, columns=MAPEO_INDICADORES).to_excel(writer, sheet_name="Matriz_Covarianza", index=True)
                         if results.get("country_groups") is not None:
                             pd.DataFrame(results["country_groups"]).to_excel(writer, sheet_name="Country_Groups")
                         if results.get("group_colors") is not None:
@@ -1414,7 +1504,11 @@ class PCAApp(tk.Tk):
         file = filedialog.askopenfilename(
             title=tr("select_file"),
             initialdir=getattr(self, "last_dir", PROJECTS_DIR) or PROJECTS_DIR,
-            filetypes=[("Excel files", "*.xlsx *.xls")]
+            filetypes=[
+                ("Data files", " ".join(f"*{ext}" for ext in dl.SUPPORTED_DATA_EXTENSIONS)),
+                ("Excel files", " ".join(f"*{ext}" for ext in dl.EXCEL_EXTENSIONS)),
+                ("CSV / Parquet / Feather / NPZ", " ".join(f"*{ext}" for ext in dl.COLUMNAR_EXTENSIONS)),
+            ]
         )
         if not file:
             messagebox.showwarning(tr("warning"), tr("no_file_selected") if "no_file_selected" in _TRANSLATIONS else "No se seleccionó ningún archivo.")
@@ -1429,16 +1523,18 @@ class PCAApp(tk.Tk):
         if config_name == "series_config":
             getattr(self.project_config, config_name)["selected_years"] = []
         import data_loader_module as dl
+        # Solo el índice de metadatos (hojas, unidades, años); el parseo numérico
+        # completo se difiere hasta que se ejecuta un análisis
         try:
-            all_sheets_data = dl.load_excel_file(file)
+            metadata = dl.obtener_metadatos_libro(file)
         except Exception as e:
             logger.exception("Error loading Excel file")
             messagebox.showerror(tr("error"), tr("file_load_error") + f"\n{e}" if "file_load_error" in _TRANSLATIONS else f"No se pudo cargar el archivo seleccionado.\n{e}")
             self.sheet_names = []
             self.sync_gui_from_cfg()
             return
-        if all_sheets_data:
-            self.sheet_names = list(all_sheets_data.keys())
+        if metadata and metadata.sheet_names:
+            self.sheet_names = metadata.sheet_names
             callback()
             self.sync_gui_from_cfg()  # ← nuevo
         else:
@@ -1578,18 +1674,18 @@ class PCAApp(tk.Tk):
             messagebox.showerror(tr("error"), tr("select_file_and_indicators_first") if "select_file_and_indicators_first" in _TRANSLATIONS else "Primero selecciona archivo e indicadores.")
             return
         try:
-            excel_data = pd.read_excel(
-                cfg["data_file"],
-                sheet_name=cfg["selected_indicators"][0]
-            )
+            metadata = dl.obtener_metadatos_libro(cfg["data_file"])
+            sheet_name = cfg["selected_indicators"][0]
+            if metadata is None or sheet_name not in metadata.sheets:
+                raise ValueError(f"No se pudo leer la hoja '{sheet_name}'.")
         except Exception as e:
             logger.exception("Error reading Excel for units")
             messagebox.showerror(tr("error"), tr("file_load_error") + f"\n{e}" if "file_load_error" in _TRANSLATIONS else f"No se pudo cargar el archivo seleccionado.\n{e}")
             return
-        if 'Unnamed: 0' not in excel_data.columns:
+        if not metadata.has_unit_column(sheet_name):
             messagebox.showerror(tr("error"), tr("unnamed_col_missing") if "unnamed_col_missing" in _TRANSLATIONS else "No se encontró la columna 'Unnamed: 0' en la hoja seleccionada.")
             return
-        all_units = sorted(excel_data['Unnamed: 0'].dropna().unique())
+        all_units = sorted(metadata.units(sheet_name))
         if not all_units:
             messagebox.showwarning(tr("warning"), tr("no_units_found") if "no_units_found" in _TRANSLATIONS else "No se encontraron unidades en la hoja seleccionada.")
             return
@@ -1634,16 +1730,15 @@ class PCAApp(tk.Tk):
         config_name = getattr(self, '_last_analysis_type', 'series_config')
         cfg = getattr(self.project_config, config_name)
         try:
-            df = pd.read_excel(
-                cfg["data_file"],
-                sheet_name=cfg["selected_indicators"][0]
-            )
+            metadata = dl.obtener_metadatos_libro(cfg["data_file"])
+            sheet_name = cfg["selected_indicators"][0]
+            if metadata is None or sheet_name not in metadata.sheets:
+                raise ValueError(f"No se pudo leer la hoja '{sheet_name}'.")
         except Exception as e:
             logger.exception("Error reading Excel for years")
             messagebox.showerror(tr("error"), tr("file_load_error") + f"\n{e}" if "file_load_error" in _TRANSLATIONS else f"No se pudo cargar el archivo seleccionado.\n{e}")
             return
-        year_columns = [col for col in df.columns if col != 'Unnamed: 0' and str(col).isdigit()]
-        year_columns = sorted(year_columns, key=lambda x: int(x))  # ordena por año
+        year_columns = metadata.years(sheet_name)  # ya ordenados por año
         if not year_columns:
             messagebox.showwarning(tr("warning"), tr("no_years_found") if "no_years_found" in _TRANSLATIONS else "No se encontraron años válidos en la hoja seleccionada.")
             return
@@ -1681,7 +1776,12 @@ class PCAApp(tk.Tk):
         tk.Button(button_frame, text=tr("unselect_all"), command=unselect_all, bg="lightcoral").grid(row=0, column=1, padx=5)
         tk.Button(button_frame, text=tr("ok"), command=confirm, bg="lightblue").grid(row=0, column=2, padx=5)
 
-    def gui_select_imputation_strategy(self):
+    def gui_select_imputation_strategy(self, df_evaluacion=None, modo_evaluacion='tabla'):
+        """
+        Diálogo de estrategia de imputación. Con ``df_evaluacion`` ofrece sugerir la
+        estrategia ocultando celdas conocidas de esos datos
+        (``preprocessing_module.evaluar_estrategias_imputacion``).
+        """
         estrategia = None
         params = {}
 
@@ -1701,13 +1801,46 @@ class PCAApp(tk.Tk):
 
         win = Toplevel(self)
         win.title(tr("select_imputation_strategy") if "select_imputation_strategy" in _TRANSLATIONS else "Selecciona Estrategia de Imputación")
-        win.geometry("480x420")
+        win.geometry("480x520" if df_evaluacion is not None else "480x420")
         tk.Label(win, text=tr("select_how_to_impute") if "select_how_to_impute" in _TRANSLATIONS else "Selecciona cómo quieres imputar los datos faltantes:", font=("Arial", 11, "bold")).pack(pady=10)
 
         estrategia_var = tk.StringVar(value="interpolacion")
         for key, txt in STRATEGIAS:
             tk.Radiobutton(win, text=txt, variable=estrategia_var, value=key, anchor="w", justify="left").pack(fill="x", padx=25)
 
+        if df_evaluacion is not None:
+            ranking_label = tk.Label(win, text="", justify="left", font=("Courier", 9))
+
+            def on_ranking(ranking, error):
+                self.config(cursor="")
+                if not win.winfo_exists():
+                    return  # el diálogo se cerró mientras se evaluaba
+                suggest_button.config(state=tk.NORMAL)
+                if error is not None:
+                    if isinstance(error, ValueError):
+                        messagebox.showwarning("Atención", str(error), parent=win)
+                    else:
+                        logger.error(f"Error al evaluar las estrategias de imputación: {error}")
+                        messagebox.showerror(tr("error"), str(error), parent=win)
+                    return
+                estrategia_var.set(ranking.index[0])
+                lineas = [f"{'Estrategia':<15}{'Error':>8}{'Tiempo':>9}"]
+                lineas += [f"{nombre:<15}{fila.rmse_normalizado:>8.3f}{fila.tiempo_s:>8.2f}s"
+                           for nombre, fila in ranking.iterrows()]
+                ranking_label.config(text="\n".join(lineas))
+
+            def on_suggest():
+                # La evaluación corre en un hilo; la ventana sigue respondiendo mientras tanto
+                self.config(cursor="watch")
+                suggest_button.config(state=tk.DISABLED)
+                ranking_label.config(text="Evaluando estrategias...")
+                evaluar_imputacion_en_segundo_plano(win, df_evaluacion, modo_evaluacion, on_ranking)
+
+            suggest_button = tk.Button(win, text="Sugerir estrategia (probar ocultando datos conocidos)",
+                                       command=on_suggest)
+            suggest_button.pack(pady=6)
+            ranking_label.pack()
+
         valor_entry = tk.Entry(win)
         def on_radio_change(*a):
             if estrategia_var.get() == "valor_constante":
@@ -1909,12 +2042,11 @@ class PCAApp(tk.Tk):
         if not cfg["data_file"] or not cfg["selected_indicators"]:
             messagebox.showwarning(tr("warning"), tr("select_file_and_indicators_first") if "select_file_and_indicators_first" in _TRANSLATIONS else "Primero elige archivo/indicadores")
             return
-        all_units = sorted(
-            pd.read_excel(
-                cfg["data_file"],
-                sheet_name=cfg["selected_indicators"][0]
-            )['Unnamed: 0'].dropna().unique()
-        )
+        metadata = dl.obtener_metadatos_libro(cfg["data_file"])
+        if metadata is None or cfg["selected_indicators"][0] not in metadata.sheets:
+            messagebox.showerror(tr("error"), tr("file_load_error") if "file_load_error" in _TRANSLATIONS else "No se pudo cargar el archivo seleccionado.")
+            return
+        all_units = sorted(metadata.units(cfg["selected_indicators"][0]))
         win = Toplevel(self); win.title(tr("edit_units")); win.resizable(False, False)
         tk.Label(win, text=tr("available") if "available" in _TRANSLATIONS else "Disponibles").grid(row=0, column=0, padx=8, pady=6)
         tk.Label(win, text=tr("selected") if "selected" in _TRANSLATIONS else "Seleccionadas").grid(row=0, column=2, padx=8, pady=6)
@@ -2037,5 +2169,8 @@ class PCAApp(tk.Tk):
 # ------------- FIN CLASE --------------
 
 if __name__ == "__main__":
+    # Necesario antes de todo lo demás en el ejecutable congelado (PCAPP.spec): en Windows
+    # los procesos hijos de ProcessPoolExecutor vuelven a ejecutar este script
+    multiprocessing.freeze_support()
     app = PCAApp()
     app.mainloop()
@@ -4,36 +4,64 @@ Separa la lógica de negocio de la GUI.
 """
 import pandas as pd
 import numpy as np
-import data_loader_module as dl
 import preprocessing_module as dl_prep
 import pca_module as pca_mod
+import data_loader_module as dl
+from imputation_mask import ImputationMask
+from indicator_cube import IndicatorCube
 from constants import MAPEO_INDICADORES
 
 class PCAAnalysisLogic:
     @staticmethod
-    def run_series_analysis_logic(cfg, imputation_strategy=None, imputation_params=None, selected_years=None):
+    def run_series_analysis_logic(cfg, imputation_strategy=None, imputation_params=None, selected_years=None, cube=None, session=None):
         """
         Ejecuta el flujo de análisis de serie de tiempo (sin GUI).
         Retorna un diccionario con todos los resultados intermedios y finales.
+        Si se pasa ``cube`` (IndicatorCube) se reutiliza en lugar de releer el libro.
+        Con ``session`` (AnalysisSession) el cubo y los resultados se comparten entre
+        llamadas: una llamada idéntica devuelve el resultado guardado.
+        """
+        key = None
+        if session is not None:
+            key = session.result_key('serie', cfg["data_file"], cfg["selected_indicators"], cfg["selected_units"][:1],
+                                     selected_years, imputation_strategy, imputation_params)
+            results = session.get_result(key)
+            if results is not None:
+                return results
+        results = PCAAnalysisLogic._series_analysis(cfg, imputation_strategy, imputation_params, selected_years, cube, session)
+        if session is not None:
+            session.store_result(key, results)
+        return results
+
+    @staticmethod
+    def missing_profile(cfg, selected_years=None, cube=None, session=None):
         """
-        all_sheets_data = dl.load_excel_file(cfg["data_file"])
+        Perfil de datos faltantes de la serie que analizaría ``run_series_analysis_logic``
+        (misma matriz años × indicadores), sin estandarizar ni calcular el PCA.
+
+        Returns:
+            MissingProfile | dict: El perfil, o un dict con "error" si no hay datos.
+        """
+        df_consolidado = PCAAnalysisLogic.series_frame(cfg, selected_years, cube, session)
+        if isinstance(df_consolidado, dict):
+            return df_consolidado
+        faltantes = df_consolidado.isnull().to_numpy().T[:, None, :]
+        return dl.MissingProfile.from_mask(faltantes, df_consolidado.columns, cfg["selected_units"][:1],
+                                           df_consolidado.index)
+
+    @staticmethod
+    def series_frame(cfg, selected_years=None, cube=None, session=None):
+        """Matriz años × indicadores de la unidad elegida, o un dict con "error"."""
         selected_indicators = cfg["selected_indicators"]
         selected_unit = cfg["selected_units"][0]
+        year_has_data = None
+        if cube is None:
+            cube, year_has_data = PCAAnalysisLogic._series_cube(cfg, session)
+            if cube is None:
+                return {"error": "No se pudieron cargar los datos del archivo seleccionado."}
 
-        # 2. Transformar cada hoja
-        data_transformada = {}
-        for ind in selected_indicators:
-            df = all_sheets_data[ind]
-            df_trans = dl.transformar_df_indicador_v1(df)
-            if df_trans is not None and not df_trans.empty:
-                data_transformada[ind] = df_trans
-
-        # 3. Consolidar los datos para el país elegido
-        df_consolidado = dl.consolidate_data_for_country(
-            data_transformada,
-            selected_unit,
-            selected_indicators
-        )
+        # Serie años x indicadores de la unidad elegida, extraída del cubo
+        df_consolidado = cube.series(selected_unit, indicators=selected_indicators, year_has_data=year_has_data)
         # Filtrar por años si se proporciona una lista
         if selected_years is not None and len(selected_years) > 0:
             # Convertir a int si es necesario
@@ -49,6 +77,41 @@ class PCAAnalysisLogic:
                 return {"error": f"No hay datos para los años seleccionados: {selected_years}"}
         if df_consolidado is None or df_consolidado.empty:
             return {"error": "No se pudieron consolidar los datos para el país seleccionado."}
+        return df_consolidado
+
+    @staticmethod
+    def _series_cube(cfg, session=None):
+        """
+        Cubo de la serie proyectado a la unidad elegida y su máscara de años con datos.
+
+        ``cube.series`` decide qué años incluir mirando todas las unidades de cada hoja;
+        esa presencia sale del índice de metadatos del libro, así que de cada hoja solo
+        se parsea la fila de la unidad (los años se filtran después). Sin índice (p. ej.
+        un cubo .npz, que ya está mapeado en memoria) se cargan los indicadores completos.
+
+        Returns:
+            tuple: (IndicatorCube | None, np.ndarray | None) para ``cube.series``.
+        """
+        data_file = cfg["data_file"]
+        selected_indicators = cfg["selected_indicators"]
+        metadata = None
+        if not str(data_file).lower().endswith('.npz'):
+            metadata = dl.obtener_metadatos_libro(data_file)
+        units = None if metadata is None else cfg["selected_units"][:1]
+        if session is not None:
+            cube = session.cube(data_file, selected_indicators, units=units)
+        else:
+            cube = IndicatorCube.from_file(data_file, selected_indicators, units=units)
+        if cube is None or metadata is None:
+            return cube, None
+        presentes = [i for i in selected_indicators if i in cube.indicators]
+        return cube, metadata.years_with_data(presentes, cube.years.tolist())
+
+    @staticmethod
+    def _series_analysis(cfg, imputation_strategy, imputation_params, selected_years, cube, session):
+        df_consolidado = PCAAnalysisLogic.series_frame(cfg, selected_years, cube, session)
+        if isinstance(df_consolidado, dict):
+            return df_consolidado
 
         ncols = df_consolidado.shape[1]
         if ncols == 1:
@@ -61,12 +124,13 @@ class PCAAnalysisLogic:
 
         # Imputación de datos faltantes
         df_imputado = df_consolidado.copy()
-        mascara_imputados = pd.DataFrame(False, index=df_imputado.index, columns=df_imputado.columns)
+        mascara_imputados = ImputationMask.empty(df_imputado.index, df_imputado.columns)
         if imputation_strategy and imputation_strategy != 'ninguna':
             df_imputado, mascara_imputados = dl_prep.manejar_datos_faltantes(
                 df_consolidado,
                 estrategia=imputation_strategy,
                 devolver_mascara=True,
+                mascara_compacta=True,
                 **(imputation_params or {})
             )
 
@@ -81,9 +145,12 @@ class PCAAnalysisLogic:
         df_varianza_explicada = None
         df_componentes = None
         pca_model_final = None
+        descomposicion = None
         if df_estandarizado.shape[1] > 1:
-            pca_model, _ = pca_mod.realizar_pca(df_estandarizado, n_components=None)
-            evr, cum_evr = pca_mod.obtener_varianza_explicada(pca_model)
+            # Descomposición completa: da la sugerencia y luego el PCA final sin otro ajuste
+            descomposicion = pca_mod.descomponer_pca(df_estandarizado, df_covarianza)
+            evr, cum_evr = pca_mod.obtener_varianza_explicada(
+                descomposicion.full_model if descomposicion is not None else None)
             # Validar que cum_evr no sea None antes de operar
             if cum_evr is None or evr is None:
                 return {"error": "No se pudo calcular la varianza explicada (cum_evr) porque el análisis PCA falló. Verifica que los datos no tengan NaNs y que haya suficientes observaciones."}
@@ -117,10 +184,20 @@ class PCAAnalysisLogic:
                 "df_varianza_explicada": df_varianza_explicada
             },
             # El PCA final y componentes se calculan aparte, según la selección del usuario
+            # (run_pca_final con esta descomposición)
+            "pca_descomposicion": descomposicion,
         }
         return results
 
     @staticmethod
-    def run_pca_final(df_estandarizado, n_componentes):
-        pca_model_final, df_componentes = pca_mod.realizar_pca(df_estandarizado, n_components=n_componentes)
-        return pca_model_final, df_componentes
+    def run_pca_final(df_estandarizado, n_componentes, descomposicion=None):
+        """
+        Modelo y puntuaciones con ``n_componentes``. Con la ``descomposicion`` del
+        análisis (``results["pca_descomposicion"]``) solo se recortan sus resultados.
+        """
+        if descomposicion is None:
+            return pca_mod.realizar_pca(df_estandarizado, n_components=n_componentes)
+        try:
+            return descomposicion.model(n_componentes), descomposicion.scores(n_componentes)
+        except ValueError:
+            return None, None
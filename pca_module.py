@@ -17,10 +17,12 @@ Fecha: 2025
 """
 import pandas as pd
 import numpy as np
-from sklearn.decomposition import PCA
+import sklearn
+from sklearn.decomposition import PCA, IncrementalPCA
 import matplotlib.pyplot as plt
+import copy
 import traceback
-from typing import Tuple, Optional, Union, List
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 # Importar sistemas de optimización y configuración
 from logging_config import get_logger
@@ -35,11 +37,487 @@ def print_module_pca(mensaje: str) -> None:
     logger.debug(f"MODULE PCA: {mensaje}")
 
 
+# Solvers que calculan todos los componentes / solo los primeros
+SOLVERS_EXACTOS = ('full', 'covariance_eigh')
+SOLVERS_TRUNCADOS = ('randomized', 'arpack')
+
+# Versión mínima de scikit-learn de los solvers posteriores a la requerida (1.1)
+SOLVER_MIN_SKLEARN = {
+    'covariance_eigh': (1, 5),
+}
+
+# Hasta este número de celdas cualquier solver tarda milisegundos: se usa la SVD completa
+_MAX_CELDAS_SVD_COMPLETA = 100_000
+
+# Hasta este número de variables el PCA por bloques acumula X'X (p × p) y la descompone exactamente
+_MAX_VARIABLES_GRAM = 2000
+
+
+def _version_sklearn() -> Tuple[int, int]:
+    partes = sklearn.__version__.split('.')
+    try:
+        return int(partes[0]), int(partes[1])
+    except (IndexError, ValueError):
+        return (0, 0)
+
+
+def solver_disponible(solver: str) -> str:
+    """``solver`` si la versión instalada de scikit-learn lo admite; si no, 'full' (exacto)."""
+    if _version_sklearn() >= SOLVER_MIN_SKLEARN.get(solver, (0, 0)):
+        return solver
+    logger.debug(f"svd_solver='{solver}' requiere scikit-learn >= "
+                 f"{'.'.join(map(str, SOLVER_MIN_SKLEARN[solver]))}; se usa 'full'.")
+    return 'full'
+
+
+def _solver_exacto(n_muestras: int, n_variables: int) -> str:
+    """'covariance_eigh' para matrices altas con hasta 2000 variables; 'full' en otro caso."""
+    if n_muestras * n_variables > _MAX_CELDAS_SVD_COMPLETA and n_muestras >= n_variables and n_variables <= 2000:
+        return solver_disponible('covariance_eigh')
+    return 'full'
+
+
+def elegir_solver_svd(n_muestras: int, n_variables: int, n_componentes: int) -> str:
+    """
+    Solver SVD de ``PCA`` para ``PCASettings.svd_solver='auto'`` según la forma de
+    los datos y los componentes pedidos. Los umbrales salen de
+    ``benchmarks/bench_pca_solvers.py``:
+
+    - Todos los componentes o matrices pequeñas: un solver exacto. Es
+      'covariance_eigh' (eigh de la covarianza variables × variables) si la matriz
+      es alta y tiene hasta 2000 variables; si no, 'full'.
+    - Paneles altos y angostos (filas ≥ 10 × variables, hasta 1000 variables):
+      'covariance_eigh' también para pocos componentes; su costo es una sola
+      pasada sobre los datos.
+    - Hasta 5 componentes (biplot, trayectorias 3D): 'arpack'.
+    - Hasta 1/20 del máximo posible (1/10 si la matriz es ancha): 'randomized'.
+
+    Con scikit-learn < 1.5 (sin 'covariance_eigh') se usa 'full' en su lugar.
+    """
+    maximo = min(n_muestras, n_variables)
+    if n_componentes >= maximo or n_muestras * n_variables <= _MAX_CELDAS_SVD_COMPLETA:
+        return _solver_exacto(n_muestras, n_variables)
+    if n_muestras >= 10 * n_variables and n_variables <= 1000:
+        return solver_disponible('covariance_eigh')
+    if n_componentes <= 5:
+        return 'arpack'
+    if n_componentes <= maximo // (20 if n_muestras >= n_variables else 10):
+        return 'randomized'
+    return _solver_exacto(n_muestras, n_variables)
+
+
+def _orientar_componentes(componentes: np.ndarray) -> np.ndarray:
+    """Signos como ``svd_flip`` de sklearn: el coeficiente de mayor magnitud de cada componente es positivo (admite lotes)."""
+    mayor = np.take_along_axis(componentes, np.abs(componentes).argmax(axis=-1)[..., None], axis=-1)
+    return componentes * np.where(mayor < 0, -1.0, 1.0)
+
+
+def _componentes_desde_eigh(valores: np.ndarray, vectores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Salida de ``np.linalg.eigh`` (ascendente) como valores propios descendentes sin
+    negativos y componentes en filas orientados; admite lotes (..., p) / (..., p, p).
+    """
+    valores = np.clip(valores[..., ::-1], 0.0, None)
+    componentes = np.swapaxes(vectores[..., ::-1], -1, -2)
+    return valores, _orientar_componentes(componentes)
+
+
+def _modelo_desde_eigen(columnas: pd.Index, n_muestras: int, media: np.ndarray, valores: np.ndarray,
+                        componentes: np.ndarray, solver: str) -> PCA:
+    """
+    ``PCA`` de sklearn con todos los ``min(n_muestras, n_variables)`` componentes a
+    partir de valores propios descendentes y componentes en filas ya orientados.
+    """
+    n_variables = len(columnas)
+    k = min(n_muestras, n_variables)
+    solver = solver_disponible(solver)
+    modelo = PCA(n_components=None, svd_solver=solver, random_state=get_config().pca.random_state)
+    modelo._fit_svd_solver = solver
+    modelo.n_features_in_ = n_variables
+    if all(isinstance(c, str) for c in columnas):
+        modelo.feature_names_in_ = np.asarray(columnas, dtype=object)
+    modelo.mean_ = media
+    modelo.n_samples_ = n_muestras
+    modelo.n_components_ = k
+    modelo.components_ = componentes[:k]
+    modelo.explained_variance_ = valores[:k]
+    modelo.explained_variance_ratio_ = valores[:k] / valores.sum()
+    modelo.singular_values_ = np.sqrt(valores[:k] * (n_muestras - 1))
+    modelo.noise_variance_ = 0.0
+    return modelo
+
+
+def _truncar_modelo(completo: PCA, k: int) -> PCA:
+    """Copia de ``completo`` con solo sus ``k`` primeros componentes, como ``PCA(n_components=k)``."""
+    modelo = copy.copy(completo)
+    modelo.n_components = k
+    modelo.n_components_ = k
+    modelo.components_ = completo.components_[:k]
+    modelo.explained_variance_ = completo.explained_variance_[:k]
+    modelo.explained_variance_ratio_ = completo.explained_variance_ratio_[:k]
+    modelo.singular_values_ = completo.singular_values_[:k]
+    # Como en sklearn: media de la varianza de los componentes descartados
+    if k < min(completo.n_samples_, completo.n_features_in_):
+        modelo.noise_variance_ = completo.explained_variance_[k:].mean()
+    else:
+        modelo.noise_variance_ = 0.0
+    return modelo
+
+
+class PCADecomposition:
+    """
+    Descomposición PCA completa de una matriz estandarizada, calculada una sola vez.
+
+    Todos los componentes posibles (``min(n_muestras, n_variables)``) se obtienen
+    con un único ajuste; ``model(k)`` y ``scores(k)`` entregan el modelo truncado
+    y las puntuaciones de los ``k`` primeros componentes recortando esos
+    resultados, sin volver a validar los datos ni a ejecutar la SVD. Así la
+    sugerencia de componentes (varianza explicada de todos) y el biplot (k=2) o
+    el PCA final (k elegido por el usuario) comparten el mismo ajuste.
+
+    ``model(k)`` es un ``sklearn.decomposition.PCA`` con ``components_``,
+    ``explained_variance_ratio_``, ``singular_values_``, etc. de los ``k``
+    primeros componentes, equivalente a ``PCA(n_components=k).fit(X)``; sirve
+    tal cual para ``transform`` y para ``graficar_biplot_corte_transversal``.
+
+    Attributes:
+        full_model (PCA): Modelo con todos los componentes.
+        index (pd.Index): Observaciones (filas de las puntuaciones).
+        feature_names (list): Variables usadas en el ajuste.
+
+    Example:
+        >>> descomposicion = descomponer_pca(df_std)
+        >>> descomposicion.explained_variance_ratio_       # sugerencia (todos)
+        >>> modelo_2d = descomposicion.model(2)             # biplot
+        >>> df_scores = descomposicion.scores(2)
+    """
+
+    def __init__(self, full_model: PCA, scores: np.ndarray, index: pd.Index, data: pd.DataFrame):
+        self.full_model = full_model
+        self.index = index
+        self.feature_names = list(getattr(full_model, 'feature_names_in_', range(full_model.n_features_in_)))
+        self._scores = scores
+        self._data = data
+
+    @classmethod
+    def from_covariance(cls, data: pd.DataFrame, covarianza: np.ndarray) -> "PCADecomposition":
+        """
+        Descomposición a partir de la matriz de covarianza p × p ya calculada de
+        ``data`` (p. ej. ``df_estandarizado.cov()``): ``eigh`` de la covarianza y
+        puntuaciones con un solo producto de matrices, como
+        ``PCA(svd_solver='covariance_eigh')`` pero sin recalcular la covarianza.
+        """
+        X = data.to_numpy(dtype=np.float64)
+        media = X.mean(axis=0)
+        valores, componentes = _componentes_desde_eigh(*np.linalg.eigh(covarianza))
+        puntuaciones = (X - media) @ componentes[:min(X.shape)].T
+        return cls._from_eigen(data, media, valores, componentes, puntuaciones, 'covariance_eigh')
+
+    @classmethod
+    def _from_eigen(cls, data: pd.DataFrame, media: np.ndarray, valores: np.ndarray, componentes: np.ndarray,
+                    puntuaciones: np.ndarray, solver: str) -> "PCADecomposition":
+        """
+        Arma la descomposición con valores propios descendentes (varianzas de todos
+        los componentes), componentes en filas ya orientados y puntuaciones de los
+        ``min(n_muestras, n_variables)`` componentes.
+        """
+        modelo = _modelo_desde_eigen(data.columns, data.shape[0], media, valores, componentes, solver)
+        return cls(modelo, puntuaciones, data.index, data)
+
+    @property
+    def max_components(self) -> int:
+        return self.full_model.n_components_
+
+    @property
+    def explained_variance_ratio_(self) -> np.ndarray:
+        return self.full_model.explained_variance_ratio_
+
+    def n_components_for(self, n_components: Optional[Union[int, float, str]] = None) -> int:
+        """
+        Número de componentes para ``n_components`` con la semántica de ``PCA``:
+        None = todos, int (acotado al máximo), float en (0, 1) = fracción de
+        varianza a explicar, 'mle' = estimador de Minka.
+        """
+        max_components = self.max_components
+        if n_components is None:
+            return max_components
+        if isinstance(n_components, str):
+            if n_components != 'mle':
+                raise ValueError(f"n_components '{n_components}' no reconocido.")
+            return PCA(n_components='mle', svd_solver='full').fit(self._data).n_components_
+        if isinstance(n_components, (int, np.integer)) and not isinstance(n_components, bool):
+            if n_components < 1:
+                raise ValueError(f"n_components debe ser positivo; se recibió {n_components}.")
+            if n_components > max_components:
+                logger.warning(f"n_components ({n_components}) es mayor que el máximo posible ({max_components}).")
+                logger.warning(f"Se ajustará n_components a {max_components}.")
+            return min(int(n_components), max_components)
+        if isinstance(n_components, (float, np.floating)) and 0 < n_components < 1:
+            acumulada = np.cumsum(self.full_model.explained_variance_ratio_)
+            return min(int(np.searchsorted(acumulada, n_components, side='right')) + 1, max_components)
+        raise ValueError(f"n_components inválido: {n_components!r}.")
+
+    def model(self, n_components: Optional[Union[int, float, str]] = None) -> PCA:
+        """Modelo ``PCA`` ajustado con los primeros componentes (nuevo objeto en cada llamada)."""
+        return _truncar_modelo(self.full_model, self.n_components_for(n_components))
+
+    def scores(self, n_components: Optional[Union[int, float, str]] = None) -> pd.DataFrame:
+        """Puntuaciones de las observaciones en los primeros componentes (PC1, PC2, ...)."""
+        k = self.n_components_for(n_components)
+        return pd.DataFrame(self._scores[:, :k], columns=[f'PC{i+1}' for i in range(k)], index=self.index)
+
+
+def _preparar_datos_pca(df_estandarizado: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Valida los datos, optimiza su memoria y deja solo las columnas numéricas; None si no sirven."""
+    # Validar datos de entrada usando la función independiente
+    try:
+        is_valid, validation_info = validate_dataframe_for_pca(df_estandarizado, "DataFrame estandarizado")
+        if not is_valid:
+            error_msg = f"Validación fallida: {validation_info.get('summary', 'Error desconocido')}"
+            logger.error(error_msg)
+            return None
+    except Exception as e:
+        logger.error(f"Error durante validación: {e}")
+        return None
+
+    if df_estandarizado is None or df_estandarizado.empty:
+        logger.error("El DataFrame estandarizado de entrada está vacío o es None.")
+        return None
+
+    # Optimizar memoria sobre una copia superficial: no cambia los tipos del DataFrame del llamador
+    df_estandarizado = optimize_memory(df_estandarizado.copy(deep=False))
+
+    if df_estandarizado.isnull().sum().sum() > 0:
+        logger.error("El DataFrame estandarizado contiene valores NaN. El ACP no puede continuar.")
+        logger.error(f"NaNs por columna:\n{df_estandarizado.isnull().sum()[df_estandarizado.isnull().sum() > 0]}")
+        return None
+
+    # Asegurar que todas las columnas sean numéricas (aunque deberían serlo después de estandarizar)
+    numeric_cols = df_estandarizado.select_dtypes(include=np.number).columns
+    if len(numeric_cols) != df_estandarizado.shape[1]:
+        logger.warning("No todas las columnas en el DataFrame estandarizado son numéricas.")
+        logger.warning("Se procederá solo con las columnas numéricas.")
+        df_estandarizado = df_estandarizado[numeric_cols]
+        if df_estandarizado.empty:
+            logger.error("No hay columnas numéricas para el ACP después del filtrado.")
+            return None
+    return df_estandarizado
+
+
+def _alinear_covarianza(matriz_covarianza: Union[pd.DataFrame, np.ndarray], columnas: pd.Index) -> Optional[np.ndarray]:
+    """Covarianza como array p × p en el orden de ``columnas``, o None si no corresponde a los datos."""
+    try:
+        if isinstance(matriz_covarianza, pd.DataFrame):
+            matriz_covarianza = matriz_covarianza.loc[columnas, columnas]
+        covarianza = np.asarray(matriz_covarianza, dtype=np.float64)
+    except (KeyError, ValueError, TypeError) as e:
+        logger.error(f"La matriz de covarianza no corresponde a las columnas de los datos: {e}")
+        return None
+    if covarianza.shape != (len(columnas), len(columnas)) or not np.all(np.isfinite(covarianza)):
+        logger.error(f"Matriz de covarianza inválida: forma {covarianza.shape}, se esperaba "
+                     f"{(len(columnas), len(columnas))} sin NaN.")
+        return None
+    if not np.allclose(covarianza, covarianza.T):
+        logger.error("La matriz de covarianza no es simétrica.")
+        return None
+    return covarianza
+
+
+@cached
+def descomponer_pca(df_estandarizado: pd.DataFrame,
+                    matriz_covarianza: Optional[Union[pd.DataFrame, np.ndarray]] = None) -> Optional[PCADecomposition]:
+    """
+    Valida ``df_estandarizado`` y calcula su descomposición PCA completa una vez.
+
+    El solver es el de ``PCASettings.svd_solver`` si calcula todos los
+    componentes ('full' o 'covariance_eigh'); si no, el exacto que corresponde a
+    la forma de los datos (ver ``elegir_solver_svd``). Con ``matriz_covarianza``
+    y al menos tantas filas como columnas se usa ``eigh`` sobre esa matriz
+    (``PCADecomposition.from_covariance``) en lugar de una SVD de los datos.
+
+    Args:
+        df_estandarizado (pd.DataFrame): Datos estandarizados sin NaN (observaciones
+            en filas, variables en columnas). Las columnas no numéricas se ignoran.
+        matriz_covarianza (Optional[Union[pd.DataFrame, np.ndarray]]): Covarianza
+            p × p de ``df_estandarizado`` ya calculada (p. ej. ``df.cov()`` para
+            exportar). Si es un DataFrame se alinea por etiquetas con las columnas.
+
+    Returns:
+        Optional[PCADecomposition]: La descomposición, o None si los datos no son
+            válidos o el ajuste falla.
+
+    Example:
+        >>> descomposicion = descomponer_pca(df_std)
+        >>> pca_model, df_components = descomposicion.model(2), descomposicion.scores(2)
+    """
+    df_procesar_pca = _preparar_datos_pca(df_estandarizado)
+    if df_procesar_pca is None:
+        return None
+
+    covarianza = None
+    if matriz_covarianza is not None and df_procesar_pca.shape[0] >= df_procesar_pca.shape[1]:
+        covarianza = _alinear_covarianza(matriz_covarianza, df_procesar_pca.columns)
+        if covarianza is None:
+            return None
+
+    try:
+        if covarianza is not None:
+            descomposicion = PCADecomposition.from_covariance(df_procesar_pca, covarianza)
+            logger.info(f"Descomposición PCA completa (eigh de la covarianza): {descomposicion.max_components} "
+                        f"componentes, forma de los datos {df_procesar_pca.shape}.")
+            return descomposicion
+
+        config = get_config().pca
+        if config.svd_solver in SOLVERS_EXACTOS:
+            solver = solver_disponible(config.svd_solver)
+        else:
+            solver = _solver_exacto(*df_procesar_pca.shape)
+        # Un solo ajuste con todos los componentes posibles; los modelos truncados se recortan de él
+        pca_model = PCA(n_components=None, svd_solver=solver, random_state=config.random_state)
+        pca_data = pca_model.fit_transform(df_procesar_pca)
+        logger.info(f"Descomposición PCA completa ({solver}): {pca_model.n_components_} componentes, "
+                    f"forma de los datos {df_procesar_pca.shape}.")
+        return PCADecomposition(pca_model, pca_data, df_procesar_pca.index, df_procesar_pca)
+
+    except Exception as e:
+        logger.error(f"Error durante la ejecución del ACP: {e}")
+        logger.error(traceback.format_exc())
+        return None
+
+
+def _bloque_valido_para_lote(clave: Any, df: pd.DataFrame) -> bool:
+    """Requisitos mínimos de ``validate_dataframe_for_pca`` sin sus advertencias por bloque."""
+    if not isinstance(df, pd.DataFrame) or df.shape[0] < 3 or df.shape[1] < 2:
+        logger.error(f"Bloque {clave!r}: se requieren al menos 3 filas y 2 columnas.")
+        return False
+    if not all(pd.api.types.is_numeric_dtype(t) for t in df.dtypes):
+        logger.error(f"Bloque {clave!r}: todas las columnas deben ser numéricas.")
+        return False
+    if not np.isfinite(df.to_numpy(dtype=np.float64)).all():
+        logger.error(f"Bloque {clave!r}: contiene NaN o valores infinitos.")
+        return False
+    return True
+
+
+def _valores_de_ajuste(df: pd.DataFrame) -> np.ndarray:
+    """
+    Valores de ``df`` en float64 con la precisión con la que ``descomponer_pca`` los
+    ajusta: ``optimize_memory`` deja en float32 las columnas que caben en ese tipo.
+    """
+    X = df.to_numpy(dtype=np.float64, copy=True)
+    limite = np.finfo(np.float32).max
+    caben = (X.min(axis=0) >= -limite) & (X.max(axis=0) <= limite)
+    X[:, caben] = X[:, caben].astype(np.float32)
+    return X
+
+
+def pca_por_lotes(
+    bloques: Dict[Any, pd.DataFrame],
+    covarianzas: Optional[Dict[Any, Union[pd.DataFrame, np.ndarray]]] = None
+) -> Dict[Any, Optional[PCADecomposition]]:
+    """
+    Descomposición PCA completa de muchos bloques estandarizados (p. ej. el corte
+    transversal de cada año) con una llamada vectorizada por forma.
+
+    Los bloques se agrupan por forma (filas, columnas); años con distinto número de
+    unidades válidas quedan en grupos distintos. Cada grupo se apila en un array
+    (bloques, filas, columnas) y se descompone con una sola llamada: ``eigh`` de
+    las covarianzas apiladas si hay al menos tantas filas como columnas, o ``svd``
+    de los datos centrados si no. Los datos se toman con la misma precisión que
+    en ``descomponer_pca`` (float32 tras ``optimize_memory``), así que cada bloque
+    da las mismas puntuaciones que su llamada individual. Las puntuaciones salen de un solo ``matmul`` por
+    grupo. Cada resultado es una ``PCADecomposition`` como la de ``descomponer_pca``
+    (``model(k)``, ``scores(k)``), sin validar ni ajustar bloque por bloque.
+
+    Args:
+        bloques (Dict[Any, pd.DataFrame]): Bloques estandarizados, numéricos y sin
+            NaN, por clave (p. ej. año).
+        covarianzas (Optional[Dict]): Covarianzas ya calculadas de algunos bloques
+            (p. ej. las que se exportan); las que falten se calculan en el lote.
+
+    Returns:
+        Dict[Any, Optional[PCADecomposition]]: Descomposición por clave, en el orden
+            de ``bloques``; None para los bloques que no cumplen los requisitos.
+
+    Example:
+        >>> descomposiciones = pca_por_lotes({anio: df_std[anio] for anio in anios})
+        >>> modelo_2020, scores_2020 = descomposiciones[2020].model(2), descomposiciones[2020].scores(2)
+    """
+    covarianzas = covarianzas or {}
+    resultados: Dict[Any, Optional[PCADecomposition]] = {}
+    grupos: Dict[Tuple[int, int], List[Any]] = {}
+    for clave, df in bloques.items():
+        if _bloque_valido_para_lote(clave, df):
+            grupos.setdefault(df.shape, []).append(clave)
+        else:
+            resultados[clave] = None
+
+    for (n_muestras, n_variables), claves in grupos.items():
+        X = np.stack([_valores_de_ajuste(bloques[clave]) for clave in claves])
+        medias = X.mean(axis=1)
+        X -= medias[:, None, :]
+        if n_muestras >= n_variables:
+            C = np.empty((len(claves), n_variables, n_variables))
+            faltan = []
+            for i, clave in enumerate(claves):
+                dada = None
+                if covarianzas.get(clave) is not None:
+                    dada = _alinear_covarianza(covarianzas[clave], bloques[clave].columns)
+                if dada is None:
+                    faltan.append(i)
+                else:
+                    C[i] = dada
+            if faltan:
+                # Solo los bloques sin covarianza dada; sin copiar X si faltan todos
+                X_faltan = X if len(faltan) == len(claves) else X[faltan]
+                C[faltan] = np.matmul(np.swapaxes(X_faltan, 1, 2), X_faltan) / (n_muestras - 1)
+            valores, componentes = _componentes_desde_eigh(*np.linalg.eigh(C))
+            solver = 'covariance_eigh'
+        else:
+            _, singulares, componentes = np.linalg.svd(X, full_matrices=False)
+            valores, componentes = singulares ** 2 / (n_muestras - 1), _orientar_componentes(componentes)
+            solver = 'full'
+        k = min(n_muestras, n_variables)
+        puntuaciones = np.matmul(X, np.swapaxes(componentes[:, :k], 1, 2))
+        for i, clave in enumerate(claves):
+            resultados[clave] = PCADecomposition._from_eigen(bloques[clave], medias[i], valores[i], componentes[i],
+                                                             puntuaciones[i], solver)
+        logger.info(f"PCA por lotes ({solver}): {len(claves)} bloques de forma {(n_muestras, n_variables)}.")
+    return {clave: resultados[clave] for clave in bloques}
+
+
+def _pca_truncado(df_estandarizado: pd.DataFrame, n_components: int,
+                  solver: str) -> Tuple[Optional[PCA], Optional[pd.DataFrame]]:
+    """Ajusta solo los primeros ``n_components`` con un solver truncado ('randomized' o 'arpack')."""
+    df_procesar_pca = _preparar_datos_pca(df_estandarizado)
+    if df_procesar_pca is None:
+        return None, None
+    try:
+        max_possible_components = min(df_procesar_pca.shape)
+        if n_components > max_possible_components:
+            logger.warning(f"n_components ({n_components}) es mayor que el máximo posible ({max_possible_components}).")
+            logger.warning(f"Se ajustará n_components a {max_possible_components}.")
+            n_components = max_possible_components
+        if solver == 'arpack' and n_components >= max_possible_components:
+            solver = 'full'  # arpack exige n_components < min(n_muestras, n_variables)
+        pca_model = PCA(n_components=n_components, svd_solver=solver, random_state=get_config().pca.random_state)
+        pca_data = pca_model.fit_transform(df_procesar_pca)
+        df_pca_components = pd.DataFrame(pca_data, columns=[f'PC{i+1}' for i in range(pca_model.n_components_)],
+                                         index=df_procesar_pca.index)
+        logger.info(f"ACP realizado ({solver}). Número de componentes generados: {pca_model.n_components_}.")
+        return pca_model, df_pca_components
+    except Exception as e:
+        logger.error(f"Error durante la ejecución del ACP: {e}")
+        logger.error(traceback.format_exc())
+        return None, None
+
+
 @profiled
 @cached
 def realizar_pca(
     df_estandarizado: pd.DataFrame, 
-    n_components: Optional[Union[int, float, str]] = None
+    n_components: Optional[Union[int, float, str]] = None,
+    matriz_covarianza: Optional[Union[pd.DataFrame, np.ndarray]] = None
 ) -> Tuple[Optional[PCA], Optional[pd.DataFrame]]:
     """
     Realiza el Análisis de Componentes Principales (ACP) sobre un DataFrame estandarizado.
@@ -56,7 +534,12 @@ def realizar_pca(
             - int: número exacto de componentes (ej. 3)
             - float (0.0-1.0): porcentaje de varianza a explicar (ej. 0.95 para 95%)
             - str 'mle': usa estimador Maximum Likelihood de Minka
-            - None: retiene min(n_muestras, n_features) componentes
+            - None: ``PCASettings.default_n_components``; 'auto' retiene
+              min(n_muestras, n_features) componentes
+        matriz_covarianza (Optional[Union[pd.DataFrame, np.ndarray]]): Covarianza
+            p × p ya calculada de ``df_estandarizado`` (la que se exporta). Con
+            filas ≥ columnas la descomposición es un ``eigh`` de esta matriz y las
+            puntuaciones un solo producto de matrices (ver ``descomponer_pca``).
 
     Returns:
         Tuple[Optional[PCA], Optional[pd.DataFrame]]: 
@@ -83,6 +566,11 @@ def realizar_pca(
         - La función valida automáticamente que n_components no exceda el máximo posible
         - Los nombres de componentes siguen el formato PC1, PC2, PC3, etc.
         - El índice del DataFrame resultante se preserva del DataFrame original
+        - El modelo se recorta de ``descomponer_pca`` (cacheada): pedir varios
+          ``n_components`` sobre los mismos datos ajusta el PCA una sola vez
+        - Con un ``n_components`` entero, si ``PCASettings.svd_solver`` (o
+          ``elegir_solver_svd`` en modo 'auto') indica un solver truncado
+          ('randomized', 'arpack'), se ajustan solo esos componentes
     """
     logger.info(f"Iniciando ACP con n_components={n_components if n_components is not None else 'todos'}.")
 
@@ -90,74 +578,26 @@ def realizar_pca(
     config = get_config().pca
     if n_components is None:
         n_components = config.default_n_components
-    
-    # Validar datos de entrada usando la función independiente
-    try:
-        is_valid, validation_info = validate_dataframe_for_pca(df_estandarizado, "DataFrame estandarizado")
-        if not is_valid:
-            error_msg = f"Validación fallida: {validation_info.get('summary', 'Error desconocido')}"
-            logger.error(error_msg)
-            return None, None
-    except Exception as e:
-        logger.error(f"Error durante validación: {e}")
-        return None, None
-
-    # Optimizar memoria del DataFrame
-    df_estandarizado = optimize_memory(df_estandarizado)
-
-    if df_estandarizado is None or df_estandarizado.empty:
-        logger.error("El DataFrame estandarizado de entrada está vacío o es None.")
-        return None, None
-
-    if df_estandarizado.isnull().sum().sum() > 0:
-        logger.error("El DataFrame estandarizado contiene valores NaN. El ACP no puede continuar.")
-        logger.error(f"NaNs por columna:\n{df_estandarizado.isnull().sum()[df_estandarizado.isnull().sum() > 0]}")
+    if n_components == 'auto':
+        n_components = None  # todos los componentes posibles
+
+    if matriz_covarianza is None and isinstance(n_components, (int, np.integer)) and not isinstance(n_components, bool):
+        solver = solver_disponible(config.svd_solver)
+        if solver == 'auto':
+            solver = elegir_solver_svd(df_estandarizado.shape[0], df_estandarizado.shape[1], n_components)
+        if solver in SOLVERS_TRUNCADOS:
+            # Pocos componentes de una matriz grande: no hace falta la descomposición completa
+            return _pca_truncado(df_estandarizado, n_components, solver)
+
+    descomposicion = descomponer_pca(df_estandarizado, matriz_covarianza)
+    if descomposicion is None:
         return None, None
 
     try:
-        # Asegurar que todas las columnas sean numéricas (aunque deberían serlo después de estandarizar)
-        numeric_cols = df_estandarizado.select_dtypes(include=np.number).columns
-        if len(numeric_cols) != df_estandarizado.shape[1]:
-            logger.warning("No todas las columnas en el DataFrame estandarizado son numéricas.")
-            logger.warning("Se procederá solo con las columnas numéricas.")
-            df_procesar_pca = df_estandarizado[numeric_cols]
-            if df_procesar_pca.empty:
-                 logger.error("No hay columnas numéricas para el ACP después del filtrado.")
-                 return None, None
-        else:
-            df_procesar_pca = df_estandarizado.copy() # Usar una copia para evitar SettingWithCopyWarning si se modifica
-
-        # Si n_components es None, PCA() por defecto usa min(n_samples, n_features)
-        # Si n_components es un float para varianza explicada, y el número de componentes resultante
-        # es menor que 1, puede dar problemas. PCA maneja esto internamente.
-        
-        # Considerar el caso donde n_components solicitado podría ser mayor que min(n_samples, n_features)
-        max_possible_components = min(df_procesar_pca.shape[0], df_procesar_pca.shape[1])
-        
-        if isinstance(n_components, int) and n_components > max_possible_components:
-            logger.warning(f"n_components ({n_components}) es mayor que el máximo posible ({max_possible_components}).")
-            logger.warning(f"Se ajustará n_components a {max_possible_components}.")
-            n_components_pca = max_possible_components
-        elif n_components is None: # Default
-             n_components_pca = max_possible_components # Para ser explícitos
-        else:
-            n_components_pca = n_components
-
-
-        pca_model = PCA(n_components=n_components_pca, random_state=config.random_state) # random_state para reproducibilidad
-        
-        # Ajustar el modelo y transformar los datos
-        # .fit_transform() ajusta el modelo y luego aplica la reducción de dimensionalidad.
-        pca_data = pca_model.fit_transform(df_procesar_pca)
-        
-        num_componentes_reales = pca_model.n_components_
-        nombres_componentes = [f'PC{i+1}' for i in range(num_componentes_reales)]
-        
-        df_pca_components = pd.DataFrame(data=pca_data, 
-                                         columns=nombres_componentes, 
-                                         index=df_procesar_pca.index)
+        pca_model = descomposicion.model(n_components)
+        df_pca_components = descomposicion.scores(pca_model.n_components_)
 
-        logger.info(f"ACP realizado. Número de componentes generados: {num_componentes_reales}.")
+        logger.info(f"ACP realizado. Número de componentes generados: {pca_model.n_components_}.")
         logger.info(f"Forma del DataFrame de componentes principales: {df_pca_components.shape}")
         
         return pca_model, df_pca_components
@@ -168,6 +608,134 @@ def realizar_pca(
         return None, None
     
 
+@profiled
+def pca_incremental_por_bloques(
+    fuente,
+    n_components: int = 3,
+    archivo_puntuaciones: Optional[str] = None
+) -> Tuple[Optional[Union[PCA, IncrementalPCA]], Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+    """
+    PCA de datos estandarizados que llegan por bloques (p. ej. los de
+    ``preprocessing_module.estandarizar_por_bloques``) sin reunirlos en memoria.
+
+    La primera pasada acumula la suma y X'X de los bloques; con hasta
+    ``_MAX_VARIABLES_GRAM`` variables la covarianza resultante se descompone con
+    ``eigh`` y el modelo es el mismo que daría ``PCA(svd_solver='covariance_eigh')``
+    sobre los datos completos. Con más variables (X'X ya no es pequeña) se ajusta un
+    ``IncrementalPCA`` con ``partial_fit`` bloque a bloque, que es una aproximación
+    y no devuelve covarianza. La segunda pasada escribe las puntuaciones de cada
+    bloque en ``archivo_puntuaciones`` (.npy), que se devuelve mapeado en memoria:
+    el pico de memoria queda acotado por el bloque más grande, no por el panel.
+
+    Args:
+        fuente: Lista, objeto reiterable o función sin argumentos que devuelve un
+            iterador nuevo de bloques (DataFrames numéricos, sin NaN, mismas columnas).
+            Se recorre dos veces, así que un generador no sirve.
+        n_components (int): Número de componentes a calcular.
+        archivo_puntuaciones (Optional[str]): Archivo .npy para las puntuaciones.
+            Si es None se guardan en memoria.
+
+    Returns:
+        Tuple: Modelo ajustado (``PCA`` o ``IncrementalPCA``), puntuaciones (índice de
+            los bloques, columnas PC1..PCk) y matriz de covarianza de las variables
+            (None con ``IncrementalPCA``); (None, None, None) si falla.
+
+    Raises:
+        ValueError: Si ``fuente`` es un iterador de una sola pasada.
+
+    Example:
+        >>> bloques = lambda: dl_prep.estandarizar_por_bloques(limpios, scaler=scaler)
+        >>> modelo, df_scores, df_cov = pca_incremental_por_bloques(bloques, 3, "cache/spill/scores.npy")
+    """
+    if not callable(fuente) and iter(fuente) is fuente:
+        raise ValueError("pca_incremental_por_bloques recorre los bloques dos veces: pasa una lista "
+                         "o una función que devuelva un iterador nuevo, no un generador.")
+
+    def _bloques():
+        for bloque in (fuente() if callable(fuente) else iter(fuente)):
+            if not bloque.empty:
+                yield bloque
+
+    try:
+        columnas, suma, gram, n_filas = None, None, None, 0
+        incremental = None
+        # El primer partial_fit necesita al menos n_components filas: se acumulan bloques hasta tenerlas
+        pendientes = []
+        for bloque in _bloques():
+            if columnas is None:
+                columnas = bloque.columns
+                if len(columnas) < n_components:
+                    logger.error(f"Se piden {n_components} componentes con solo {len(columnas)} variables.")
+                    return None, None, None
+                if len(columnas) <= _MAX_VARIABLES_GRAM:
+                    suma, gram = np.zeros(len(columnas)), np.zeros((len(columnas), len(columnas)))
+                else:
+                    incremental = IncrementalPCA(n_components=n_components)
+            elif not bloque.columns.equals(columnas):
+                logger.error("Todos los bloques deben tener las mismas columnas.")
+                return None, None, None
+            X = bloque.to_numpy(dtype=np.float64)
+            if not np.isfinite(X).all():
+                logger.error("Un bloque contiene NaN o valores infinitos. El ACP no puede continuar.")
+                return None, None, None
+            n_filas += len(X)
+            if incremental is None:
+                suma += X.sum(axis=0)
+                gram += X.T @ X
+                continue
+            pendientes.append(bloque)
+            if n_filas >= n_components:
+                incremental.partial_fit(pendientes[0] if len(pendientes) == 1 else pd.concat(pendientes))
+                pendientes = []
+        if n_filas <= n_components:
+            logger.error(f"Filas insuficientes ({n_filas}) para {n_components} componentes.")
+            return None, None, None
+
+        df_covarianza = None
+        if incremental is None:
+            media = suma / n_filas
+            covarianza = (gram - n_filas * np.outer(media, media)) / (n_filas - 1)
+            df_covarianza = pd.DataFrame(covarianza, index=columnas, columns=columnas)
+            valores, componentes = _componentes_desde_eigh(*np.linalg.eigh(covarianza))
+            completo = _modelo_desde_eigen(columnas, n_filas, media, valores, componentes, 'covariance_eigh')
+            modelo = _truncar_modelo(completo, min(n_components, completo.n_components_))
+        else:
+            modelo = incremental
+        n_components = modelo.n_components_
+
+        if archivo_puntuaciones is None:
+            puntuaciones = np.empty((n_filas, n_components))
+        else:
+            puntuaciones = np.lib.format.open_memmap(archivo_puntuaciones, mode='w+', dtype=np.float64,
+                                                     shape=(n_filas, n_components))
+        indices, inicio = [], 0
+        for bloque in _bloques():
+            if inicio + len(bloque) > n_filas:
+                break
+            puntuaciones[inicio:inicio + len(bloque)] = modelo.transform(bloque[columnas])
+            indices.append(bloque.index)
+            inicio += len(bloque)
+        if inicio != n_filas:
+            logger.error("Los bloques cambiaron entre la pasada de ajuste y la de puntuaciones.")
+            return None, None, None
+        if archivo_puntuaciones is not None:
+            puntuaciones.flush()
+            del puntuaciones
+            puntuaciones = np.load(archivo_puntuaciones, mmap_mode='r')
+
+        index = indices[0].append(indices[1:])
+        df_pca_components = pd.DataFrame(puntuaciones, index=index, copy=False,
+                                         columns=[f'PC{i+1}' for i in range(n_components)])
+        metodo = 'IncrementalPCA' if incremental is not None else 'covariance_eigh'
+        logger.info(f"ACP por bloques realizado ({metodo}): {n_filas} filas en {len(indices)} bloques, "
+                    f"{n_components} componentes.")
+        return modelo, df_pca_components, df_covarianza
+    except Exception as e:
+        logger.error(f"Error durante la ejecución del ACP por bloques: {e}")
+        logger.error(traceback.format_exc())
+        return None, None, None
+
+
 def obtener_varianza_explicada(pca_model):
     """
     Obtiene la varianza explicada individual y acumulada de un modelo PCA ajustado.
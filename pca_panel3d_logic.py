@@ -1,7 +1,14 @@
-
+import os
+import weakref
 import data_loader_module as dl
 import preprocessing_module as dl_prep
+import pca_module as pca_mod
+from config_manager import get_config
 from constants import COUNTRY_GROUPS, GROUP_COLORS
+from imputation_mask import ImputationMask
+from indicator_cube import IndicatorCube
+from performance_optimizer import bypass_preprocessing_cache
+import numpy as np
 import pandas as pd
 
 class PCAPanel3DLogic:
@@ -12,41 +19,239 @@ class PCAPanel3DLogic:
         indicators_selected,
         countries_selected,
         country_groups_map=None,
-        group_colors_map=None
+        group_colors_map=None,
+        cube=None,
+        years_selected=None,
+        session=None,
+        imputation_strategy=None,
+        imputation_params=None,
+        streaming=None
     ):
         """
         Realiza el análisis de trayectorias 3D (Panel PCA 3D) y retorna los resultados necesarios para la visualización.
         Permite pasar mapeos personalizados de grupos y colores.
+        Si se pasa ``cube`` (IndicatorCube) el panel se extrae de él y ``all_sheets_data`` puede ser None.
+        ``years_selected`` restringe el panel a esos años (por defecto todos).
+        Con ``session`` (AnalysisSession) sin ``cube`` ni ``all_sheets_data`` el cubo se
+        toma de la sesión, y una llamada idéntica devuelve el resultado guardado.
+        Con ``imputation_strategy`` los faltantes se imputan antes de descartar filas
+        incompletas; 'interpolacion', 'ffill' y 'bfill' imputan cada serie (país,
+        indicador) a lo largo de los años (ver ``preprocessing_module.imputar_panel``).
+        Con ``streaming`` el panel se procesa por bloques de unidades y las
+        puntuaciones quedan en disco (ver ``_panel3d_streaming``); por defecto se usa
+        si ``PerformanceSettings.streaming_panel_pca`` está activo o si el panel
+        excede ``PerformanceSettings.memory_limit_mb`` (con ``session`` el tamaño se
+        estima con el índice del libro, antes de cargar datos). Las estrategias de
+        imputación que usan todo el panel a la vez ('mean', 'knn', ...) siempre se
+        calculan en memoria.
+        """
+        years = [int(y) for y in years_selected] if years_selected else None
+        key = None
+        if session is not None and all_sheets_data is None:
+            key = session.result_key('panel_3d', indicators_selected, countries_selected, years,
+                                     country_groups_map, group_colors_map, imputation_strategy, imputation_params,
+                                     streaming)
+            results = session.get_result(key)
+            if results is not None:
+                return results
+        if streaming is None and cube is None and all_sheets_data is None and session is not None:
+            # Se decide con el índice del libro, antes de que la sesión lea los datos
+            metadata = None
+            if session.data_file is not None and not dl.is_columnar_file(session.data_file):
+                metadata = dl.obtener_metadatos_libro(session.data_file)
+            if metadata is not None:
+                streaming = PCAPanel3DLogic._usar_streaming(
+                    *PCAPanel3DLogic._dimensiones_panel(metadata, indicators_selected, countries_selected, years))
+        if cube is None:
+            if all_sheets_data is None and session is not None:
+                cube = session.cube(None, indicators_selected, units=countries_selected, years=years)
+                if cube is None:
+                    return {'error': 'No se pudieron cargar los datos del archivo seleccionado.'}
+            else:
+                cube = IndicatorCube.from_sheets(all_sheets_data, indicators_selected)
+        if streaming is None:
+            streaming = PCAPanel3DLogic._usar_streaming(
+                *PCAPanel3DLogic._dimensiones_panel(cube, indicators_selected, countries_selected, years))
+        if streaming and PCAPanel3DLogic._imputacion_por_bloques(imputation_strategy, imputation_params):
+            results = PCAPanel3DLogic._panel3d_streaming(cube, indicators_selected, countries_selected, years,
+                                                         imputation_strategy, imputation_params)
+        else:
+            results = PCAPanel3DLogic._panel3d_analysis(cube, indicators_selected, countries_selected, years,
+                                                        imputation_strategy, imputation_params)
+        if 'error' not in results:
+            results.update(PCAPanel3DLogic._grupos_y_colores(countries_selected, country_groups_map, group_colors_map))
+        if key is not None:
+            session.store_result(key, results)
+        return results
+
+    @staticmethod
+    def _dimensiones_panel(fuente, indicators_selected, countries_selected, years):
+        """
+        (indicadores, unidades, años) del panel pedido. ``fuente`` es el IndicatorCube
+        o el ``WorkbookMetadata`` del libro; este último permite estimar el tamaño sin leer datos.
         """
-        df_panel = dl.preparar_datos_panel_longitudinal(all_sheets_data, indicators_selected, countries_selected)
+        if isinstance(fuente, IndicatorCube):
+            indicadores, unidades, anios = fuente.indicators, fuente.units, fuente.years
+        else:
+            indicadores = [i for i in (indicators_selected or fuente.sheet_names) if i in fuente.sheets]
+            unidades = list(dict.fromkeys(u for i in indicadores for u in fuente.units(i)))
+            anios = {int(y) for i in indicadores for y in fuente.years(i)}
+        return (len(indicators_selected) if indicators_selected is not None else len(indicadores),
+                len(countries_selected) if countries_selected is not None else len(unidades),
+                len(years) if years is not None else len(anios))
+
+    @staticmethod
+    def _usar_streaming(n_indicadores, n_unidades, n_anios):
+        """True si el modo streaming está activo en la configuración o el panel no cabe en ``memory_limit_mb``."""
+        config = get_config().performance
+        if config.streaming_panel_pca:
+            return True
+        return n_indicadores * n_unidades * n_anios * 8 > config.memory_limit_mb * 1024 * 1024
+
+    @staticmethod
+    def _imputacion_por_bloques(imputation_strategy, imputation_params=None):
+        """True si la imputación del panel se hace país por país y puede aplicarse a cada bloque de unidades."""
+        if not imputation_strategy or imputation_strategy == 'ninguna':
+            return True
+        metodo = (imputation_params or {}).get('metodo_interpolacion', 'linear')
+        return (imputation_strategy in dl_prep.ESTRATEGIAS_PANEL_POR_SERIE
+                and not (imputation_strategy == 'interpolacion' and metodo != 'linear'))
+
+    @staticmethod
+    def _grupos_y_colores(countries_selected, country_groups_map=None, group_colors_map=None):
+        cg_map = country_groups_map if country_groups_map is not None else COUNTRY_GROUPS
+        gc_map = group_colors_map if group_colors_map is not None else GROUP_COLORS
+        selected_country_groups = {pais: cg_map.get(pais, 'Otros') for pais in countries_selected}
+        grupos_presentes = set(selected_country_groups.values())
+        selected_group_colors = {grupo: gc_map.get(grupo, '#888888') for grupo in grupos_presentes}
+        return {'country_groups': selected_country_groups, 'group_colors': selected_group_colors}
+
+    @staticmethod
+    def _panel3d_analysis(cube, indicators_selected, countries_selected, years,
+                          imputation_strategy=None, imputation_params=None):
+        df_panel = cube.panel(countries_selected, years=years, indicators=indicators_selected)
         if df_panel.empty:
             return {'error': 'No se pudo construir el panel de datos. Revisa la selección.'}
 
+        mascara_imputados = ImputationMask.empty(df_panel.index, df_panel.columns)
+        if imputation_strategy and imputation_strategy != 'ninguna':
+            df_panel, mascara_imputados = dl_prep.imputar_panel(
+                df_panel, estrategia=imputation_strategy, devolver_mascara=True, mascara_compacta=True,
+                **(imputation_params or {}))
+
         df_panel_no_na = df_panel.dropna(axis=0, how='any')
         if df_panel_no_na.shape[0] < 3 or df_panel_no_na.shape[1] < 3:
             return {'error': 'Datos insuficientes para el análisis 3D después de eliminar NaNs.'}
 
         df_panel_estandarizado, scaler_panel = dl_prep.estandarizar_datos(df_panel_no_na, devolver_scaler=True)
-        pca_model_panel, df_pc_scores_panel = (
-            dl_prep.pca_module.realizar_pca(df_panel_estandarizado, n_components=3)
-            if hasattr(dl_prep, 'pca_module') else (None, pd.DataFrame())
-        )
-        if pca_model_panel is None or df_pc_scores_panel.empty:
-            import pca_module as pca_mod
-            pca_model_panel, df_pc_scores_panel = pca_mod.realizar_pca(df_panel_estandarizado, n_components=3)
-
-        if pca_model_panel is None or df_pc_scores_panel.empty:
+        # Una sola covarianza (indicadores × indicadores) para exportar y para la descomposición
+        df_cov_panel = df_panel_estandarizado.cov()
+        pca_model_panel, df_pc_scores_panel = pca_mod.realizar_pca(
+            df_panel_estandarizado, n_components=3, matriz_covarianza=df_cov_panel)
+
+        if pca_model_panel is None or df_pc_scores_panel is None or df_pc_scores_panel.empty:
             return {'error': 'No se pudo realizar el PCA sobre los datos de panel.'}
 
-        cg_map = country_groups_map if country_groups_map is not None else COUNTRY_GROUPS
-        gc_map = group_colors_map if group_colors_map is not None else GROUP_COLORS
-        selected_country_groups = {pais: cg_map.get(pais, 'Otros') for pais in countries_selected}
-        grupos_presentes = set(selected_country_groups.values())
-        selected_group_colors = {grupo: gc_map.get(grupo, '#888888') for grupo in grupos_presentes}
+        return {
+            'df_pc_scores_panel': df_pc_scores_panel,
+            'pca_model_panel': pca_model_panel,
+            'df_cov_panel': df_cov_panel,
+            'mascara_imputados': mascara_imputados
+        }
+
+    @staticmethod
+    def _panel3d_streaming(cube, indicators_selected, countries_selected, years,
+                           imputation_strategy=None, imputation_params=None, units_per_chunk=None):
+        """
+        PCA 3D del panel por bloques de unidades, sin construir en memoria el panel
+        largo, sus copias imputadas y estandarizadas ni las puntuaciones.
+
+        El cubo de entrada sí debe existir: un cubo .npz está mapeado en memoria y
+        solo se leen los bloques, pero el de un libro Excel u otro formato
+        (``IndicatorCube.from_sheets``) es un arreglo denso indicadores × unidades ×
+        años en RAM. Lo que se acota al tamaño de bloque es todo lo que el análisis
+        en memoria construye además del cubo.
+
+        Cada bloque de ``IndicatorCube.iter_panel`` se imputa (la imputación por serie
+        solo mira las filas de cada país, así que equivale a imputar el panel
+        completo), pierde sus filas incompletas y se vuelca a un .npy en un
+        directorio de spill. Sobre esos bloques mapeados en memoria se ajusta el
+        scaler con ``partial_fit`` y después el PCA con
+        ``pca_module.pca_incremental_por_bloques``: hasta 2000 indicadores es un
+        ``PCA`` de sklearn armado con ``eigh`` de X'X acumulada (el mismo modelo que
+        el ajuste en memoria); con más, un ``IncrementalPCA``. Las puntuaciones se
+        escriben en disco. Devuelve las mismas claves que ``_panel3d_analysis``, con
+        ``df_pc_scores_panel`` mapeado en memoria.
+
+        Los bloques se borran al terminar el ajuste; el directorio, con el .npy de
+        las puntuaciones, se elimina cuando se descarta ``df_pc_scores_panel`` (p. ej.
+        al invalidar la sesión o al desalojarse el resultado), o de inmediato si el
+        análisis falla.
+        """
+        directorio = dl.crear_directorio_spill()
+        try:
+            results = PCAPanel3DLogic._panel3d_por_bloques(
+                directorio, cube, indicators_selected, countries_selected, years,
+                imputation_strategy, imputation_params, units_per_chunk)
+        except BaseException:
+            dl.liberar_directorio_spill(directorio)
+            raise
+        if 'error' in results:
+            dl.liberar_directorio_spill(directorio)
+        else:
+            weakref.finalize(results['df_pc_scores_panel'], dl.liberar_directorio_spill, directorio)
+        return results
+
+    @staticmethod
+    def _panel3d_por_bloques(directorio, cube, indicators_selected, countries_selected, years,
+                             imputation_strategy, imputation_params, units_per_chunk):
+        units_per_chunk = units_per_chunk or get_config().performance.panel_units_per_chunk
+        imputar = bool(imputation_strategy) and imputation_strategy != 'ninguna'
+        limpios, mascaras, archivos = [], [], []
+        for i, bloque in enumerate(cube.iter_panel(countries_selected, years, indicators_selected,
+                                                   units_per_chunk=units_per_chunk)):
+            if imputar:
+                # Cada bloque se imputa una sola vez: guardarlo en el cache solo ocuparía memoria
+                with bypass_preprocessing_cache():
+                    bloque, mascara = dl_prep.imputar_panel(
+                        bloque, estrategia=imputation_strategy, devolver_mascara=True, mascara_compacta=True,
+                        **(imputation_params or {}))
+            else:
+                mascara = ImputationMask.empty(bloque.index, bloque.columns)
+            mascaras.append(mascara)
+            bloque = bloque.dropna(axis=0, how='any')
+            if bloque.empty:
+                continue
+            archivo = os.path.join(directorio, f"panel_{i:05d}.npy")
+            np.save(archivo, bloque.to_numpy(dtype=np.float64))
+            archivos.append(archivo)
+            limpios.append(pd.DataFrame(np.load(archivo, mmap_mode='r'), index=bloque.index,
+                                        columns=bloque.columns, copy=False))
+        if not mascaras:
+            return {'error': 'No se pudo construir el panel de datos. Revisa la selección.'}
+
+        if sum(len(b) for b in limpios) < 3 or mascaras[0].shape[1] < 3:
+            return {'error': 'Datos insuficientes para el análisis 3D después de eliminar NaNs.'}
+
+        scaler_panel, _ = dl_prep.ajustar_escalador_por_bloques(limpios)
+        pca_model_panel, df_pc_scores_panel, df_cov_panel = pca_mod.pca_incremental_por_bloques(
+            lambda: dl_prep.estandarizar_por_bloques(limpios, scaler=scaler_panel), n_components=3,
+            archivo_puntuaciones=os.path.join(directorio, "pc_scores_panel.npy"))
+        del limpios
+        for archivo in archivos:
+            try:
+                os.remove(archivo)
+            except OSError:
+                pass  # En Windows puede seguir mapeado; se borra junto con el directorio
+        if pca_model_panel is None or df_pc_scores_panel is None or df_pc_scores_panel.empty:
+            return {'error': 'No se pudo realizar el PCA sobre los datos de panel.'}
 
+        mascara_imputados = ImputationMask(
+            np.concatenate([m.bits for m in mascaras]),
+            mascaras[0].index.append([m.index for m in mascaras[1:]]), mascaras[0].columns)
         return {
             'df_pc_scores_panel': df_pc_scores_panel,
             'pca_model_panel': pca_model_panel,
-            'country_groups': selected_country_groups,
-            'group_colors': selected_group_colors
+            'df_cov_panel': df_cov_panel,
+            'mascara_imputados': mascara_imputados
         }
@@ -7,15 +7,22 @@ y optimizaciones específicas para análisis de datos.
 """
 
 import time
+import copy
 import functools
 import gc
+import inspect
 import psutil
 import threading
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
-from typing import Any, Callable, Dict, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple, Union
 from pathlib import Path
 import pickle
 import hashlib
+import json
+import os
+import shutil
+from collections import OrderedDict
+from contextlib import contextmanager
 import numpy as np
 import pandas as pd
 from dataclasses import dataclass
@@ -78,6 +85,30 @@ class MemoryMonitor:
             gc.collect()
 
 
+def data_fingerprint(obj: Union[pd.DataFrame, pd.Series, np.ndarray]) -> str:
+    """
+    Hash del contenido completo de un DataFrame, Series o array: todos los
+    valores, las etiquetas del índice y de las columnas, y los tipos.
+    """
+    hasher = hashlib.sha1()
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        hasher.update(f"{type(obj).__name__}{obj.shape}{list(obj.index.names)}".encode())
+        if isinstance(obj, pd.DataFrame):
+            hasher.update(repr(list(obj.columns)).encode())
+            hasher.update(repr([str(t) for t in obj.dtypes]).encode())
+        else:
+            hasher.update(f"{obj.name!r}{obj.dtype}".encode())
+        hasher.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    else:
+        arr = np.asarray(obj)
+        hasher.update(f"ndarray{arr.shape}{arr.dtype}".encode())
+        if arr.dtype == object:
+            hasher.update(pd.util.hash_array(arr.ravel()).tobytes())
+        else:
+            hasher.update(np.ascontiguousarray(arr).tobytes())
+    return hasher.hexdigest()
+
+
 class LRUCache:
     """Cache LRU (Least Recently Used) personalizado para DataFrames."""
     
@@ -94,18 +125,14 @@ class LRUCache:
         # Manejar DataFrames y arrays de numpy
         processed_args = []
         for arg in args:
-            if isinstance(arg, pd.DataFrame):
-                # Hash basado en shape, columns y algunos valores
-                shape_str = str(arg.shape)
-                cols_str = str(list(arg.columns))
-                sample_str = str(arg.head(3).values.tobytes() if not arg.empty else "empty")
-                processed_args.append(f"df_{shape_str}_{cols_str}_{sample_str}")
-            elif isinstance(arg, np.ndarray):
-                processed_args.append(f"array_{arg.shape}_{str(arg.flat[:5])}")
+            if isinstance(arg, (pd.DataFrame, pd.Series, np.ndarray)):
+                # Hash del contenido completo (no solo de las primeras filas)
+                processed_args.append(f"data_{data_fingerprint(arg)}")
             else:
                 processed_args.append(str(arg))
         
-        processed_kwargs = {k: str(v) for k, v in sorted(kwargs.items())}
+        processed_kwargs = {k: f"data_{data_fingerprint(v)}" if isinstance(v, (pd.DataFrame, pd.Series, np.ndarray))
+                            else str(v) for k, v in sorted(kwargs.items())}
         cache_key = f"{processed_args}_{processed_kwargs}"
         return hashlib.md5(cache_key.encode()).hexdigest()
     
@@ -165,6 +192,390 @@ class LRUCache:
             }
 
 
+class WorkbookDiskCache:
+    """
+    Cache en disco de hojas de Excel ya parseadas.
+
+    Cada libro se guarda en un directorio propio cuyo nombre combina la ruta,
+    el tamaño, la fecha de modificación, un hash del contenido del archivo y el
+    engine de lectura (``engine``; None = el de pandas), de modo que cualquier
+    cambio en el libro o en el lector invalida sus entradas. Cada hoja se
+    guarda como un pickle independiente y un ``manifest.json`` registra los
+    nombres de las hojas y el archivo que corresponde a cada una.
+    """
+
+    MANIFEST_NAME = "manifest.json"
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None,
+                 max_size_mb: Optional[float] = None):
+        config = get_config().performance
+        default_dir = Path(__file__).parent / "cache" / "workbooks"
+        self.cache_dir = Path(cache_dir or config.excel_cache_dir or default_dir)
+        self.max_size_mb = max_size_mb if max_size_mb is not None else config.excel_cache_max_mb
+        self._hash_memo = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, file_path: Union[str, Path], engine: Optional[str] = None) -> str:
+        """Retorna la clave del libro: ruta + tamaño + mtime + hash del contenido + engine."""
+        path = Path(file_path).resolve()
+        stat = path.stat()
+        memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+        content_hash = self._hash_memo.get(memo_key)
+        if content_hash is None:
+            hasher = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    hasher.update(block)
+            content_hash = hasher.hexdigest()
+            self._hash_memo[memo_key] = content_hash
+        return f"{self._path_prefix(path)}_{stat.st_size}_{stat.st_mtime_ns}_{content_hash[:16]}_{engine or 'pandas'}"
+
+    @staticmethod
+    def _path_prefix(path: Path) -> str:
+        return hashlib.md5(str(path).encode('utf-8')).hexdigest()[:12]
+
+    def _entry_dir(self, file_path: Union[str, Path], engine: Optional[str] = None) -> Path:
+        return self.cache_dir / self.fingerprint(file_path, engine)
+
+    def _read_manifest(self, entry_dir: Path) -> Optional[Dict[str, Any]]:
+        manifest_path = entry_dir / self.MANIFEST_NAME
+        if not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Manifest de cache ilegible en {entry_dir}: {e}")
+            return None
+
+    def _write_manifest(self, entry_dir: Path, manifest: Dict[str, Any]):
+        tmp_path = entry_dir / f"{self.MANIFEST_NAME}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_dir / self.MANIFEST_NAME)
+
+    def _open_entry(self, file_path: Union[str, Path], engine: Optional[str] = None) -> Tuple[Path, Dict[str, Any]]:
+        """Crea (o reutiliza) la entrada del libro y elimina versiones obsoletas (u otro engine)."""
+        path = Path(file_path).resolve()
+        entry_dir = self._entry_dir(path, engine)
+        prefix = self._path_prefix(path)
+        if self.cache_dir.exists():
+            for stale in self.cache_dir.glob(f"{prefix}_*"):
+                if stale != entry_dir:
+                    shutil.rmtree(stale, ignore_errors=True)
+                    logger.debug(f"Invalidated stale workbook cache: {stale.name}")
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self._read_manifest(entry_dir) or {
+            'source': str(path), 'sheet_names': None, 'sheets': {}, 'failed': []
+        }
+        return entry_dir, manifest
+
+    def get_sheet_names(self, file_path: Union[str, Path], engine: Optional[str] = None) -> Optional[list]:
+        """Retorna los nombres de hojas guardados para el libro, o None."""
+        try:
+            manifest = self._read_manifest(self._entry_dir(file_path, engine))
+        except OSError:
+            return None
+        return manifest.get('sheet_names') if manifest else None
+
+    def put_sheet_names(self, file_path: Union[str, Path], sheet_names: list, engine: Optional[str] = None):
+        """Registra la lista de hojas del libro."""
+        with self._lock:
+            entry_dir, manifest = self._open_entry(file_path, engine)
+            manifest['sheet_names'] = list(sheet_names)
+            self._write_manifest(entry_dir, manifest)
+
+    def get_sheet(self, file_path: Union[str, Path], sheet_name: str,
+                  engine: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """Retorna una hoja guardada, o None si no está en cache."""
+        try:
+            entry_dir = self._entry_dir(file_path, engine)
+        except OSError:
+            return None
+        manifest = self._read_manifest(entry_dir)
+        if not manifest or sheet_name not in manifest['sheets']:
+            return None
+        try:
+            df = pd.read_pickle(entry_dir / manifest['sheets'][sheet_name])
+        except Exception as e:
+            logger.warning(f"Entrada de cache corrupta para la hoja '{sheet_name}': {e}")
+            return None
+        os.utime(entry_dir / self.MANIFEST_NAME)
+        return df
+
+    def put_sheet(self, file_path: Union[str, Path], sheet_name: str, df: pd.DataFrame,
+                  engine: Optional[str] = None):
+        """Guarda una hoja parseada."""
+        self.put_sheets(file_path, {sheet_name: df}, engine=engine)
+
+    def put_sheets(self, file_path: Union[str, Path], dataframes: Dict[str, pd.DataFrame],
+                   sheet_names: Optional[list] = None, failed: Optional[list] = None,
+                   engine: Optional[str] = None):
+        """Guarda varias hojas de una vez (una sola escritura del manifest)."""
+        with self._lock:
+            entry_dir, manifest = self._open_entry(file_path, engine)
+            if sheet_names is not None:
+                manifest['sheet_names'] = list(sheet_names)
+            for sheet_name, df in dataframes.items():
+                file_name = manifest['sheets'].get(sheet_name) or f"sheet_{len(manifest['sheets']):04d}.pkl"
+                tmp_path = entry_dir / f"{file_name}.tmp"
+                df.to_pickle(tmp_path)
+                os.replace(tmp_path, entry_dir / file_name)
+                manifest['sheets'][sheet_name] = file_name
+            if failed:
+                manifest['failed'] = sorted(set(manifest['failed']) | set(failed))
+            self._write_manifest(entry_dir, manifest)
+            self._enforce_size_limit(keep=entry_dir)
+
+    def get_workbook(self, file_path: Union[str, Path],
+                     engine: Optional[str] = None) -> Optional[Dict[str, pd.DataFrame]]:
+        """Retorna todas las hojas del libro si la entrada está completa, o None."""
+        try:
+            entry_dir = self._entry_dir(file_path, engine)
+        except OSError:
+            return None
+        manifest = self._read_manifest(entry_dir)
+        if not manifest or manifest.get('sheet_names') is None:
+            return None
+        pending = [name for name in manifest['sheet_names']
+                   if name not in manifest['sheets'] and name not in manifest['failed']]
+        if pending:
+            return None
+        dataframes = {}
+        try:
+            for sheet_name in manifest['sheet_names']:
+                if sheet_name not in manifest['failed']:
+                    dataframes[sheet_name] = pd.read_pickle(entry_dir / manifest['sheets'][sheet_name])
+        except Exception as e:
+            logger.warning(f"Entrada de cache incompleta para {file_path}: {e}")
+            return None
+        os.utime(entry_dir / self.MANIFEST_NAME)
+        return dataframes
+
+    def _enforce_size_limit(self, keep: Optional[Path] = None):
+        """Elimina las entradas usadas hace más tiempo hasta respetar ``max_size_mb``."""
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            if not entry_dir.is_dir():
+                continue
+            size = sum(f.stat().st_size for f in entry_dir.iterdir() if f.is_file())
+            manifest_path = entry_dir / self.MANIFEST_NAME
+            last_used = manifest_path.stat().st_mtime if manifest_path.exists() else 0
+            entries.append((entry_dir != keep, last_used, entry_dir, size))
+
+        limit_bytes = self.max_size_mb * 1024 * 1024
+        total = sum(entry[3] for entry in entries)
+        # Primero las entradas ajenas, de la menos a la más reciente; la actual al final
+        for _, _, entry_dir, size in sorted(entries, key=lambda e: (not e[0], e[1])):
+            if total <= limit_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            logger.info(f"Evicted workbook cache entry {entry_dir.name} ({size / 1024 / 1024:.1f}MB)")
+
+    def clear(self):
+        """Elimina todo el cache en disco."""
+        with self._lock:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            self._hash_memo.clear()
+            logger.info("Workbook disk cache cleared")
+
+
+def _copiar_resultado(valor: Any) -> Any:
+    """Copia de un resultado cacheado para que quien lo recibe no modifique la entrada."""
+    if isinstance(valor, (pd.DataFrame, pd.Series, np.ndarray)):
+        return valor.copy()
+    if isinstance(valor, tuple):
+        return tuple(_copiar_resultado(v) for v in valor)
+    if isinstance(valor, list):
+        return [_copiar_resultado(v) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _copiar_resultado(v) for k, v in valor.items()}
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return valor
+    return copy.deepcopy(valor)
+
+
+def _tamano_resultado(valor: Any) -> int:
+    """Bytes aproximados de un resultado (DataFrames, arrays, máscaras y contenedores)."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum() if isinstance(valor, pd.DataFrame) else uso)
+    if isinstance(valor, (tuple, list)):
+        return sum(_tamano_resultado(v) for v in valor)
+    if isinstance(valor, dict):
+        return sum(_tamano_resultado(v) for v in valor.values())
+    if hasattr(valor, 'nbytes'):
+        return int(valor.nbytes)
+    try:
+        return len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class _NoCacheable(Exception):
+    """Argumento sin representación estable para la clave (p. ej. un estimador)."""
+
+
+def _parte_clave(valor: Any) -> str:
+    if isinstance(valor, (pd.DataFrame, pd.Series, np.ndarray)):
+        return f"data_{data_fingerprint(valor)}"
+    if valor is None or isinstance(valor, (str, int, float, bool, np.generic)):
+        return repr(valor)
+    if isinstance(valor, (tuple, list)):
+        return f"{type(valor).__name__}[{','.join(_parte_clave(v) for v in valor)}]"
+    if isinstance(valor, dict):
+        return "{" + ",".join(f"{k!r}:{_parte_clave(v)}" for k, v in sorted(valor.items(), key=lambda kv: repr(kv[0]))) + "}"
+    raise _NoCacheable(type(valor).__name__)
+
+
+class PreprocessingCache:
+    """
+    Cache de resultados de etapas de preprocesamiento (imputación, estandarización).
+
+    La clave combina la etapa, el hash del contenido completo de los datos de
+    entrada (``data_fingerprint``) y todos los parámetros de la llamada, así que
+    repetir un análisis con la misma selección y estrategia (p. ej. al cambiar
+    solo el estilo de los gráficos) no vuelve a imputar ni a estandarizar.
+
+    Las entradas en memoria se desalojan por tamaño: se descartan las usadas
+    hace más tiempo hasta respetar ``max_size_mb``. Opcionalmente cada entrada se
+    guarda también en disco como un pickle (``<clave>.pkl``), con su propio
+    límite de tamaño, y se recupera de ahí cuando ya no está en memoria.
+    """
+
+    def __init__(self, max_size_mb: Optional[float] = None, use_disk: Optional[bool] = None,
+                 cache_dir: Optional[Union[str, Path]] = None, disk_max_mb: Optional[float] = None):
+        config = get_config().performance
+        self.max_size_mb = max_size_mb if max_size_mb is not None else config.preprocessing_cache_max_mb
+        self.use_disk = config.preprocessing_cache_disk if use_disk is None else use_disk
+        default_dir = Path(__file__).parent / "cache" / "preprocessing"
+        self.cache_dir = Path(cache_dir or config.preprocessing_cache_dir or default_dir)
+        self.disk_max_mb = disk_max_mb if disk_max_mb is not None else config.preprocessing_cache_disk_max_mb
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, stage: str, arguments: Dict[str, Any]) -> Optional[str]:
+        """Clave de una llamada, o None si algún argumento no se puede representar."""
+        try:
+            partes = [f"{nombre}={_parte_clave(valor)}" for nombre, valor in arguments.items()]
+        except _NoCacheable as e:
+            logger.debug(f"Stage {stage} not cached: argument of type {e} has no stable key")
+            return None
+        return hashlib.sha1(f"{stage}|{'|'.join(partes)}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Copia del resultado guardado (memoria o disco), o None."""
+        with self._lock:
+            entrada = self._entries.get(key)
+            if entrada is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copiar_resultado(entrada[0])
+        valor = self._read_disk(key) if self.use_disk else None
+        with self._lock:
+            if valor is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store_memory(key, valor)
+        return _copiar_resultado(valor)
+
+    def put(self, key: str, value: Any) -> Any:
+        """Guarda ``value`` y retorna una copia para el llamador."""
+        with self._lock:
+            self._store_memory(key, value)
+        if self.use_disk:
+            self._write_disk(key, value)
+        return _copiar_resultado(value)
+
+    def _store_memory(self, key: str, value: Any):
+        tamano = _tamano_resultado(value)
+        limite = self.max_size_mb * 1024 * 1024
+        anterior = self._entries.pop(key, None)
+        if anterior is not None:
+            self._bytes -= anterior[1]
+        if tamano > limite:
+            logger.debug(f"Preprocessing result {key[:8]}... ({tamano / 1024 / 1024:.1f}MB) exceeds memory budget")
+            return
+        self._entries[key] = (value, tamano)
+        self._bytes += tamano
+        while self._bytes > limite:
+            viejo, (_, tamano_viejo) = self._entries.popitem(last=False)
+            self._bytes -= tamano_viejo
+            logger.debug(f"Evicted preprocessing cache entry: {viejo[:8]}...")
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        path = self.cache_dir / f"{key}.pkl"
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as f:
+                valor = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Entrada de cache de preprocesamiento corrupta {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        os.utime(path)
+        return valor
+
+    def _write_disk(self, key: str, value: Any):
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_dir / f"{key}.pkl.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_dir / f"{key}.pkl")
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en disco el resultado de preprocesamiento: {e}")
+            return
+        self._enforce_disk_limit()
+
+    def _enforce_disk_limit(self):
+        """Elimina los pickles usados hace más tiempo hasta respetar ``disk_max_mb``."""
+        entradas = []
+        for path in self.cache_dir.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entradas.append((stat.st_mtime, stat.st_size, path))
+        total = sum(e[1] for e in entradas)
+        limite = self.disk_max_mb * 1024 * 1024
+        for _, tamano, path in sorted(entradas):
+            if total <= limite:
+                break
+            path.unlink(missing_ok=True)
+            total -= tamano
+            logger.info(f"Evicted preprocessing disk cache entry {path.name} ({tamano / 1024 / 1024:.1f}MB)")
+
+    def clear(self, disk: bool = True):
+        """Vacía la memoria y, si ``disk``, el directorio en disco."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if disk:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+        logger.info("Preprocessing cache cleared")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna estadísticas del cache."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_mb': self._bytes / 1024 / 1024,
+                'max_size_mb': self.max_size_mb,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'use_disk': self.use_disk,
+            }
+
+
 class PerformanceOptimizer:
     """Optimizador principal de rendimiento."""
     
@@ -236,14 +647,16 @@ class PerformanceOptimizer:
     def chunk_dataframe(self, df: pd.DataFrame, chunk_size: Optional[int] = None) -> list:
         """Divide un DataFrame en chunks para procesamiento paralelo."""
         chunk_size = chunk_size or self.config.chunk_size
-        chunks = []
-        
-        for i in range(0, len(df), chunk_size):
-            chunk = df.iloc[i:i + chunk_size].copy()
-            chunks.append(chunk)
+        chunks = [chunk.copy() for chunk in self.iter_chunks(df, chunk_size)]
         
         logger.debug(f"DataFrame chunked into {len(chunks)} pieces of ~{chunk_size} rows")
         return chunks
+
+    def iter_chunks(self, df: pd.DataFrame, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Recorre un DataFrame por bloques de filas sin copiarlos (vistas de ``iloc``)."""
+        chunk_size = chunk_size or self.config.chunk_size
+        for i in range(0, len(df), chunk_size):
+            yield df.iloc[i:i + chunk_size]
     
     def optimize_dataframe_memory(self, df: pd.DataFrame) -> pd.DataFrame:
         """Optimiza el uso de memoria de un DataFrame."""
@@ -399,10 +812,83 @@ def parallel_process(func: Callable, data: list, **kwargs) -> list:
     """Función de conveniencia para procesamiento paralelo."""
     return _optimizer.parallel_apply(func, data, **kwargs)
 
+def iter_chunks(df: pd.DataFrame, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Función de conveniencia para recorrer un DataFrame por bloques de filas."""
+    return _optimizer.iter_chunks(df, chunk_size)
+
 def get_performance_report() -> Dict[str, Any]:
     """Función de conveniencia para obtener reporte de rendimiento."""
     return _optimizer.get_performance_report()
 
+_workbook_cache: Optional[WorkbookDiskCache] = None
+
+def get_workbook_cache() -> Optional[WorkbookDiskCache]:
+    """Retorna el cache en disco de libros Excel, o None si está deshabilitado."""
+    global _workbook_cache
+    if not get_config().performance.enable_excel_cache:
+        return None
+    if _workbook_cache is None:
+        _workbook_cache = WorkbookDiskCache()
+    return _workbook_cache
+
+_preprocessing_cache: Optional[PreprocessingCache] = None
+
+# Profundidad de etapas en curso en el hilo: las etapas anidadas (p. ej.
+# ``imputar_panel`` llamando a ``manejar_datos_faltantes``) no se cachean aparte
+_stage_state = threading.local()
+
+def get_preprocessing_cache() -> Optional[PreprocessingCache]:
+    """Retorna el cache de etapas de preprocesamiento, o None si está deshabilitado."""
+    global _preprocessing_cache
+    if not get_config().performance.enable_preprocessing_cache:
+        return None
+    if _preprocessing_cache is None:
+        _preprocessing_cache = PreprocessingCache()
+    return _preprocessing_cache
+
+@contextmanager
+def bypass_preprocessing_cache():
+    """Ejecuta las etapas cacheadas del bloque sin leer ni guardar en el cache."""
+    _stage_state.depth = getattr(_stage_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _stage_state.depth -= 1
+
+def cached_stage(stage: Optional[str] = None) -> Callable:
+    """
+    Decorador de etapas de preprocesamiento cacheadas en ``PreprocessingCache``.
+
+    La clave incluye todos los argumentos ya enlazados a la firma (posicionales,
+    por nombre y valores por defecto); los DataFrames y arrays entran por el hash
+    de su contenido. Si algún argumento no tiene representación estable (p. ej.
+    un estimador) la llamada se ejecuta sin cache. El llamador siempre recibe
+    una copia del resultado.
+    """
+    def decorator(func: Callable) -> Callable:
+        firma = inspect.signature(func)
+        nombre = stage or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_preprocessing_cache()
+            if cache is None or getattr(_stage_state, 'depth', 0):
+                return func(*args, **kwargs)
+            enlazados = firma.bind(*args, **kwargs)
+            enlazados.apply_defaults()
+            key = cache.make_key(nombre, enlazados.arguments)
+            if key is None:
+                return func(*args, **kwargs)
+            result = cache.get(key)
+            if result is not None:
+                return result
+            with bypass_preprocessing_cache():
+                result = func(*args, **kwargs)
+            return cache.put(key, result)
+
+        return wrapper
+    return decorator
+
 
 if __name__ == "__main__":
     # Test del sistema de optimización
@@ -18,9 +18,16 @@ Estrategias de imputación disponibles:
     - Propagación (forward/backward fill)
     - Valores constantes personalizados
 
+La imputación y la estandarización se memorizan con
+``performance_optimizer.cached_stage``: repetir una llamada con los mismos datos
+(hash del contenido completo) y los mismos parámetros devuelve una copia del
+resultado guardado sin recalcularlo.
+
 Autor: David Armando Abreu Rosique
 Fecha: 2025
 """
+import time
+
 import pandas as pd
 import numpy as np
 from sklearn.experimental import enable_iterative_imputer
@@ -28,7 +35,13 @@ from sklearn.impute import IterativeImputer, SimpleImputer, KNNImputer
 from sklearn.preprocessing import StandardScaler
 from typing import Tuple, Optional, Dict, Any, Union
 
+from config_manager import get_config
+from imputation_mask import ImputationMask
+from knn_imputation import imputar_knn_por_patrones
+from performance_optimizer import bypass_preprocessing_cache, cached_stage
 
+
+@cached_stage()
 def manejar_datos_faltantes(
     df: pd.DataFrame, 
     estrategia: str = 'interpolacion', 
@@ -39,8 +52,10 @@ def manejar_datos_faltantes(
     metodo_interpolacion: str = 'linear',
     orden_interpolacion: int = 3, 
     knn_vecinos: int = 5, 
+    knn_backend: Optional[str] = None,
+    mascara_compacta: bool = False,
     **kwargs
-) -> Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
+) -> Union[pd.DataFrame, Tuple[pd.DataFrame, Union[pd.DataFrame, ImputationMask]]]:
     """
     Maneja valores faltantes en un DataFrame usando múltiples estrategias de imputación.
     
@@ -73,12 +88,19 @@ def manejar_datos_faltantes(
             'spline', etc.).
         orden_interpolacion (int): Orden para interpolación polinomial/spline.
         knn_vecinos (int): Número de vecinos para imputación KNN.
+        knn_backend (Optional[str]): Implementación de 'knn': 'sklearn' (``KNNImputer``),
+            'patrones' (``knn_imputation.imputar_knn_por_patrones``, mismos vecinos
+            agrupando filas por patrón de faltantes) o 'auto' ('patrones' desde
+            ``data_processing.knn_patterns_min_rows`` filas). Por defecto
+            ``data_processing.knn_backend``.
+        mascara_compacta (bool): Si True, la máscara se devuelve como
+            ``ImputationMask`` (un bit por celda) en lugar de un DataFrame booleano.
         **kwargs: Parámetros adicionales específicos por estrategia.
         
     Returns:
-        Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]:
+        Union[pd.DataFrame, Tuple[pd.DataFrame, Union[pd.DataFrame, ImputationMask]]]:
             - Si devolver_mascara=False: DataFrame con valores imputados
-            - Si devolver_mascara=True: Tupla (DataFrame imputado, DataFrame máscara)
+            - Si devolver_mascara=True: Tupla (DataFrame imputado, máscara)
             
     Raises:
         ValueError: Si la estrategia no es reconocida
@@ -106,8 +128,7 @@ def manejar_datos_faltantes(
     """
     if df.empty:
         if devolver_mascara:
-            mascara_vacia = pd.DataFrame(False, index=df.index, columns=df.columns)
-            return df.copy(), mascara_vacia
+            return df.copy(), _mascara_vacia(df, mascara_compacta)
         return df.copy()
 
     df_copia = df.copy()
@@ -116,7 +137,7 @@ def manejar_datos_faltantes(
 
     if faltantes_antes == 0:
         if devolver_mascara:
-            return df_copia, pd.DataFrame(False, index=df.index, columns=df.columns)
+            return df_copia, _mascara_vacia(df, mascara_compacta)
         return df_copia
     
     # print(f"  Datos faltantes ANTES (por columna):\n{df_copia.isnull().sum()[df_copia.isnull().sum() > 0]}")
@@ -226,7 +247,11 @@ def manejar_datos_faltantes(
                 pass
                 imputer_adv = KNNImputer(n_neighbors=knn_vecinos)
             
-            df_imputado_np_adv = imputer_adv.fit_transform(df_parte_num_imputable_adv)
+            if estrategia == 'knn' and _usar_knn_por_patrones(knn_backend, len(df_parte_num_imputable_adv)):
+                df_imputado_np_adv = imputar_knn_por_patrones(df_parte_num_imputable_adv.to_numpy(dtype=np.float64),
+                                                              n_vecinos=knn_vecinos)
+            else:
+                df_imputado_np_adv = imputer_adv.fit_transform(df_parte_num_imputable_adv)
             df_imputado_parcial_adv = pd.DataFrame(df_imputado_np_adv, columns=cols_num_imputables_adv, index=indice_original)
             
             # Actualizar df_copia solo con las columnas numéricas imputadas
@@ -241,12 +266,417 @@ def manejar_datos_faltantes(
     # Mensajes de advertencia eliminados para limpieza
         
     if devolver_mascara:
+        if mascara_compacta:
+            if estrategia == 'eliminar_filas':
+                # Las filas que quedan no tenían NaN: no hay celdas imputadas
+                return df_copia, ImputationMask.empty(indice_original, columnas_originales)
+            return df_copia, ImputationMask.from_missing(mascara_imputados_original.to_numpy(), df_copia.isnull().to_numpy(),
+                                                         indice_original, columnas_originales)
         mascara_final_imputados = mascara_imputados_original & (~df_copia.isnull())
         return df_copia, mascara_final_imputados
     else:
         return df_copia
 
 
+def _usar_knn_por_patrones(knn_backend: Optional[str], n_filas: int) -> bool:
+    """Decide la implementación de 'knn' según ``knn_backend`` o la configuración."""
+    config = get_config().data_processing
+    knn_backend = knn_backend or config.knn_backend
+    if knn_backend == 'auto':
+        return n_filas >= config.knn_patterns_min_rows
+    return knn_backend == 'patrones'
+
+
+def _mascara_vacia(df: pd.DataFrame, compacta: bool = False) -> Union[pd.DataFrame, ImputationMask]:
+    """Máscara sin celdas imputadas con la forma de ``df``."""
+    if compacta:
+        return ImputationMask.empty(df.index, df.columns)
+    return pd.DataFrame(False, index=df.index, columns=df.columns)
+
+
+# --- Imputación de paneles (País, Año) a lo largo de los años -----------------------
+
+ESTRATEGIAS_PANEL_POR_SERIE = ('interpolacion', 'ffill', 'bfill')
+
+
+def _rellenar_hacia_adelante(valores: np.ndarray, limite: Optional[int] = None) -> np.ndarray:
+    """``ffill(limit=limite)`` a lo largo del eje 1 de un array (series, posiciones, indicadores)."""
+    posiciones = np.arange(valores.shape[1]).reshape(1, -1, 1)
+    ultimo = np.maximum.accumulate(np.where(np.isnan(valores), -1, posiciones), axis=1)
+    rellenable = ultimo >= 0
+    if limite is not None:
+        rellenable &= (posiciones - ultimo) <= limite
+    propagado = np.take_along_axis(valores, np.maximum(ultimo, 0), axis=1)
+    return np.where(rellenable, propagado, np.nan)
+
+
+def _rellenar_hacia_atras(valores: np.ndarray, limite: Optional[int] = None) -> np.ndarray:
+    """``bfill(limit=limite)`` a lo largo del eje 1."""
+    return _rellenar_hacia_adelante(valores[:, ::-1], limite)[:, ::-1]
+
+
+def _interpolar_lineal(valores: np.ndarray) -> np.ndarray:
+    """
+    ``interpolate(method='linear', limit_direction='both')`` a lo largo del eje 1:
+    interpolación por posición entre observaciones y extremos constantes
+    (misma fórmula que ``np.interp``).
+    """
+    n = valores.shape[1]
+    posiciones = np.arange(n).reshape(1, -1, 1)
+    validos = ~np.isnan(valores)
+    anterior = np.maximum.accumulate(np.where(validos, posiciones, -1), axis=1)
+    siguiente = np.minimum.accumulate(np.where(validos, posiciones, n)[:, ::-1], axis=1)[:, ::-1]
+    hay_anterior, hay_siguiente = anterior >= 0, siguiente < n
+    v_anterior = np.take_along_axis(valores, np.maximum(anterior, 0), axis=1)
+    v_siguiente = np.take_along_axis(valores, np.minimum(siguiente, n - 1), axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pendiente = (v_siguiente - v_anterior) / (siguiente - anterior)
+        interior = pendiente * (posiciones - anterior) + v_anterior
+    resultado = np.where(hay_anterior & hay_siguiente, interior, np.nan)
+    resultado = np.where(hay_anterior & ~hay_siguiente, v_anterior, resultado)
+    resultado = np.where(~hay_anterior & hay_siguiente, v_siguiente, resultado)
+    return np.where(validos, valores, resultado)
+
+
+def _imputar_series_bloque(bloque: np.ndarray, estrategia: str, kwargs: Dict[str, Any]) -> np.ndarray:
+    """Aplica una estrategia de ``ESTRATEGIAS_PANEL_POR_SERIE`` a lo largo del eje 1."""
+    if estrategia == 'interpolacion':
+        return _interpolar_lineal(bloque)
+    if estrategia == 'ffill':
+        bloque = _rellenar_hacia_adelante(bloque, kwargs.get('ffill_limit'))
+        return _rellenar_hacia_atras(bloque, kwargs.get('bfill_limit_after_ffill'))
+    bloque = _rellenar_hacia_atras(bloque, kwargs.get('bfill_limit'))
+    return _rellenar_hacia_adelante(bloque, kwargs.get('ffill_limit_after_bfill'))
+
+
+@cached_stage()
+def imputar_panel(
+    df_panel: pd.DataFrame,
+    estrategia: str = 'interpolacion',
+    devolver_mascara: bool = False,
+    nivel_unidad: Union[int, str] = 0,
+    mascara_compacta: bool = False,
+    **kwargs
+) -> Union[pd.DataFrame, Tuple[pd.DataFrame, Union[pd.DataFrame, ImputationMask]]]:
+    """
+    Imputa un panel largo (índice (País, Año), indicadores en columnas) serie por
+    serie: cada par (país, indicador) se imputa a lo largo de sus años.
+
+    Para 'interpolacion' (lineal), 'ffill' y 'bfill' el resultado es el mismo que
+    aplicar ``manejar_datos_faltantes`` a la matriz años × indicadores de cada país,
+    pero todas las series se procesan a la vez: el panel se reordena en un array
+    (países, años, indicadores) relleno con NaN al final y se imputa con
+    operaciones acumuladas de NumPy, sin recorrer los países en Python. Las demás
+    estrategias se aplican sobre el panel completo con ``manejar_datos_faltantes``.
+
+    Args:
+        df_panel (pd.DataFrame): Panel con MultiIndex; las filas de cada país deben
+            estar ordenadas por año (como lo devuelve ``IndicatorCube.panel``).
+        estrategia (str): Ver ``manejar_datos_faltantes``.
+        devolver_mascara (bool): Si True, retorna también la máscara de valores imputados.
+        nivel_unidad (Union[int, str]): Nivel del índice que identifica al país.
+        mascara_compacta (bool): Máscara como ``ImputationMask`` en lugar de DataFrame.
+        **kwargs: Parámetros de ``manejar_datos_faltantes`` ('ffill_limit',
+            'bfill_limit', 'bfill_limit_after_ffill', 'ffill_limit_after_bfill',
+            'metodo_interpolacion', ...).
+
+    Returns:
+        Union[pd.DataFrame, Tuple[pd.DataFrame, pd.DataFrame]]: Panel imputado (y
+        máscara: True donde había NaN y ahora hay valor), con el mismo índice y columnas.
+
+    Example:
+        >>> df_panel = cube.panel(paises, anios)
+        >>> df_imp, mascara = imputar_panel(df_panel, 'interpolacion', devolver_mascara=True)
+    """
+    metodo = kwargs.get('metodo_interpolacion', 'linear')
+    por_serie = estrategia in ESTRATEGIAS_PANEL_POR_SERIE and not (estrategia == 'interpolacion' and metodo != 'linear')
+    if not por_serie or df_panel.empty:
+        return manejar_datos_faltantes(df_panel, estrategia=estrategia, devolver_mascara=devolver_mascara,
+                                       mascara_compacta=mascara_compacta, **kwargs)
+
+    numericas = df_panel.select_dtypes(include=np.number).columns
+    valores = df_panel[numericas].to_numpy(dtype=np.float64)
+    faltantes = np.isnan(valores)
+    if not faltantes.any():
+        resultado = df_panel.copy()
+        if devolver_mascara:
+            return resultado, _mascara_vacia(df_panel, mascara_compacta)
+        return resultado
+
+    # Posición de cada fila dentro de la serie de su país (orden de aparición)
+    codigos, _ = pd.factorize(df_panel.index.get_level_values(nivel_unidad))
+    orden = np.argsort(codigos, kind='stable')
+    tamanos = np.bincount(codigos)
+    inicio = np.concatenate(([0], np.cumsum(tamanos)[:-1]))
+    posicion = np.empty(len(codigos), dtype=np.int64)
+    posicion[orden] = np.arange(len(codigos)) - np.repeat(inicio, tamanos)
+
+    bloque = np.full((len(tamanos), int(tamanos.max()), valores.shape[1]), np.nan)
+    bloque[codigos, posicion] = valores
+
+    bloque = _imputar_series_bloque(bloque, estrategia, kwargs)
+
+    resultado = df_panel.copy()
+    resultado[numericas] = bloque[codigos, posicion]
+    if devolver_mascara:
+        if mascara_compacta:
+            return resultado, ImputationMask.from_missing(df_panel.isnull().to_numpy(), resultado.isnull().to_numpy(),
+                                                          df_panel.index, df_panel.columns)
+        mascara = df_panel.isnull() & resultado.notnull()
+        return resultado, mascara
+    return resultado
+
+
+# --- Imputación de los cortes transversales de varios años ---------------------------
+
+ESTRATEGIAS_CORTE_VECTORIZADAS = ESTRATEGIAS_PANEL_POR_SERIE + ('mean', 'median', 'valor_constante')
+ESTRATEGIAS_AJUSTE_CONJUNTO = ('iterative', 'knn')
+
+
+@cached_stage()
+def imputar_cortes_transversales(
+    df_cortes: pd.DataFrame,
+    estrategia: str = 'interpolacion',
+    devolver_mascara: bool = False,
+    ajuste_conjunto: bool = False,
+    nivel_anio: Union[int, str] = 0,
+    mascara_compacta: bool = False,
+    **kwargs
+) -> Union[Dict[Any, pd.DataFrame], Tuple[Dict[Any, pd.DataFrame], Dict[Any, Union[pd.DataFrame, ImputationMask]]]]:
+    """
+    Imputa de una sola vez los cortes transversales (unidades × indicadores) de
+    varios años, apilados en un bloque con índice (Año, unidad).
+
+    Por defecto cada año se imputa por separado y el resultado es el mismo que
+    llamar ``manejar_datos_faltantes`` con la matriz de cada año, pero las
+    estrategias de ``ESTRATEGIAS_CORTE_VECTORIZADAS`` se calculan para todos los
+    años con una sola operación sobre el array (años, unidades, indicadores).
+
+    Con ``ajuste_conjunto=True``, 'iterative' y 'knn' ajustan un único imputador
+    con las filas (año, unidad) de todos los años en lugar de uno por año: los
+    vecinos y las regresiones entre indicadores se estiman con todo el bloque.
+    Es razonable cuando la relación entre indicadores cambia poco entre los años
+    seleccionados; un indicador sin datos en un año sí se imputa a partir de los
+    demás años. Las otras estrategias ignoran este parámetro.
+
+    Args:
+        df_cortes (pd.DataFrame): Bloque apilado, p. ej. ``IndicatorCube.cross_sections``.
+        estrategia (str): Ver ``manejar_datos_faltantes``.
+        devolver_mascara (bool): Si True, retorna también las máscaras de valores imputados.
+        ajuste_conjunto (bool): Un solo ajuste de 'iterative'/'knn' para todos los años.
+        nivel_anio (Union[int, str]): Nivel del índice que identifica el año.
+        mascara_compacta (bool): Máscaras como ``ImputationMask`` en lugar de DataFrames.
+        **kwargs: Parámetros de ``manejar_datos_faltantes``.
+
+    Returns:
+        Union[Dict, Tuple[Dict, Dict]]: ``{año: DataFrame imputado}`` (y ``{año: máscara}``),
+        con cada matriz indexada por unidad como la de ``IndicatorCube.cross_section``.
+
+    Example:
+        >>> df_cortes = cube.cross_sections(anios, paises, indicadores)
+        >>> por_anio, mascaras = imputar_cortes_transversales(df_cortes, 'knn', devolver_mascara=True)
+    """
+    anios = df_cortes.index.get_level_values(nivel_anio)
+    cortes = {anio: df_cortes[anios == anio].droplevel(nivel_anio) for anio in pd.unique(anios)}
+
+    if ajuste_conjunto and estrategia in ESTRATEGIAS_AJUSTE_CONJUNTO:
+        imputado, mascara = manejar_datos_faltantes(df_cortes, estrategia=estrategia, devolver_mascara=True, **kwargs)
+        resultados = {anio: imputado[anios == anio].droplevel(nivel_anio) for anio in cortes}
+        mascaras = {anio: mascara[anios == anio].droplevel(nivel_anio) for anio in cortes}
+        if mascara_compacta:
+            mascaras = {anio: ImputationMask.from_frame(m) for anio, m in mascaras.items()}
+        return (resultados, mascaras) if devolver_mascara else resultados
+
+    tamanos = {len(corte) for corte in cortes.values()}
+    rectangular = (len(tamanos) == 1 and len(df_cortes.select_dtypes(include=np.number).columns) == df_cortes.shape[1]
+                   and all(corte.index.equals(next(iter(cortes.values())).index) for corte in cortes.values()))
+    metodo = kwargs.get('metodo_interpolacion', 'linear')
+    if (estrategia not in ESTRATEGIAS_CORTE_VECTORIZADAS or not rectangular or df_cortes.empty
+            or (estrategia == 'interpolacion' and metodo != 'linear')):
+        resultados, mascaras = {}, {}
+        for anio, corte in cortes.items():
+            resultados[anio], mascaras[anio] = manejar_datos_faltantes(
+                corte, estrategia=estrategia, devolver_mascara=True, mascara_compacta=mascara_compacta, **kwargs)
+        return (resultados, mascaras) if devolver_mascara else resultados
+
+    bloque = df_cortes.to_numpy(dtype=np.float64).reshape(len(cortes), -1, df_cortes.shape[1])
+    faltantes = np.isnan(bloque)
+    if estrategia in ESTRATEGIAS_PANEL_POR_SERIE:
+        imputado = _imputar_series_bloque(bloque, estrategia, kwargs)
+    else:
+        # Estadístico de cada indicador en cada año; las columnas sin datos en el año quedan en NaN
+        con_datos = (~faltantes).any(axis=1, keepdims=True)
+        if estrategia == 'valor_constante':
+            valor_relleno = kwargs.get('valor_relleno')
+            if valor_relleno is None:
+                valor_relleno = 0.0
+                print(f"  Advertencia: Estrategia 'valor_constante' sin 'valor_relleno'. Se usará {valor_relleno} por defecto.")
+            relleno = np.where(con_datos, float(valor_relleno), np.nan)
+        else:
+            agregado = np.nanmean if estrategia == 'mean' else np.nanmedian
+            relleno = np.full((bloque.shape[0], 1, bloque.shape[2]), np.nan)
+            t, _, j = np.nonzero(con_datos)
+            relleno[t, 0, j] = agregado(bloque[t, :, j], axis=1)
+        imputado = np.where(faltantes, relleno, bloque)
+
+    resultados, mascaras = {}, {}
+    for t, (anio, corte) in enumerate(cortes.items()):
+        resultados[anio] = pd.DataFrame(imputado[t], index=corte.index, columns=corte.columns)
+        if mascara_compacta:
+            mascaras[anio] = ImputationMask.from_missing(faltantes[t], np.isnan(imputado[t]), corte.index, corte.columns)
+        else:
+            mascaras[anio] = pd.DataFrame(faltantes[t] & ~np.isnan(imputado[t]), index=corte.index, columns=corte.columns)
+    return (resultados, mascaras) if devolver_mascara else resultados
+
+
+# --- Evaluación de estrategias con celdas ocultas ---------------------------------------
+
+ESTRATEGIAS_EVALUABLES = ('interpolacion', 'mean', 'median', 'most_frequent', 'ffill', 'bfill', 'knn', 'iterative')
+
+
+def _imputar_segun_modo(df: pd.DataFrame, modo: str, estrategia: str, params: Dict[str, Any]) -> pd.DataFrame:
+    """Imputa ``df`` como lo hace el flujo correspondiente ('tabla', 'panel' o 'cortes')."""
+    if modo == 'panel':
+        return imputar_panel(df, estrategia=estrategia, **params)
+    if modo == 'cortes':
+        por_anio = imputar_cortes_transversales(df, estrategia=estrategia, **params)
+        return pd.concat(por_anio, names=[df.index.names[0]]).reindex(df.index)
+    return manejar_datos_faltantes(df, estrategia=estrategia, **params)
+
+
+def _evaluar_estrategia(tarea: Tuple) -> Tuple[str, Optional[np.ndarray], float, Optional[str]]:
+    """
+    Tarea de ``evaluar_estrategias_imputacion`` (se ejecuta en un proceso del pool).
+
+    Lee el bloque con celdas ocultas y sus posiciones desde memoria compartida,
+    imputa con la estrategia y devuelve solo los valores de las celdas ocultas.
+    """
+    from multiprocessing import shared_memory
+
+    nombre_datos, nombre_ocultas, forma, n_ocultas, index, columns, modo, estrategia, params = tarea
+    shm_datos = shared_memory.SharedMemory(name=nombre_datos)
+    shm_ocultas = shared_memory.SharedMemory(name=nombre_ocultas)
+    try:
+        df = pd.DataFrame(np.ndarray(forma, dtype=np.float64, buffer=shm_datos.buf),
+                          index=index, columns=columns, copy=True)
+        ocultas = np.ndarray((n_ocultas,), dtype=np.int64, buffer=shm_ocultas.buf).copy()
+    finally:
+        shm_datos.close()
+        shm_ocultas.close()
+
+    inicio = time.perf_counter()
+    try:
+        with bypass_preprocessing_cache():
+            imputado = _imputar_segun_modo(df, modo, estrategia, params)
+    except Exception as e:
+        return estrategia, None, time.perf_counter() - inicio, str(e)
+    duracion = time.perf_counter() - inicio
+    valores = imputado.reindex(index=index, columns=columns).to_numpy(dtype=np.float64).ravel()[ocultas]
+    return estrategia, valores, duracion, None
+
+
+def evaluar_estrategias_imputacion(
+    df: pd.DataFrame,
+    estrategias: Optional[Tuple[str, ...]] = None,
+    fraccion_oculta: float = 0.1,
+    semilla: int = 0,
+    modo: str = 'tabla',
+    parametros: Optional[Dict[str, Dict[str, Any]]] = None,
+    paralelo: Optional[bool] = None
+) -> pd.DataFrame:
+    """
+    Compara estrategias de imputación ocultando una muestra aleatoria de celdas
+    conocidas y midiendo qué tan bien cada estrategia las reconstruye.
+
+    El bloque con las celdas ocultas y sus posiciones se publican una sola vez en
+    memoria compartida (``multiprocessing.shared_memory``); cada estrategia se
+    ejecuta en un proceso del pool de ``performance_optimizer.parallel_process``,
+    que los lee sin copiarlos en la tarea, y devuelve solo los valores imputados
+    de las celdas ocultas.
+
+    Args:
+        df (pd.DataFrame): Datos numéricos con (o sin) faltantes.
+        estrategias (Optional[Tuple[str, ...]]): Candidatas; por defecto ``ESTRATEGIAS_EVALUABLES``.
+        fraccion_oculta (float): Fracción de las celdas conocidas que se ocultan.
+        semilla (int): Semilla de la muestra de celdas ocultas.
+        modo (str): Cómo se aplica la estrategia, igual que en el análisis:
+            'tabla' (``manejar_datos_faltantes``), 'panel' (``imputar_panel``) o
+            'cortes' (``imputar_cortes_transversales``).
+        parametros (Optional[Dict[str, Dict]]): Parámetros por estrategia, p. ej.
+            ``{'knn': {'knn_vecinos': 3}}``.
+        paralelo (Optional[bool]): False para evaluar en este proceso. Por defecto
+            ``performance.enable_parallel_processing``.
+
+    Returns:
+        pd.DataFrame: Una fila por estrategia, ordenada de mejor a peor, con
+        'rmse_normalizado' (error en desviaciones estándar de cada columna),
+        'mae_normalizado', 'cobertura' (fracción de celdas ocultas que quedaron
+        imputadas), 'tiempo_s' (tiempo de reloj de la imputación) y 'error'.
+
+    Example:
+        >>> ranking = evaluar_estrategias_imputacion(df_consolidado)
+        >>> mejor = ranking.index[0]
+    """
+    from multiprocessing import shared_memory
+    from performance_optimizer import parallel_process
+
+    estrategias = tuple(estrategias or ESTRATEGIAS_EVALUABLES)
+    parametros = parametros or {}
+    numericas = df.select_dtypes(include=np.number)
+    valores = numericas.to_numpy(dtype=np.float64)
+    conocidas = np.flatnonzero(~np.isnan(valores).ravel())
+    n_ocultas = int(round(len(conocidas) * fraccion_oculta))
+    if n_ocultas == 0:
+        raise ValueError("No hay celdas conocidas suficientes para ocultar (revisa 'fraccion_oculta').")
+    rng = np.random.default_rng(semilla)
+    ocultas = np.sort(rng.choice(conocidas, size=n_ocultas, replace=False)).astype(np.int64)
+    reales = valores.ravel()[ocultas]
+    # Escala de cada columna para que el error sea comparable entre indicadores
+    escala = np.nanstd(valores, axis=0)
+    escala = np.where(np.isfinite(escala) & (escala > 0), escala, 1.0)[ocultas % valores.shape[1]]
+
+    shm_datos = shared_memory.SharedMemory(create=True, size=max(valores.nbytes, 1))
+    shm_ocultas = shared_memory.SharedMemory(create=True, size=ocultas.nbytes)
+    try:
+        datos = np.ndarray(valores.shape, dtype=np.float64, buffer=shm_datos.buf)
+        datos[:] = valores
+        datos.ravel()[ocultas] = np.nan
+        np.ndarray(ocultas.shape, dtype=np.int64, buffer=shm_ocultas.buf)[:] = ocultas
+        del datos
+
+        tareas = [(shm_datos.name, shm_ocultas.name, valores.shape, n_ocultas, numericas.index, numericas.columns,
+                   modo, estrategia, parametros.get(estrategia, {})) for estrategia in estrategias]
+        if paralelo is None:
+            paralelo = get_config().performance.enable_parallel_processing
+        if paralelo and len(tareas) > 1:
+            resultados = parallel_process(_evaluar_estrategia, tareas, use_processes=True)
+        else:
+            resultados = [_evaluar_estrategia(tarea) for tarea in tareas]
+    finally:
+        shm_datos.close()
+        shm_datos.unlink()
+        shm_ocultas.close()
+        shm_ocultas.unlink()
+
+    filas = []
+    for estrategia, imputados, duracion, error in resultados:
+        fila = {'estrategia': estrategia, 'rmse_normalizado': np.nan, 'mae_normalizado': np.nan,
+                'cobertura': 0.0, 'tiempo_s': duracion, 'error': error}
+        if imputados is not None:
+            cubiertas = ~np.isnan(imputados)
+            fila['cobertura'] = cubiertas.mean()
+            if cubiertas.any():
+                diferencia = (imputados[cubiertas] - reales[cubiertas]) / escala[cubiertas]
+                fila['rmse_normalizado'] = float(np.sqrt(np.mean(diferencia ** 2)))
+                fila['mae_normalizado'] = float(np.mean(np.abs(diferencia)))
+        filas.append(fila)
+    ranking = pd.DataFrame(filas).set_index('estrategia')
+    return ranking.sort_values(['cobertura', 'rmse_normalizado', 'tiempo_s'], ascending=[False, True, True],
+                               na_position='last')
+
+
+@cached_stage()
 def estandarizar_datos(df, devolver_scaler=False):
     """
     Estandariza las columnas numéricas de un DataFrame (media 0, desviación estándar 1).
@@ -265,23 +695,21 @@ def estandarizar_datos(df, devolver_scaler=False):
             return df.copy(), None
         return df.copy()
 
-    df_copia = df.copy()
-    
     # Seleccionar solo columnas numéricas para estandarizar
-    numeric_cols = df_copia.select_dtypes(include=np.number).columns.tolist()
+    numeric_cols = df.select_dtypes(include=np.number).columns.tolist()
     
     if not numeric_cols:
         print("  No se encontraron columnas numéricas para estandarizar.")
         if devolver_scaler:
-            return df_copia, None
-        return df_copia
+            return df.copy(), None
+        return df.copy()
 
     # print(f"  Columnas numéricas a estandarizar: {numeric_cols}")
     
     scaler = StandardScaler()
     
     # Aplicar el scaler SOLO a las columnas numéricas
-    df_copia[numeric_cols] = scaler.fit_transform(df_copia[numeric_cols])
+    df_copia = _con_columnas_estandarizadas(df, numeric_cols, scaler.fit_transform(df[numeric_cols]))
     
     # print("  Datos estandarizados exitosamente.")
     
@@ -290,6 +718,108 @@ def estandarizar_datos(df, devolver_scaler=False):
     else:
         return df_copia
 
+def _con_columnas_estandarizadas(df: pd.DataFrame, columnas: list, valores: np.ndarray) -> pd.DataFrame:
+    """
+    DataFrame con ``valores`` en ``columnas``. Si todas las columnas son numéricas
+    se construye directamente sobre ``valores`` (sin copiar ``df`` primero).
+    """
+    if len(columnas) == df.shape[1]:
+        return pd.DataFrame(valores, index=df.index, columns=df.columns)
+    resultado = df.copy()
+    resultado[columnas] = valores
+    return resultado
+
+
+# --- Estandarización por bloques (fuera de memoria) -----------------------------------
+
+def _recorrer(fuente):
+    """Una pasada sobre ``fuente``: iterable reiterable o función sin argumentos que devuelve uno."""
+    return fuente() if callable(fuente) else iter(fuente)
+
+
+def ajustar_escalador_por_bloques(fuente, columnas: Optional[list] = None) -> Tuple[Optional[StandardScaler], Optional[list]]:
+    """
+    Ajusta un ``StandardScaler`` recorriendo los bloques una sola vez con
+    ``partial_fit``: media y varianza se acumulan por columna con la
+    actualización por lotes estable de scikit-learn (Chan/Welford), sin
+    materializar los datos completos. Los NaN se ignoran columna por columna.
+
+    Args:
+        fuente: Bloques (DataFrames con las mismas columnas). Lista, objeto reiterable
+            o función sin argumentos que devuelve un iterador nuevo.
+        columnas (Optional[list]): Columnas a estandarizar. Por defecto las numéricas
+            del primer bloque.
+
+    Returns:
+        Tuple[Optional[StandardScaler], Optional[list]]: Scaler ajustado y columnas,
+        o (None, columnas) si no hubo filas.
+    """
+    scaler = StandardScaler()
+    hubo_filas = False
+    for bloque in _recorrer(fuente):
+        if columnas is None:
+            columnas = bloque.select_dtypes(include=np.number).columns.tolist()
+        if bloque.empty or not columnas:
+            continue
+        scaler.partial_fit(bloque[columnas])
+        hubo_filas = True
+    return (scaler if hubo_filas else None), columnas
+
+
+def estandarizar_por_bloques(fuente, columnas: Optional[list] = None, devolver_scaler: bool = False,
+                             scaler: Optional[StandardScaler] = None):
+    """
+    Estandariza datos que llegan por bloques (p. ej. ``IndicatorCube.iter_panel`` o
+    ``performance_optimizer.iter_chunks``) sin reunirlos en un solo DataFrame.
+
+    La primera pasada sobre ``fuente`` ajusta el scaler (``ajustar_escalador_por_bloques``);
+    la segunda ocurre al recorrer el generador devuelto, que emite cada bloque
+    estandarizado a medida que se pide. El resultado equivale a
+    ``estandarizar_datos`` sobre la concatenación de los bloques. Con un ``scaler``
+    ya ajustado (p. ej. el devuelto por una llamada anterior) se omite la primera
+    pasada y ``fuente`` puede ser un generador.
+
+    Args:
+        fuente: Lista, objeto reiterable o función sin argumentos que devuelve un
+            iterador nuevo de bloques. Un generador no sirve (se recorre dos veces).
+        columnas (Optional[list]): Columnas a estandarizar (por defecto las numéricas).
+        devolver_scaler (bool): Si True, devuelve también el scaler ajustado.
+        scaler (Optional[StandardScaler]): Scaler ya ajustado sobre todos los bloques.
+
+    Returns:
+        Iterator[pd.DataFrame] | Tuple[Iterator[pd.DataFrame], Optional[StandardScaler]]
+
+    Raises:
+        ValueError: Si ``fuente`` es un iterador de una sola pasada y no se da ``scaler``.
+
+    Example:
+        >>> bloques, scaler = estandarizar_por_bloques(
+        ...     lambda: cube.iter_panel(paises, anios, units_per_chunk=50), devolver_scaler=True)
+        >>> for bloque in bloques:
+        ...     ipca.partial_fit(bloque.dropna())
+    """
+    if scaler is not None:
+        if columnas is None and hasattr(scaler, 'feature_names_in_'):
+            columnas = list(scaler.feature_names_in_)
+    elif not callable(fuente) and iter(fuente) is fuente:
+        raise ValueError("estandarizar_por_bloques recorre los bloques dos veces: pasa una lista "
+                         "o una función que devuelva un iterador nuevo, no un generador.")
+    else:
+        scaler, columnas = ajustar_escalador_por_bloques(fuente, columnas)
+
+    def _bloques_estandarizados():
+        if scaler is None:
+            return
+        for bloque in _recorrer(fuente):
+            if not bloque.empty:
+                cols = columnas if columnas is not None else bloque.select_dtypes(include=np.number).columns.tolist()
+                yield _con_columnas_estandarizadas(bloque, cols, scaler.transform(bloque[cols]))
+
+    if devolver_scaler:
+        return _bloques_estandarizados(), scaler
+    return _bloques_estandarizados()
+
+
 def prompt_select_imputation_strategy():
     """
     Permite al usuario seleccionar una estrategia de imputación de datos faltantes
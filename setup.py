@@ -52,6 +52,8 @@ setup(
         ],
         "optional": [
             "adjustText>=0.7.3",
+            "python-calamine>=0.2.0",
+            "pyarrow>=10.0.0",
         ]
     },
     entry_points={
@@ -0,0 +1,945 @@
+# test_data_pipeline.py
+"""
+Pruebas de la capa de carga y preparación de datos (lectura de libros,
+cache y transformaciones usadas por los flujos de análisis).
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir))
+
+import data_loader_module as dl
+from performance_optimizer import WorkbookDiskCache
+from indicator_cube import IndicatorCube
+
+
+def _escribir_libro_wdi(ruta, n_indicadores=3, paises=None, anios=range(2000, 2006), semilla=0):
+    """Crea un libro con el formato WDI: una hoja por indicador, países x años."""
+    rng = np.random.default_rng(semilla)
+    paises = paises or ['ARG', 'BRA', 'CHL', 'MEX', 'USA']
+    with pd.ExcelWriter(ruta) as writer:
+        for i in range(n_indicadores):
+            valores = rng.normal(size=(len(paises), len(anios)))
+            valores[rng.random(valores.shape) < 0.1] = np.nan
+            df = pd.DataFrame(valores, columns=list(anios))
+            df.insert(0, 'Unnamed: 0', paises)
+            df.to_excel(writer, sheet_name=f'IND_{i}', index=False)
+    return ruta
+
+
+@pytest.fixture
+def libro_wdi(tmp_path):
+    return _escribir_libro_wdi(tmp_path / "wdi.xlsx")
+
+
+def test_workbook_cache_roundtrip_e_invalidacion(libro_wdi, tmp_path, monkeypatch):
+    cache = WorkbookDiskCache(cache_dir=tmp_path / "cache", max_size_mb=50)
+    monkeypatch.setattr(dl, "get_workbook_cache", lambda: cache)
+
+    engine = dl.resolve_excel_engine()
+    frio = dl.load_excel_file(str(libro_wdi))
+    assert cache.get_workbook(libro_wdi, engine=engine) is not None
+    tibio = dl.load_excel_file(str(libro_wdi))
+    assert list(tibio) == list(frio)
+    for nombre in frio:
+        pd.testing.assert_frame_equal(tibio[nombre], frio[nombre])
+
+    # Reescribir el libro cambia la huella y descarta la entrada anterior
+    _escribir_libro_wdi(libro_wdi, n_indicadores=2, semilla=1)
+    os.utime(libro_wdi, ns=(0, 10**18))
+    assert cache.get_workbook(libro_wdi, engine=engine) is None
+    nuevo = dl.load_excel_file(str(libro_wdi))
+    assert list(nuevo) == ['IND_0', 'IND_1']
+    assert len(list((tmp_path / "cache").iterdir())) == 1
+
+
+def test_resolucion_del_engine_de_excel_y_cache_por_engine(libro_wdi, tmp_path, monkeypatch):
+    import types
+
+    instalados = {'python_calamine', 'openpyxl'}
+    monkeypatch.setattr(dl.importlib.util, 'find_spec',
+                        lambda nombre: types.SimpleNamespace() if nombre in instalados else None)
+    monkeypatch.setattr(dl, '_version_pandas', lambda: (2, 2))
+    assert dl.resolve_excel_engine('auto') == 'calamine'
+    assert dl.resolve_excel_engine('openpyxl') == 'openpyxl'
+    assert dl.resolve_excel_engine('pyxlsb') is None  # no instalado: engine de pandas
+
+    # pandas < 2.2 no reconoce engine='calamine' aunque python-calamine esté instalado
+    monkeypatch.setattr(dl, '_version_pandas', lambda: (2, 1))
+    assert dl.resolve_excel_engine('auto') is None
+    assert dl.resolve_excel_engine('calamine') is None
+    monkeypatch.undo()
+
+    # Las hojas parseadas con un engine no se sirven a otro
+    cache = WorkbookDiskCache(cache_dir=tmp_path / "cache", max_size_mb=50)
+    monkeypatch.setattr(dl, "get_workbook_cache", lambda: cache)
+    dl.load_excel_file(str(libro_wdi), engine='openpyxl')
+    assert cache.get_workbook(libro_wdi, engine='openpyxl') is not None
+    assert cache.get_workbook(libro_wdi, engine=None) is None
+
+
+def test_lazy_workbook_parsea_solo_hojas_accedidas(libro_wdi):
+    libro = dl.load_excel_file(str(libro_wdi), use_cache=False, lazy=True)
+    assert list(libro.keys()) == ['IND_0', 'IND_1', 'IND_2']
+    assert 'IND_1' in libro and 'NO_EXISTE' not in libro
+    assert libro.loaded_sheets == []
+
+    df = libro['IND_1']
+    assert libro.loaded_sheets == ['IND_1']
+    assert libro['IND_1'] is df
+    pd.testing.assert_frame_equal(df, pd.read_excel(libro_wdi, sheet_name='IND_1'))
+    with pytest.raises(KeyError):
+        libro['NO_EXISTE']
+
+
+def test_carga_paralela_equivale_a_secuencial(libro_wdi):
+    secuencial = dl.load_excel_file(str(libro_wdi), use_cache=False, parallel=False)
+    paralelo = dl.load_excel_file(str(libro_wdi), use_cache=False, parallel=True)
+    assert list(paralelo) == list(secuencial)
+    for nombre in secuencial:
+        pd.testing.assert_frame_equal(paralelo[nombre], secuencial[nombre])
+
+
+def test_carga_paralela_usa_hilos_en_ejecutable_congelado(libro_wdi, monkeypatch):
+    llamadas = []
+    original = dl.parallel_process
+
+    def registrar(func, data, **kwargs):
+        llamadas.append(kwargs.get('use_processes'))
+        return original(func, data, **{**kwargs, 'use_processes': False})
+
+    monkeypatch.setattr(dl, 'parallel_process', registrar)
+    monkeypatch.setattr(sys, 'frozen', True, raising=False)
+    congelado = dl.load_excel_file(str(libro_wdi), use_cache=False, parallel=True)
+    assert llamadas == [False] and list(congelado) == ['IND_0', 'IND_1', 'IND_2']
+
+
+def test_carga_proyectada_lee_solo_la_seleccion(libro_wdi, tmp_path, monkeypatch):
+    cache = WorkbookDiskCache(cache_dir=tmp_path / "cache", max_size_mb=50)
+    monkeypatch.setattr(dl, "get_workbook_cache", lambda: cache)
+    cfg = {"data_file": str(libro_wdi), "selected_indicators": ['IND_2', 'IND_0'],
+           "selected_units": ['MEX', 'ARG'], "selected_years": ['2001', 2004]}
+    proyeccion = dl.proyeccion_desde_config(cfg)
+    assert proyeccion == {'sheet_names': ['IND_2', 'IND_0'], 'units': ['MEX', 'ARG'], 'years': [2001, 2004]}
+
+    completo = dl.load_excel_file(str(libro_wdi), use_cache=False)
+    for opciones in ({'parallel': False}, {'parallel': True}, {'lazy': True}, {}):
+        hojas = dl.load_excel_file(str(libro_wdi), **opciones, **proyeccion)
+        assert list(hojas) == ['IND_2', 'IND_0']
+        for nombre in hojas:
+            esperado = completo[nombre].loc[completo[nombre]['Unnamed: 0'].isin(['MEX', 'ARG']),
+                                            ['Unnamed: 0', 2001, 2004]]
+            pd.testing.assert_frame_equal(hojas[nombre], esperado)
+    # La selección se guarda aparte y no cuenta como el libro completo en cache
+    engine = dl.resolve_excel_engine()
+    assert cache.get_sheet(libro_wdi, 'IND_2', engine=engine) is None
+    assert cache.get_workbook(libro_wdi, engine=engine) is None
+
+    cubo = IndicatorCube.from_config(cfg)
+    assert cubo.shape == (2, 2, 2)
+    pd.testing.assert_frame_equal(cubo.cross_section(2004), IndicatorCube.from_sheets(
+        completo, ['IND_2', 'IND_0']).cross_section(2004, ['ARG', 'MEX']))
+
+
+def test_cubo_equivale_a_preparacion_por_hojas(libro_wdi):
+    libro = dl.load_excel_file(str(libro_wdi), use_cache=False)
+    indicadores = ['IND_0', 'IND_2']
+    unidades = ['MEX', 'ARG', 'XXX']
+    cubo = IndicatorCube.from_sheets(libro, indicadores)
+    assert cubo.shape == (2, 5, 6)
+
+    esperado = dl.preparar_datos_corte_transversal(libro, indicadores, unidades, 2003)
+    pd.testing.assert_frame_equal(cubo.cross_section(2003, unidades, indicadores), esperado,
+                                  check_index_type=False, check_column_type=False)
+
+    transformados = {i: dl.transformar_df_indicador_v1(libro[i]) for i in indicadores}
+    esperado = dl.consolidate_data_for_country(transformados, 'BRA', indicadores)
+    pd.testing.assert_frame_equal(cubo.series('BRA', indicators=indicadores), esperado,
+                                  check_index_type=False, check_column_type=False)
+
+    esperado = dl.preparar_datos_panel_longitudinal(libro, indicadores, unidades)
+    pd.testing.assert_frame_equal(cubo.panel(unidades, indicators=indicadores), esperado,
+                                  check_index_type=False, check_column_type=False)
+
+
+def test_panel_una_pasada_alinea_anios_y_une_filas():
+    hojas = {
+        'A': pd.DataFrame({'Unnamed: 0': ['MEX', 'ARG'], 2000: [1.0, 2.0], 2001: [3.0, np.nan]}),
+        'B': pd.DataFrame({'Unnamed: 0': ['ARG', 'CHL'], '2001': [5.0, 6.0], 'Notas': ['x', 'y']}),
+    }
+    panel = dl.preparar_datos_panel_longitudinal(hojas, ['A', 'B'], ['ARG', 'CHL', 'MEX'])
+
+    esperado_indice = pd.MultiIndex.from_tuples(
+        [('ARG', 2000), ('ARG', 2001), ('CHL', 2001), ('MEX', 2000), ('MEX', 2001)], names=['País', 'Año'])
+    assert panel.index.equals(esperado_indice)
+    assert list(panel.columns) == ['A', 'B']
+    np.testing.assert_array_equal(panel['A'].to_numpy(), [2.0, np.nan, np.nan, 1.0, 3.0])
+    np.testing.assert_array_equal(panel['B'].to_numpy(), [np.nan, 5.0, 6.0, np.nan, np.nan])
+
+    # El dtype de los países sale de todas las hojas, no de la última procesada
+    hojas['A'] = hojas['A'].astype({'Unnamed: 0': 'category'})
+    dtypes = {dl.preparar_datos_panel_longitudinal(hojas, orden, ['ARG', 'CHL', 'MEX']).index.levels[0].dtype
+              for orden in (['A', 'B'], ['B', 'A'])}
+    assert len(dtypes) == 1 and not isinstance(dtypes.pop(), pd.CategoricalDtype)
+    codigos = {'A': pd.DataFrame({'Unnamed: 0': [32, 484], 2000: [1.0, 2.0]}),
+               'B': pd.DataFrame({'Unnamed: 0': ['32', 'CHL'], 2000: [5.0, 6.0]})}
+    for orden in (['A', 'B'], ['B', 'A']):
+        panel = dl.preparar_datos_panel_longitudinal(codigos, orden, [32, 484, '32', 'CHL'])
+        assert panel.index.levels[0].dtype == object and len(panel) == 4
+
+
+def test_transformar_indicador_decide_el_tipo_por_pais():
+    hoja = pd.DataFrame({
+        'Unnamed: 0': ['ARG', 'BRA', 'CHL'],
+        2000: [1, '..', 1.5],
+        2001: [2, 3, 2],
+        2002: ['3', 4, 3],
+    })
+    df = dl.transformar_df_indicador_v1(hoja)
+    # Como to_numeric por columna: ARG solo tiene enteros; BRA tiene un faltante y CHL un decimal
+    esperado = {pais: pd.to_numeric(hoja.set_index('Unnamed: 0').loc[pais], errors='coerce').dtype
+                for pais in df.columns}
+    assert df.dtypes.to_dict() == esperado
+    assert df['ARG'].dtype == np.int64 and df['BRA'].dtype == df['CHL'].dtype == np.float64
+    assert df['ARG'].tolist() == [1, 2, 3] and np.isnan(df.loc[2000, 'BRA'])
+
+
+def test_transformar_indicador_convierte_por_bloque_sin_modificar_entrada():
+    hoja = pd.DataFrame({
+        'Unnamed: 0': ['ARG', 'BRA', 'CHL'],
+        '2000': ['1.5', '..', None],
+        2001: [2, 3, None],
+        'Notas': [None, None, None],
+        2002: [None, None, None],
+    })
+    original = hoja.copy()
+    df = dl.transformar_df_indicador_v1(hoja)
+
+    pd.testing.assert_frame_equal(hoja, original)
+    assert list(df.index) == [2000, 2001] and df.index.name == 'Año'
+    assert list(df.columns) == ['ARG', 'BRA']
+    np.testing.assert_array_equal(df.to_numpy(), [[1.5, np.nan], [2.0, 3.0]])
+
+
+def test_metadatos_libro_sidecar(libro_wdi, monkeypatch):
+    metadata = dl.obtener_metadatos_libro(str(libro_wdi), use_sidecar=True)
+    assert os.path.isfile(dl.metadata_sidecar_path(str(libro_wdi)))
+    assert metadata.sheet_names == ['IND_0', 'IND_1', 'IND_2']
+    assert metadata.units('IND_0') == ['ARG', 'BRA', 'CHL', 'MEX', 'USA']
+    assert metadata.years('IND_0') == list(range(2000, 2006))
+    assert metadata.year_range('IND_0') == (2000, 2005)
+
+    hojas = dl.load_excel_file(str(libro_wdi), use_cache=False)
+    esperado = sum(h.set_index('Unnamed: 0').notna().astype(int) for h in hojas.values())
+    np.testing.assert_array_equal(metadata.non_null_counts().to_numpy(), esperado.to_numpy())
+
+    # Un proceso nuevo lee el sidecar sin volver a recorrer el libro
+    dl._metadata_memo.clear()
+    monkeypatch.setattr(dl, "extraer_metadatos_libro", lambda _: pytest.fail("se releyó el libro"))
+    assert dl.obtener_metadatos_libro(str(libro_wdi), use_sidecar=True).to_dict() == metadata.to_dict()
+
+
+def test_carga_streaming_con_seleccion_y_volcado_a_disco(libro_wdi, tmp_path):
+    completo = dl.load_excel_file(str(libro_wdi), use_cache=False)
+    spill = tmp_path / "spill"
+    hojas = dl.load_excel_file_streaming(str(libro_wdi), sheet_names=['IND_2', 'IND_0'],
+                                         units=['MEX', 'ARG'], years=[2001, 2003],
+                                         memory_limit_mb=0, spill_dir=str(spill))
+    assert list(hojas) == ['IND_2', 'IND_0']
+    assert any(p.suffix == '.npy' for p in spill.rglob('*'))
+    for nombre, df in hojas.items():
+        assert list(df.columns) == ['Unnamed: 0', 2001, 2003]
+        esperado = completo[nombre].set_index('Unnamed: 0').loc[['ARG', 'MEX'], [2001, 2003]]
+        np.testing.assert_array_equal(df.set_index('Unnamed: 0').to_numpy(), esperado.to_numpy())
+
+
+def test_formatos_columnares_equivalen_al_libro_excel(libro_wdi, tmp_path):
+    hojas = dl.load_excel_file(str(libro_wdi), use_cache=False)
+    cubo_excel = IndicatorCube.from_sheets(hojas)
+
+    # CSV ancho al estilo de las descargas del WDI: '..' para datos faltantes
+    filas = []
+    for indicador, df in hojas.items():
+        ancho = df.rename(columns={'Unnamed: 0': 'Country Name'})
+        ancho.columns = ['Country Name'] + [f'{a} [YR{a}]' for a in ancho.columns[1:]]
+        ancho = ancho.astype(object).where(ancho.notna(), '..')
+        ancho.insert(0, 'Series Name', indicador)
+        filas.append(ancho)
+    csv_ancho = tmp_path / "wdi_ancho.csv"
+    pd.concat(filas).to_csv(csv_ancho, index=False)
+
+    # CSV largo (tidy): indicador, país, año, valor
+    largo = pd.concat(
+        df.melt(id_vars='Unnamed: 0', var_name='year', value_name='value')
+          .rename(columns={'Unnamed: 0': 'country'}).assign(indicator=indicador)
+        for indicador, df in hojas.items())
+    csv_largo = tmp_path / "wdi_largo.csv"
+    largo.to_csv(csv_largo, index=False)
+
+    npz = tmp_path / "wdi.npz"
+    cubo_excel.to_npz(str(npz))
+
+    for ruta in (csv_ancho, csv_largo, npz):
+        cubo = IndicatorCube.from_file(str(ruta))
+        assert list(cubo.indicators) == list(cubo_excel.indicators)
+        for anio in (2000, 2003):
+            pd.testing.assert_frame_equal(cubo.cross_section(anio), cubo_excel.cross_section(anio))
+        pd.testing.assert_frame_equal(cubo.panel(), cubo_excel.panel())
+
+    # El .npz se guarda sin compresión y ``values`` se abre mapeado en memoria
+    valores = IndicatorCube.from_npz(str(npz)).values
+    assert not valores.flags.writeable and not valores.flags.owndata
+    assert list(IndicatorCube.from_file(str(npz), ['IND_1']).indicators) == ['IND_1']
+
+    metadatos = dl.extraer_metadatos_libro(str(csv_largo))
+    assert metadatos.sheet_names == list(hojas)
+    assert metadatos.year_range('IND_0') == (2000, 2005)
+    assert metadatos.units('IND_0') == ['ARG', 'BRA', 'CHL', 'MEX', 'USA']
+
+
+def test_npz_conserva_ids_numericos_y_tabla_larga_rechaza_duplicados(tmp_path):
+    import columnar_loader
+
+    largo = pd.DataFrame({'indicator': ['A', 'A', 'B', 'B'], 'unit': [101, 202, 101, 202],
+                          'year': [2000, 2000, 2000, 2000], 'value': [1.0, 2.0, 3.0, 4.0]})
+    csv_largo = tmp_path / "ids.csv"
+    largo.to_csv(csv_largo, index=False)
+    cubo = IndicatorCube.from_file(str(csv_largo))
+    assert list(cubo.units) == [101, 202]
+
+    npz = tmp_path / "ids.npz"
+    cubo.to_npz(str(npz))
+    releido = IndicatorCube.from_npz(str(npz))
+    assert list(releido.units) == [101, 202] and releido.units.dtype == cubo.units.dtype
+    pd.testing.assert_frame_equal(releido.cross_section(2000), cubo.cross_section(2000))
+    assert releido.cross_section(2000).loc[202, 'B'] == 4.0
+
+    pd.concat([largo, largo.iloc[[1]].assign(value=9.0)]).to_csv(csv_largo, index=False)
+    with pytest.raises(ValueError, match=r"repetidas.*\(202, 2000\)"):
+        columnar_loader.load_columnar_file(str(csv_largo))
+    assert IndicatorCube.from_file(str(csv_largo)) is None
+
+
+def test_sesion_comparte_cubo_y_resultados(libro_wdi):
+    from analysis_session import AnalysisSession
+    from pca_logic import PCAAnalysisLogic
+
+    session = AnalysisSession()
+    cfg = {"data_file": str(libro_wdi), "selected_indicators": ['IND_0', 'IND_1'],
+           "selected_units": ['MEX', 'ARG'], "selected_years": [2001, 2002]}
+    cubo = session.cube_for_config(cfg)
+    assert session.loads == 1 and cubo.shape == (2, 2, 2)
+    # Una selección contenida reutiliza el cubo; una mayor lo relee una vez con la unión
+    assert session.cube(str(libro_wdi), ['IND_1'], units=['ARG'], years=[2002]) is cubo
+    ampliado = session.cube(str(libro_wdi), ['IND_2'], units=['BRA'], years=[2001])
+    assert session.loads == 2 and ampliado.shape == (3, 3, 2)
+    assert session.cube_for_config(cfg) is ampliado and session.loads == 2
+
+    # La serie lee todos los años de la unidad (qué años entran sale del índice de metadatos)
+    primero = PCAAnalysisLogic.run_series_analysis_logic(cfg, selected_years=[2001, 2002], session=session)
+    segundo = PCAAnalysisLogic.run_series_analysis_logic(cfg, selected_years=[2001, 2002], session=session)
+    # Esa lectura adicional cubre también las demás selecciones
+    assert segundo is primero and session.n_results == 1 and session.loads == 3
+    assert session.cube_for_config(cfg) is session.loaded_cube and session.loads == 3
+
+    # Cambiar el archivo en disco invalida cubo y resultados
+    _escribir_libro_wdi(libro_wdi, semilla=1)
+    os.utime(libro_wdi, ns=(0, 10**18))
+    assert session.cube_for_config(cfg) is not ampliado
+    assert session.loads == 4 and session.n_results == 0
+
+
+def test_resultados_de_sesion_no_quedan_obsoletos_y_se_acotan(libro_wdi, monkeypatch):
+    from analysis_session import AnalysisSession
+    from config_manager import get_config
+
+    session = AnalysisSession(str(libro_wdi))
+    clave = session.result_key('serie', ['IND_0'])
+    session.store_result(clave, {"valor": 1})
+    assert session.get_result(clave) == {"valor": 1}
+
+    # Editar el archivo invalida el resultado aunque la clave se haya calculado antes
+    os.utime(libro_wdi, ns=(0, 10**18))
+    assert session.get_result(clave) is None and session.n_results == 0
+    assert session.result_key('serie', ['IND_0']) != clave
+
+    # Se conservan los resultados usados más recientemente
+    monkeypatch.setattr(get_config().performance, 'session_max_results', 2)
+    claves = [session.result_key('serie', [f'IND_{i}']) for i in range(3)]
+    session.store_result(claves[0], {"valor": 0})
+    session.store_result(claves[1], {"valor": 1})
+    assert session.get_result(claves[0]) is not None
+    session.store_result(claves[2], {"valor": 2})
+    assert session.n_results == 2
+    assert session.get_result(claves[1]) is None and session.get_result(claves[0]) == {"valor": 0}
+
+
+def test_serie_proyectada_a_la_unidad_equivale_a_hojas_completas(tmp_path):
+    from analysis_session import AnalysisSession
+    from pca_logic import PCAAnalysisLogic
+
+    libro = _escribir_libro_wdi(tmp_path / "wdi.xlsx")
+    hojas = dl.load_excel_file(str(libro), use_cache=False)
+    # 2002 solo tiene datos de CHL en IND_0; MEX solo tiene IND_2 en 2005; ARG no tiene 2003
+    hojas['IND_0'].loc[:, 2002] = np.nan
+    hojas['IND_0'].loc[hojas['IND_0']['Unnamed: 0'] == 'CHL', 2002] = 1.5
+    hojas['IND_2'].loc[hojas['IND_2']['Unnamed: 0'] == 'MEX', 2000:2004] = np.nan
+    hojas['IND_2'].loc[hojas['IND_2']['Unnamed: 0'] == 'MEX', 2005] = 2.5
+    for df in hojas.values():
+        df.loc[df['Unnamed: 0'] == 'ARG', 2003] = np.nan
+    with pd.ExcelWriter(libro) as writer:
+        for nombre, df in hojas.items():
+            df.to_excel(writer, sheet_name=nombre, index=False)
+
+    completo = IndicatorCube.from_file(str(libro))
+    indicadores = ['IND_0', 'IND_1', 'IND_2']
+    for unidad in ['ARG', 'CHL', 'MEX']:
+        for anios in (None, [2001, 2002, 2004]):
+            cfg = {"data_file": str(libro), "selected_indicators": indicadores, "selected_units": [unidad]}
+            session = AnalysisSession()
+            serie = PCAAnalysisLogic.series_frame(cfg, anios, session=session)
+            esperado = PCAAnalysisLogic.series_frame(cfg, anios, cube=completo)
+            pd.testing.assert_frame_equal(serie, esperado)
+            assert list(session.loaded_cube.units) == [unidad]
+            if unidad == 'ARG' and anios is None:
+                assert serie.loc[2003].isna().all()
+    assert 2002 in serie.index and 'IND_2' in serie.columns and serie['IND_2'].isna().all()
+
+
+def test_perfil_faltantes_desde_cubo_y_metadatos(libro_wdi):
+    from pca_logic import PCAAnalysisLogic
+
+    cubo = IndicatorCube.from_file(str(libro_wdi))
+    indicadores, unidades, anios = ['IND_0', 'IND_2'], ['MEX', 'ARG', 'XXX'], [2001, 2003, 2010]
+    perfil = dl.perfil_faltantes(cubo, indicadores, unidades, anios)
+    # El índice de metadatos da el mismo perfil sin parsear el libro
+    perfil_meta = dl.perfil_faltantes(str(libro_wdi), indicadores, unidades, anios)
+    for serie, serie_meta in ((perfil.por_indicador, perfil_meta.por_indicador),
+                              (perfil.por_unidad, perfil_meta.por_unidad),
+                              (perfil.por_anio, perfil_meta.por_anio)):
+        pd.testing.assert_series_equal(serie, serie_meta)
+    for anio in anios:
+        assert perfil.faltantes_en(anio) == cubo.cross_section(anio, unidades, indicadores).isna().sum().sum()
+    assert perfil.por_unidad['XXX'] == 6 and perfil.por_anio[2010] == 6
+    assert perfil.total_celdas == 18 and perfil.hay_faltantes
+
+    # El perfil de la serie coincide con el aviso de faltantes del flujo completo
+    for unidad in ['ARG', 'BRA', 'CHL', 'MEX', 'USA']:
+        cfg = {"data_file": str(libro_wdi), "selected_indicators": ['IND_0', 'IND_1', 'IND_2'],
+               "selected_units": [unidad]}
+        perfil_serie = PCAAnalysisLogic.missing_profile(cfg, [2001, 2002, 2004], cube=cubo)
+        results = PCAAnalysisLogic.run_series_analysis_logic(cfg, selected_years=[2001, 2002, 2004], cube=cubo)
+        if perfil_serie.hay_faltantes:
+            assert f"Se encontraron {perfil_serie.total_faltantes} datos faltantes" in results["warning"]
+        else:
+            assert "faltantes" not in results.get("warning", "")
+
+
+@pytest.mark.parametrize("estrategia,params", [
+    ('interpolacion', {}),
+    ('ffill', {'ffill_limit': 1}),
+    ('bfill', {'bfill_limit': 2, 'ffill_limit_after_bfill': 1}),
+])
+def test_imputar_panel_equivale_a_imputar_cada_pais(estrategia, params):
+    import preprocessing_module as prep
+
+    rng = np.random.default_rng(3)
+    filas = [(f'P{p}', anio) for p in range(12) for anio in range(2000, 2000 + 5 + p % 4)]
+    valores = rng.normal(size=(len(filas), 3))
+    valores[rng.random(valores.shape) < 0.3] = np.nan
+    valores[:4, 0] = np.nan  # serie del primer país sin ningún dato
+    panel = pd.DataFrame(valores, columns=['A', 'B', 'C'],
+                         index=pd.MultiIndex.from_tuples(filas, names=['País', 'Año']))
+
+    imputado, mascara = prep.imputar_panel(panel, estrategia, devolver_mascara=True, **params)
+
+    for pais, bloque in panel.groupby(level='País', sort=False):
+        esperado, mascara_esperada = prep.manejar_datos_faltantes(
+            bloque, estrategia=estrategia, devolver_mascara=True, **params)
+        pd.testing.assert_frame_equal(imputado.loc[bloque.index], esperado)
+        pd.testing.assert_frame_equal(mascara.loc[bloque.index], mascara_esperada)
+    assert panel.isna().to_numpy().sum() > 0 and imputado.index.equals(panel.index)
+
+
+@pytest.mark.parametrize("estrategia", ['mean', 'interpolacion', 'knn'])
+def test_corte_transversal_imputa_todos_los_anios_en_una_llamada(libro_wdi, estrategia):
+    from analysis_session import AnalysisSession
+    from pca_cross_logic import PCAAnalysisLogic
+
+    paises = ['ARG', 'BRA', 'CHL', 'MEX', 'USA', 'XXX']
+    cfg = {"data_file": str(libro_wdi), "selected_indicators": ['IND_0', 'IND_1', 'IND_2'],
+           "selected_units": paises, "selected_years": [2000, 2001, 2003, 2005]}
+    cubo = IndicatorCube.from_file(str(libro_wdi))
+    session = AnalysisSession(str(libro_wdi))
+    por_lotes = PCAAnalysisLogic.run_cross_section_years_logic(cfg, imputation_strategy=estrategia, session=session)
+
+    assert list(por_lotes) == cfg["selected_years"] and session.n_results == 4
+    for anio, resultado in por_lotes.items():
+        esperado = PCAAnalysisLogic.run_cross_section_analysis_logic(cfg, anio, imputation_strategy=estrategia, cube=cubo)
+        pd.testing.assert_frame_equal(resultado["df_year_processed"], esperado["df_year_processed"])
+        assert resultado["mascara_imputados_cs"] == esperado["mascara_imputados_cs"]
+        pd.testing.assert_frame_equal(resultado["df_pc_scores_cs"], esperado["df_pc_scores_cs"])
+        # La llamada por año encuentra el resultado que guardó la llamada por lotes
+        assert PCAAnalysisLogic.run_cross_section_analysis_logic(
+            cfg, anio, imputation_strategy=estrategia, session=session) is resultado
+    assert session.loads == 1
+
+    # Un solo imputador para todos los años: mismas formas, sin faltantes en las unidades con datos
+    conjunto = PCAAnalysisLogic.run_cross_section_years_logic(
+        cfg, imputation_strategy=estrategia, cube=cubo, ajuste_conjunto=True)
+    for anio, resultado in conjunto.items():
+        assert resultado["mascara_imputados_cs"].shape == por_lotes[anio]["mascara_imputados_cs"].shape
+        assert resultado["df_year_processed"].notna().all().all()
+
+
+def test_mascara_imputacion_compacta():
+    import preprocessing_module as prep
+    from imputation_mask import ImputationMask
+
+    rng = np.random.default_rng(5)
+    valores = rng.normal(size=(40, 11))
+    valores[rng.random(valores.shape) < 0.25] = np.nan
+    valores[:, 10] = np.nan  # columna sin datos: queda sin imputar
+    df = pd.DataFrame(valores, index=[f'U{i}' for i in range(40)], columns=[f'I{j}' for j in range(11)])
+
+    mascaras = {}
+    for estrategia in ('mean', 'ffill', 'knn', 'eliminar_filas'):
+        _, esperada = prep.manejar_datos_faltantes(df, estrategia=estrategia, devolver_mascara=True)
+        _, compacta = prep.manejar_datos_faltantes(df, estrategia=estrategia, devolver_mascara=True, mascara_compacta=True)
+        assert isinstance(compacta, ImputationMask) and compacta.nbytes == 40 * 2
+        pd.testing.assert_frame_equal(compacta.to_frame(), esperada.reindex(df.index).fillna(False).astype(bool))
+        mascaras[estrategia] = compacta
+
+    union = ImputationMask.union(*mascaras.values())
+    densa = np.logical_or.reduce([m.to_array() for m in mascaras.values()])
+    np.testing.assert_array_equal(union.to_array(), densa)
+    np.testing.assert_array_equal((mascaras['mean'] & mascaras['ffill']).to_array(),
+                                  mascaras['mean'].to_array() & mascaras['ffill'].to_array())
+    assert not (mascaras['knn'] - mascaras['mean']).any()
+    pd.testing.assert_series_equal(union.count_per_row(), pd.Series(densa.sum(axis=1), index=df.index))
+    pd.testing.assert_series_equal(union.count_per_column(), pd.Series(densa.sum(axis=0), index=df.columns))
+    assert union.count() == densa.sum() and union.count_per_column()['I10'] == 0
+    with pytest.raises(ValueError):
+        union | ImputationMask.empty(df.index[:5], df.columns)
+
+
+def test_knn_por_patrones_equivale_a_knnimputer():
+    import preprocessing_module as prep
+    from sklearn.impute import KNNImputer
+    from knn_imputation import imputar_knn_por_patrones
+
+    rng = np.random.default_rng(11)
+    X = rng.normal(size=(600, 9)) @ rng.normal(size=(9, 9))
+    grupo = rng.integers(0, 4, len(X))
+    X[np.ix_(grupo == 1, [0])] = np.nan           # patrones frecuentes (donantes indexados)
+    X[np.ix_(grupo == 2, [1, 2, 3])] = np.nan
+    X[np.ix_(grupo == 3, [8])] = np.nan
+    X[rng.random(X.shape) < 0.03] = np.nan         # patrones poco frecuentes (fuerza bruta)
+    X[:3] = np.nan                                 # filas sin datos: media de la columna
+
+    esperado = KNNImputer(n_neighbors=4).fit_transform(X)
+    for workers in (1, 3):
+        np.testing.assert_allclose(imputar_knn_por_patrones(X, n_vecinos=4, max_workers=workers), esperado, atol=1e-9)
+    # Pocas columnas comunes: vecinos con cKDTree
+    np.testing.assert_allclose(imputar_knn_por_patrones(X[:, :4], n_vecinos=3),
+                               KNNImputer(n_neighbors=3).fit_transform(X[:, :4]), atol=1e-9)
+
+    df = pd.DataFrame(X, columns=[f'I{j}' for j in range(9)])
+    df['vacia'] = np.nan
+    por_sklearn = prep.manejar_datos_faltantes(df, 'knn', knn_vecinos=4, knn_backend='sklearn')
+    por_patrones = prep.manejar_datos_faltantes(df, 'knn', knn_vecinos=4, knn_backend='patrones')
+    pd.testing.assert_frame_equal(por_patrones, por_sklearn, atol=1e-9)
+
+
+def test_evaluar_estrategias_con_celdas_ocultas():
+    import preprocessing_module as prep
+
+    # Series suaves: la interpolación debe reconstruir mejor que la media
+    anios = np.arange(1990, 2020)
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({f'I{j}': np.cumsum(rng.normal(size=len(anios))) + 5 * j for j in range(4)},
+                      index=pd.Index(anios, name='Año'))
+    df.iloc[rng.random(df.shape) < 0.1] = np.nan
+
+    original = df.copy()
+    estrategias = ('mean', 'interpolacion', 'ffill', 'knn')
+    en_pool = prep.evaluar_estrategias_imputacion(df, estrategias, fraccion_oculta=0.2, paralelo=True)
+    local = prep.evaluar_estrategias_imputacion(df, estrategias, fraccion_oculta=0.2, paralelo=False)
+
+    assert sorted(en_pool.index) == sorted(estrategias) and en_pool.index[0] == 'interpolacion'
+    pd.testing.assert_frame_equal(en_pool.drop(columns='tiempo_s'), local.drop(columns='tiempo_s'))
+    assert (en_pool['cobertura'] == 1.0).all() and (en_pool['tiempo_s'] >= 0).all()
+    assert en_pool.loc['interpolacion', 'rmse_normalizado'] < en_pool.loc['mean', 'rmse_normalizado']
+    # Las celdas se ocultan en una copia compartida, no en los datos de entrada
+    pd.testing.assert_frame_equal(df, original)
+
+
+def test_sugerencia_de_imputacion_de_la_gui_no_usa_pool_de_procesos(monkeypatch):
+    import threading
+    import time
+    import performance_optimizer as po
+    import pca_gui
+    from config_manager import get_config
+
+    def sin_procesos(*args, **kwargs):
+        raise AssertionError("la GUI no debe abrir un pool de procesos")
+
+    monkeypatch.setattr(po, 'ProcessPoolExecutor', sin_procesos)
+    monkeypatch.setattr(get_config().performance, 'enable_parallel_processing', True)
+
+    class VentanaFalsa:
+        """Ejecuta los ``after`` en el hilo de la prueba, como el bucle de Tk."""
+        def __init__(self):
+            self.pendientes = []
+
+        def after(self, ms, funcion):
+            self.pendientes.append(funcion)
+
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame(rng.normal(size=(30, 3)).cumsum(axis=0), columns=['A', 'B', 'C'])
+    df.iloc[rng.random(df.shape) < 0.1] = np.nan
+    ventana, recibido = VentanaFalsa(), []
+
+    def al_terminar(ranking, error):
+        recibido.append((ranking, error, threading.current_thread()))
+
+    hilo = pca_gui.evaluar_imputacion_en_segundo_plano(ventana, df, 'tabla', al_terminar, intervalo_ms=1)
+    assert hilo is not threading.current_thread()
+    limite = time.monotonic() + 60
+    while not recibido and time.monotonic() < limite:
+        ventana.pendientes.pop(0)()
+        time.sleep(0.01)
+    ranking, error, hilo_entrega = recibido[0]
+    assert error is None and len(ranking) > 1 and ranking['cobertura'].gt(0).all()
+    assert hilo_entrega is threading.current_thread()
+
+
+def test_estandarizacion_por_bloques_equivale_a_la_completa(libro_wdi, tmp_path):
+    import preprocessing_module as prep
+    from performance_optimizer import iter_chunks
+
+    _escribir_libro_wdi(libro_wdi, paises=[f'P{i:02d}' for i in range(23)], anios=range(1990, 2010))
+    npz = tmp_path / "wdi.npz"
+    IndicatorCube.from_file(str(libro_wdi)).to_npz(str(npz))
+    cubo = IndicatorCube.from_npz(str(npz))  # values mapeado en memoria
+    paises, anios = [f'P{i:02d}' for i in range(0, 23, 2)] + ['XXX'], list(range(1995, 2008))
+
+    panel = cubo.panel(paises, anios)
+    pd.testing.assert_frame_equal(pd.concat(cubo.iter_panel(paises, anios, units_per_chunk=5)), panel)
+
+    esperado, scaler_completo = prep.estandarizar_datos(panel, devolver_scaler=True)
+    bloques, scaler = prep.estandarizar_por_bloques(
+        lambda: cubo.iter_panel(paises, anios, units_per_chunk=5), devolver_scaler=True)
+    pd.testing.assert_frame_equal(pd.concat(bloques), esperado, rtol=1e-12)
+    np.testing.assert_allclose(scaler.mean_, scaler_completo.mean_, rtol=1e-12)
+    np.testing.assert_allclose(scaler.var_, scaler_completo.var_, rtol=1e-12)
+
+    # Bloques de filas de un DataFrame ya cargado (vistas, sin copias)
+    por_filas = prep.estandarizar_por_bloques(lambda: iter_chunks(panel, 7))
+    pd.testing.assert_frame_equal(pd.concat(por_filas), esperado, rtol=1e-12)
+    with pytest.raises(ValueError):
+        prep.estandarizar_por_bloques(cubo.iter_panel(paises, anios))
+
+
+def test_cache_de_preprocesamiento_por_contenido(tmp_path, monkeypatch):
+    import performance_optimizer as po
+    import preprocessing_module as prep
+
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame(rng.normal(size=(400, 5)), columns=list('ABCDE')).mask(rng.random((400, 5)) < 0.1)
+    cambiado = df.copy()
+    cambiado.iloc[-1, 0] = 123.0  # más allá de las primeras filas
+    assert po.data_fingerprint(df) != po.data_fingerprint(cambiado)
+    assert po.LRUCache()._make_key('f', df) != po.LRUCache()._make_key('f', cambiado)
+
+    cache = po.PreprocessingCache(max_size_mb=1, use_disk=True, cache_dir=tmp_path / "prep")
+    monkeypatch.setattr(po, '_preprocessing_cache', cache)
+
+    primero = prep.manejar_datos_faltantes(df, 'knn', knn_vecinos=3)
+    primero.iloc[0, 0] = -999.0  # el llamador recibe una copia
+    segundo = prep.manejar_datos_faltantes(df, estrategia='knn', knn_vecinos=3)
+    assert cache.get_stats()['hits'] == 1 and segundo.iloc[0, 0] != -999.0
+    prep.manejar_datos_faltantes(df, 'knn', knn_vecinos=4)
+    prep.manejar_datos_faltantes(cambiado, 'knn', knn_vecinos=3)
+    assert cache.get_stats()['misses'] == 3
+
+    escalado, scaler = prep.estandarizar_datos(segundo, devolver_scaler=True)
+    otra_vez, scaler_cache = prep.estandarizar_datos(segundo, devolver_scaler=True)
+    pd.testing.assert_frame_equal(otra_vez, escalado)
+    np.testing.assert_array_equal(scaler_cache.mean_, scaler.mean_)
+
+    # Desalojo por tamaño: un presupuesto de ~2 resultados conserva solo los recientes
+    cache.max_size_mb = 2 * po._tamano_resultado(segundo) / 1024 / 1024
+    prep.manejar_datos_faltantes(df, 'mean')
+    assert cache.get_stats()['entries'] <= 2 and cache.get_stats()['size_mb'] <= cache.max_size_mb
+
+    # Nivel en disco: otra instancia (p. ej. otra sesión) recupera el resultado
+    nueva = po.PreprocessingCache(max_size_mb=1, use_disk=True, cache_dir=tmp_path / "prep")
+    monkeypatch.setattr(po, '_preprocessing_cache', nueva)
+    pd.testing.assert_frame_equal(prep.manejar_datos_faltantes(df, 'knn', knn_vecinos=3), segundo)
+    assert nueva.get_stats()['disk_hits'] == 1
+
+
+def test_descomposicion_pca_unica_para_cualquier_k():
+    from sklearn.decomposition import PCA
+    import pca_module as pca_mod
+
+    rng = np.random.default_rng(4)
+    df = pd.DataFrame(rng.normal(size=(40, 6)) @ rng.normal(size=(6, 6)), columns=[f'I{j}' for j in range(6)],
+                      index=[f'P{i}' for i in range(40)])
+    df = (df - df.mean()) / df.std()
+    descomposicion = pca_mod.descomponer_pca(df)
+    assert descomposicion.max_components == 6 and df.dtypes.eq(np.float64).all()
+
+    datos = df.astype(np.float32)  # los tipos que usa el ajuste (optimize_memory)
+    for k in (1, 2, 6, 0.9):
+        referencia = PCA(n_components=k, random_state=42, svd_solver='full').fit(datos)
+        modelo = descomposicion.model(k)
+        assert modelo.n_components_ == referencia.n_components_
+        np.testing.assert_allclose(modelo.components_, referencia.components_, atol=1e-4)
+        np.testing.assert_allclose(modelo.explained_variance_ratio_, referencia.explained_variance_ratio_, rtol=1e-4)
+        np.testing.assert_allclose(modelo.noise_variance_, referencia.noise_variance_, rtol=1e-3, atol=1e-7)
+        np.testing.assert_allclose(descomposicion.scores(k).to_numpy(), referencia.transform(datos), atol=1e-3)
+    assert list(descomposicion.scores(2).columns) == ['PC1', 'PC2'] and descomposicion.scores(2).index.equals(df.index)
+
+    # 'auto' (valor por defecto de PCASettings) retiene todos los componentes
+    modelo, puntuaciones = pca_mod.realizar_pca(df)
+    assert modelo is not None and puntuaciones.shape == (40, 6)
+
+
+def test_politica_de_solver_svd(monkeypatch):
+    import pca_module as pca_mod
+    from config_manager import PCASettings, get_config
+
+    assert pca_mod.elegir_solver_svd(60, 25, 2) == 'full'                # corte pequeño
+    assert pca_mod.elegir_solver_svd(20000, 40, 3) == 'covariance_eigh'  # panel alto y angosto
+    assert pca_mod.elegir_solver_svd(800, 2000, 2) == 'arpack'           # matriz ancha, biplot
+    assert pca_mod.elegir_solver_svd(5000, 1500, 30) == 'randomized'
+    assert pca_mod.elegir_solver_svd(800, 2000, 800) == 'full'           # todos los componentes
+    with pytest.raises(ValueError):
+        PCASettings(svd_solver='lobpcg')
+
+    rng = np.random.default_rng(5)
+    df = pd.DataFrame(rng.normal(size=(300, 8)) @ rng.normal(size=(8, 60)) + 0.5 * rng.normal(size=(300, 60)))
+    df = (df - df.mean()) / df.std()
+    referencia, _ = pca_mod.realizar_pca(df, n_components=None)
+    for solver in ('auto', 'full', 'randomized', 'arpack', 'covariance_eigh'):
+        monkeypatch.setattr(get_config().pca, 'svd_solver', solver)
+        modelo, puntuaciones = pca_mod.realizar_pca(df, n_components=3)
+        assert puntuaciones.shape == (300, 3)
+        np.testing.assert_allclose(modelo.explained_variance_ratio_, referencia.explained_variance_ratio_[:3],
+                                   rtol=1e-3)
+
+
+def test_solver_covariance_eigh_recae_en_full_con_sklearn_antiguo(monkeypatch):
+    import pca_module as pca_mod
+    from config_manager import get_config
+
+    monkeypatch.setattr(pca_mod, '_version_sklearn', lambda: (1, 4))
+    assert pca_mod.solver_disponible('covariance_eigh') == 'full'
+    assert pca_mod.solver_disponible('arpack') == 'arpack'
+    assert pca_mod.elegir_solver_svd(20000, 40, 3) == 'full'
+    assert pca_mod.elegir_solver_svd(20000, 40, 40) == 'full'
+
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame(rng.normal(size=(300, 6)) @ rng.normal(size=(6, 6)), columns=[f'I{j}' for j in range(6)])
+    df = (df - df.mean()) / df.std()
+    monkeypatch.setattr(get_config().pca, 'svd_solver', 'covariance_eigh')
+    modelo, puntuaciones = pca_mod.realizar_pca(df, n_components=2)
+    assert modelo.svd_solver == 'full' and puntuaciones.shape == (300, 2)
+    # Los modelos armados desde eigh tampoco quedan con un solver que sklearn no conoce
+    assert pca_mod.PCADecomposition.from_covariance(df, df.cov()).model(2).svd_solver == 'full'
+
+
+def test_pca_desde_la_covarianza_calculada():
+    import pca_module as pca_mod
+
+    rng = np.random.default_rng(6)
+    df = pd.DataFrame(rng.normal(size=(2000, 8)) @ rng.normal(size=(8, 8)), columns=[f'I{j}' for j in range(8)])
+    df = (df - df.mean()) / df.std()
+    df_cov = df.cov()
+
+    por_svd = pca_mod.descomponer_pca(df)
+    por_eigh = pca_mod.descomponer_pca(df, df_cov[df.columns[::-1]])  # se alinea por etiquetas
+    np.testing.assert_allclose(por_eigh.explained_variance_ratio_, por_svd.explained_variance_ratio_, rtol=1e-4)
+    np.testing.assert_allclose(por_eigh.model(3).components_, por_svd.model(3).components_, atol=1e-4)
+    np.testing.assert_allclose(por_eigh.scores(3).to_numpy(), por_svd.scores(3).to_numpy(), atol=1e-3)
+    # El modelo sigue siendo un PCA de sklearn utilizable
+    np.testing.assert_allclose(por_eigh.model(3).transform(df), por_eigh.scores(3).to_numpy(), atol=1e-5)
+
+    modelo, puntuaciones = pca_mod.realizar_pca(df, n_components=3, matriz_covarianza=df_cov.to_numpy())
+    assert modelo.n_components_ == 3 and puntuaciones.shape == (2000, 3)
+    assert pca_mod.realizar_pca(df, n_components=3, matriz_covarianza=df_cov.iloc[:4, :4]) == (None, None)
+
+
+def test_pca_por_lotes_equivale_a_descomponer_cada_bloque():
+    import pca_module as pca_mod
+
+    rng = np.random.default_rng(7)
+    columnas = [f'I{j}' for j in range(5)]
+
+    def bloque(n):
+        df = pd.DataFrame(rng.normal(size=(n, 5)) @ rng.normal(size=(5, 5)), columns=columnas,
+                          index=[f'U{i}' for i in range(n)])
+        return (df - df.mean()) / df.std()
+
+    # Dos formas n >= p (eigh apilado), una n < p (svd apilado) y un bloque con muy pocas filas
+    bloques = {2000: bloque(40), 2001: bloque(40), 2002: bloque(25), 2003: bloque(4), 2004: bloque(2)}
+    lotes = pca_mod.pca_por_lotes(bloques, {2001: bloques[2001].cov()})
+
+    assert list(lotes) == list(bloques) and lotes[2004] is None
+    for anio in (2000, 2001, 2002, 2003):
+        esperado = pca_mod.descomponer_pca(bloques[anio])
+        k = min(2, esperado.max_components)
+        assert lotes[anio].max_components == esperado.max_components
+        np.testing.assert_allclose(lotes[anio].explained_variance_ratio_, esperado.explained_variance_ratio_,
+                                   atol=1e-5)
+        np.testing.assert_allclose(lotes[anio].model(k).components_, esperado.model(k).components_, atol=1e-4)
+        np.testing.assert_allclose(lotes[anio].scores(k).to_numpy(), esperado.scores(k).to_numpy(), atol=1e-4)
+        assert lotes[anio].scores(k).index.equals(bloques[anio].index)
+        # Como en descomponer_pca, el ajuste usa los datos en float32 (optimize_memory)
+        datos = bloques[anio].astype(np.float32)
+        np.testing.assert_allclose(lotes[anio].model(k).transform(datos), lotes[anio].scores(k).to_numpy(),
+                                   atol=1e-8)
+
+
+@pytest.mark.parametrize("estrategia", [None, 'interpolacion'])
+def test_panel_por_bloques_equivale_al_panel_en_memoria(estrategia, monkeypatch):
+    from config_manager import get_config
+    from pca_panel3d_logic import PCAPanel3DLogic
+
+    rng = np.random.default_rng(8)
+    valores = rng.normal(size=(4, 30, 12)) + rng.normal(size=(4, 30, 1))
+    valores[rng.random(valores.shape) < 0.05] = np.nan
+    indicadores, unidades = [f'IND_{i}' for i in range(4)], [f'U{i:02d}' for i in range(30)]
+    cubo = IndicatorCube(valores, indicadores, unidades, range(2000, 2012))
+    monkeypatch.setattr(get_config().performance, 'panel_units_per_chunk', 4)
+
+    args = (None, indicadores, indicadores, unidades)
+    en_memoria = PCAPanel3DLogic.run_panel3d_analysis_logic(*args, cube=cubo, imputation_strategy=estrategia,
+                                                            streaming=False)
+    por_bloques = PCAPanel3DLogic.run_panel3d_analysis_logic(*args, cube=cubo, imputation_strategy=estrategia,
+                                                             streaming=True)
+    assert list(por_bloques) == list(en_memoria)
+    pd.testing.assert_frame_equal(por_bloques['df_pc_scores_panel'], en_memoria['df_pc_scores_panel'],
+                                  check_dtype=False, atol=1e-5)
+    pd.testing.assert_frame_equal(por_bloques['df_cov_panel'], en_memoria['df_cov_panel'], atol=1e-10)
+    np.testing.assert_allclose(por_bloques['pca_model_panel'].explained_variance_ratio_,
+                               en_memoria['pca_model_panel'].explained_variance_ratio_, rtol=1e-5)
+    assert por_bloques['mascara_imputados'] == en_memoria['mascara_imputados']
+
+
+def test_spill_no_borra_directorios_de_otros_procesos_vivos(tmp_path, monkeypatch):
+    base = tmp_path / "spill"
+    vivo, terminado, antiguo = (base / "pca_spill_4242_abc"), (base / "pca_spill_4343_def"), (base / "pca_spill_xyz")
+    for directorio in (vivo, terminado, antiguo):
+        directorio.mkdir(parents=True)
+        (directorio / "hoja.npy").write_bytes(b"")
+    monkeypatch.setattr(dl.psutil, 'pid_exists', lambda pid: pid == 4242)
+
+    propio = dl.crear_directorio_spill(str(base))
+    assert os.path.basename(propio).startswith(f"pca_spill_{os.getpid()}_")
+    assert vivo.exists() and not terminado.exists() and not antiguo.exists()
+    dl.liberar_directorio_spill(propio)
+    assert not os.path.exists(propio)
+
+
+def test_panel_por_bloques_libera_el_directorio_de_spill(libro_wdi, tmp_path, monkeypatch):
+    import gc
+    from analysis_session import AnalysisSession
+    from config_manager import get_config
+    from pca_panel3d_logic import PCAPanel3DLogic
+
+    crear = dl.crear_directorio_spill
+    monkeypatch.setattr(dl, 'crear_directorio_spill', lambda: crear(str(tmp_path / "spill")))
+    monkeypatch.setattr(get_config().performance, 'panel_units_per_chunk', 2)
+    session = AnalysisSession(str(libro_wdi))
+    indicadores = ['IND_0', 'IND_1', 'IND_2']
+    resultados = PCAPanel3DLogic.run_panel3d_analysis_logic(
+        None, indicadores, indicadores, ['ARG', 'BRA', 'CHL', 'MEX', 'USA'], session=session,
+        imputation_strategy='interpolacion', streaming=True)
+    directorios = list((tmp_path / "spill").iterdir())
+    # Los bloques se borran tras el ajuste; quedan solo las puntuaciones mapeadas
+    assert len(directorios) == 1 and [p.name for p in directorios[0].iterdir()] == ["pc_scores_panel.npy"]
+
+    del resultados
+    session.invalidate()
+    gc.collect()
+    assert not directorios[0].exists()
+
+    # Un análisis fallido no deja directorio
+    resultados = PCAPanel3DLogic.run_panel3d_analysis_logic(
+        None, indicadores, indicadores, ['ARG', 'BRA'], session=session, years_selected=[2000], streaming=True)
+    assert 'error' in resultados and list((tmp_path / "spill").iterdir()) == []
+
+
+def test_panel_decide_streaming_antes_de_cargar_el_cubo(libro_wdi, tmp_path, monkeypatch):
+    from analysis_session import AnalysisSession
+    from config_manager import get_config
+    from pca_panel3d_logic import PCAPanel3DLogic
+
+    crear = dl.crear_directorio_spill
+    monkeypatch.setattr(dl, 'crear_directorio_spill', lambda: crear(str(tmp_path / "spill")))
+    eventos = []
+    usar_streaming = PCAPanel3DLogic._usar_streaming
+    monkeypatch.setattr(PCAPanel3DLogic, '_usar_streaming',
+                        staticmethod(lambda *dims: eventos.append(('decision', dims)) or usar_streaming(*dims)))
+    session = AnalysisSession(str(libro_wdi))
+    cargar = session.cube
+    monkeypatch.setattr(session, 'cube', lambda *a, **kw: eventos.append(('carga',)) or cargar(*a, **kw))
+
+    indicadores = ['IND_0', 'IND_1', 'IND_2']
+    # El índice del libro da las mismas dimensiones que el cubo completo
+    metadata = dl.obtener_metadatos_libro(str(libro_wdi))
+    cubo = IndicatorCube.from_file(str(libro_wdi), indicadores)
+    assert (PCAPanel3DLogic._dimensiones_panel(metadata, indicadores, None, None)
+            == PCAPanel3DLogic._dimensiones_panel(cubo, indicadores, None, None) == (3, 5, 6))
+    unidades = ['ARG', 'BRA', 'CHL', 'MEX', 'USA']
+
+    monkeypatch.setattr(get_config().performance, 'memory_limit_mb', 0)
+    por_bloques = PCAPanel3DLogic.run_panel3d_analysis_logic(
+        None, indicadores, indicadores, unidades, session=session, imputation_strategy='interpolacion')
+    assert eventos == [('decision', (3, 5, 6)), ('carga',)]
+    assert len(list((tmp_path / "spill").iterdir())) == 1
+
+    eventos.clear()
+    session.invalidate()
+    monkeypatch.setattr(get_config().performance, 'memory_limit_mb', 1024)
+    en_memoria = PCAPanel3DLogic.run_panel3d_analysis_logic(
+        None, indicadores, indicadores, unidades, session=session, imputation_strategy='interpolacion')
+    # Sin streaming no se crea otro directorio de spill
+    assert eventos == [('decision', (3, 5, 6)), ('carga',)]
+    assert len(list((tmp_path / "spill").iterdir())) == 1 and 'df_pc_scores_panel' in por_bloques
+    np.testing.assert_allclose(np.abs(en_memoria['df_pc_scores_panel'].to_numpy()),
+                               np.abs(por_bloques['df_pc_scores_panel'].to_numpy()), atol=1e-4)
+
+
+def test_pca_por_bloques_escribe_puntuaciones_en_disco(tmp_path, monkeypatch):
+    import pca_module as pca_mod
+
+    rng = np.random.default_rng(9)
+    df = pd.DataFrame(rng.normal(size=(500, 6)) * [6.0, 4.0, 2.0, 1.0, 0.5, 0.2], columns=[f'I{j}' for j in range(6)])
+    df = (df - df.mean()) / df.std(ddof=0) * [6.0, 4.0, 2.0, 1.0, 0.5, 0.2]
+    bloques = [df.iloc[i:i + 60] for i in range(0, len(df), 60)]
+    modelo_ref, puntuaciones_ref = pca_mod.realizar_pca(df, n_components=3)
+
+    archivo = tmp_path / "scores.npy"
+    modelo, puntuaciones, df_cov = pca_mod.pca_incremental_por_bloques(bloques, 3, str(archivo))
+    assert archivo.exists() and puntuaciones.index.equals(df.index)
+    np.testing.assert_allclose(puntuaciones.to_numpy(), puntuaciones_ref.to_numpy(), atol=1e-4)
+    pd.testing.assert_frame_equal(df_cov, df.cov(), atol=1e-10)
+
+    # Con muchas variables se usa IncrementalPCA (aproximado, sin covarianza)
+    monkeypatch.setattr(pca_mod, '_MAX_VARIABLES_GRAM', 4)
+    modelo, puntuaciones, df_cov = pca_mod.pca_incremental_por_bloques(lambda: iter(bloques), 3)
+    assert type(modelo).__name__ == 'IncrementalPCA' and df_cov is None
+    np.testing.assert_allclose(np.abs(puntuaciones.to_numpy()), np.abs(puntuaciones_ref.to_numpy()), atol=0.1)
+    with pytest.raises(ValueError):
+        pca_mod.pca_incremental_por_bloques(iter(bloques), 3)